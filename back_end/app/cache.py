@@ -0,0 +1,197 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+from app.metrics import registry
+
+# Load environment variables from .env file
+load_dotenv()
+
+# "memory" (per-process LRU), "postgres" (shared across workers) or "none"
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_MAX_SIZE = int(os.getenv("RESULT_CACHE_MAX_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "86400"))
+# Seconds between deletions of expired rows of the postgres backend; 0 disables them
+RESULT_CACHE_PURGE_INTERVAL = float(os.getenv("RESULT_CACHE_PURGE_INTERVAL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+# =============================
+# Backends
+# =============================
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a maximum size and per-entry TTL."""
+
+    def __init__(self, max_size: int = RESULT_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PostgresCacheBackend:
+    """
+    Cache stored in the `ResultCache` table so results are shared across workers.
+
+    Expired rows are deleted when read, and writes delete all expired rows at most
+    every `purge_interval` seconds, so rows that are never read again do not pile up.
+    """
+
+    def __init__(self, client=None, purge_interval: float = RESULT_CACHE_PURGE_INTERVAL):
+        if client is None:
+            from app.client import prisma_client as client
+        self.client = client
+        self.purge_interval = purge_interval
+        self._last_purge = float("-inf")
+
+    async def get(self, key: str) -> Optional[Any]:
+        row = await self.client.resultcache.find_unique(where={"key": key})
+        if row is None:
+            return None
+
+        if row.expires_at < datetime.now(timezone.utc):
+            await self.client.resultcache.delete_many(where={"key": key})
+            return None
+
+        return json.loads(row.value)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        data = {
+            "value": json.dumps(value),
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl),
+        }
+        await self.client.resultcache.upsert(
+            where={"key": key},
+            data={"create": {"key": key, **data}, "update": data}
+        )
+
+        if self.purge_interval and time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                logger.warning(f"Purging expired result cache rows failed: {e}")
+
+    async def purge_expired(self) -> int:
+        """Delete every expired row. Returns how many were deleted."""
+        return await self.client.resultcache.delete_many(where={"expires_at": {"lt": datetime.now(timezone.utc)}})
+
+    async def clear(self):
+        await self.client.resultcache.delete_many()
+
+
+# =============================
+# Result Cache
+# =============================
+
+class ResultCache:
+    """
+    Content-addressed cache for generation pipeline results.
+
+    Keys are hashes of everything that determines a result (input text, category,
+    pattern, model, prompt-template version), so identical work is never paid twice.
+    Backend errors are logged and treated as misses; the cache never fails a generation.
+    """
+
+    def __init__(self, backend=None, ttl: float = RESULT_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Build a content-addressed key from JSON-serializable parts."""
+        encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        if self.backend is None:
+            return None
+
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Result cache read failed: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any):
+        if self.backend is None:
+            return
+
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Result cache write failed: {e}")
+
+    async def clear(self):
+        if self.backend is not None:
+            await self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _create_backend(name: str):
+    if name == "memory":
+        return MemoryCacheBackend()
+    if name == "postgres":
+        return PostgresCacheBackend()
+    if name == "none":
+        return None
+    raise Exception(f"Unknown result cache backend {name}")
+
+
+# Same cache gets used in instance
+result_cache = ResultCache(_create_backend(RESULT_CACHE_BACKEND))
+
+registry.gauge("result_cache_hits_total", "Result cache hits.", lambda: result_cache.hits, kind="counter")
+registry.gauge("result_cache_misses_total", "Result cache misses.", lambda: result_cache.misses, kind="counter")
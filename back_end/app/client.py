@@ -1,7 +1,19 @@
 from prisma import Prisma
 
+from app.metrics import DB_QUERY_SECONDS
+
+
+class InstrumentedPrisma(Prisma):
+    """Prisma client that records the latency of every query (transaction clients included)."""
+
+    async def _execute(self, **kwargs):
+        model = kwargs.get("model")
+        with DB_QUERY_SECONDS.time(model=model.__name__ if model is not None else "raw", method=kwargs.get("method")):
+            return await super()._execute(**kwargs)
+
+
 # Same prisma client gets used in instance
-prisma_client = Prisma(auto_register=True)
+prisma_client = InstrumentedPrisma(auto_register=True)
 
 async def connect_db():
     """Connect to the database."""
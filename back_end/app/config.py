@@ -34,11 +34,15 @@ class Pattern(Enum):
 # Section 2 - Prompts and Context
 #################################
 
-TEMPLATE_PROMPT = "Given a prompt, evaluate its {category} based on the {pattern} Pattern. Evaluate the prompt only based on the context for the {pattern} Pattern.\n\nPrompt: \"\"\"{prompt}\"\"\"\n\nContext: \"\"\"{context}\"\"\"\n\nYour Response:"
+# Static instructions and pattern context come before the user's prompt, so every call for a
+# pattern starts with the same text and can hit the provider's prompt cache (see app/prompts.py)
+TEMPLATE_PROMPT = "Given a prompt, evaluate its {category} based on the {pattern} Pattern. Evaluate the prompt only based on the context for the {pattern} Pattern.\n\nContext: \"\"\"{context}\"\"\"\n\nPrompt: \"\"\"{prompt}\"\"\"\n\nYour Response:"
 EVALUATION_PROMPT = "Should changes be made to the prompt? If the pattern is not already applied, consider whether or not it should be applied at all. When making your decision, consider the intent behind the prompt and the user's end goal. Start your answer with \"yes\" or \"no\". Your Decision:"
 IMPROVEMENT_PROMPT = "Improve the prompt based on the pattern while preserving the original use case of the prompt. Output only the prompt and surround the prompt with <PROMPT></PROMPT> tags."
 STANDARDIZATION_PROMPT = "Combine all the prompts below into one prompt while preserving the original use cases of each prompt. Output only the combined prompt and surround the combined prompt with <PROMPT></PROMPT> tags.\n\nPrompts: \n\n{prompts}\n\nYour Response:"
 MANUAL_IMPROVEMENT_PROMPT = "Improve the Original Prompt based on the Feedback. Output only your improved prompt and surround the improved prompt with <PROMPT></PROMPT> tags.\n\nOriginal Prompt: \"\"\"{prompt}\"\"\"\n\nFeedback: \"\"\"{feedback}\"\"\"\n\nYour Response:"
+FUSED_PATTERN_PROMPT = "Given a prompt, evaluate its {category} based on the {pattern} Pattern. Evaluate the prompt only based on the context for the {pattern} Pattern.\n\nContext: \"\"\"{context}\"\"\"\n\nAnswer in three parts. First, write your evaluation and surround it with <FEEDBACK></FEEDBACK> tags. Second, decide whether changes should be made to the prompt. If the pattern is not already applied, consider whether or not it should be applied at all. When making your decision, consider the intent behind the prompt and the user's end goal. Answer \"yes\" or \"no\" and surround your decision with <DECISION></DECISION> tags. Third, improve the prompt based on the pattern while preserving the original use case of the prompt and surround the improved prompt with <PROMPT></PROMPT> tags. If your decision is \"no\", repeat the original prompt unchanged inside the <PROMPT></PROMPT> tags.\n\nPrompt: \"\"\"{prompt}\"\"\"\n\nYour Response:"
+TRIAGE_PROMPT = "Rate how much each prompt pattern below would improve the given prompt, from 0 (irrelevant) to 10 (clearly needed). Consider the intent behind the prompt and the user's end goal.\n\nPatterns:\n{patterns}\n\nFor every pattern, write one line in the format: Pattern Name | score | short reason. Surround all lines with <SCORES></SCORES> tags.\n\nPrompt: \"\"\"{prompt}\"\"\"\n\nYour Response:"
 
 META_LANGUAGE_CREATION_CONTEXT = "1) Intent and Context: During a conversation with an LLM, the user would like to create the prompt via an alternate language, such as a textual short-hand notation for graphs, a description of states and state transitions for a state machine, a set of commands for prompt automation, etc. The intent of this pattern is to explain the semantics of this alternative language to the LLM so the user can write future prompts using this new language and its semantics.\n\n2) Motivation: Many problems, structures, or other ideas communicated in a prompt may be more concisely, unambiguously, or clearly expressed in a language other than English (or whatever conventional human language is used to interact with an LLM). To produce output based on an alternative language, however, an LLM needs to understand the language's semantics.\n\n3) Structure and Key Ideas: Fundamental contextual statements:\n\n| Contextual Statements                        |\n|:---------------------------------------------|\n| When I say X, I mean Y (or would like you to do Y) |\n\nThe key structure of this pattern involves explaining the meaning of one or more symbols, words, or statements to the LLM so it uses the provided semantics for the ensuing conversation. This description can take the form of a simple translation, such as \"X\" means \"Y\". The description can also take more complex forms that define a series of commands and their semantics, such as \"when I say X, I want you to do <action>\". In this case, \"X\" is henceforth bound to the semantics of \"take action\".\n\n4) Example Implementation: The key to successfully using the Meta Language Creation pattern is developing an unambiguous notation or shorthand, such as the following:\n\n\"From now on, whenever I type two identifiers separated by \"->\", I am describing a graph. For example, \"a -> b\" is describing a graph with nodes \"a\" and \"b\" and an edge between them. If I separate identifiers by \"-[w:2, z:3]->\", I am adding properties of the edge, such as a weight or label.\"\n\n5) Consequences: Although this pattern provides a powerful means to customize a user's interaction with an LLM, it may create the potential for confusion within the LLM. As important as it is to clearly define the semantics of the language, it is also essential to ensure the language itself introduces no ambiguities that degrade the LLM's performance or accuracy. For example, the prompt \"whenever I separate two things by commas, it means that the first thing precedes the second thing\" will likely create significant potential for ambiguity and unexpected semantics if punctuation involving commas is used in the prompt."
 OUTPUT_AUTOMATER_CONTEXT = "1) Intent and Context: The intent of this pattern is to have the LLM generate a script or other automation artifact that can automatically perform any steps it recommends taking as part of its output. The goal is to reduce the manual effort needed to implement any LLM output recommendations.\n\n2) Motivation: The output of an LLM is often a sequence of steps for the user to follow. For example, when asking an LLM to generate a Python configuration script it may suggest a number of files to modify and changes to apply to each file. However, having users continually perform the manual steps dictated by LLM output is tedious and error-prone.\n\n3) Structure and Key Ideas: Fundamental contextual statements:\n\n| Contextual Statements                                                                                      |\n| :---------------------------------------------------------------------------------------------------------- |\n| Whenever you produce an output that has at least one step to take and the following properties (alternatively, always do this) |\n| Produce an executable artifact of type X that will automate these steps                                     |\n\nThe first part of the pattern identifies the situations under which automation should be generated. A simple approach is to state that the output includes at least two steps to take and that an automation artifact should be produced. The scoping is up to the user, but helps prevent producing an output automation script in cases where running the output automation script will take more user effort than performing the original steps produced in the output. The scope can be limited to outputs requiring more than a certain number of steps.\n\nThe next part of this pattern provides a concrete statement of the type of output the LLM should output to perform the automation. For example, \"produce a Python script\" gives the LLM a concrete understanding to translate the general steps into equivalent steps in Python. The automation artifact should be concrete and must be something that the LLM associates with the action of \"automating a sequence of steps\".\n\n4) Example Implementation: A sample of this prompt pattern applied to code snippets generated by the ChatGPT LLM is shown below:\n\n\"From now on, whenever you generate code that spans more than one file, generate a Python script that can be run to automatically create the specified files or make changes to existing files to insert the generated code.\"\n\nThis pattern is particularly effective in software engineering as a common task for software engineers using LLMs is to then copy/paste the outputs into multiple files. Some tools, such as Copilot, insert limited snippets directly into the section of code that the coder is working with, but tools, such as ChatGPT, do not provide these facilities. This automation trick is also effective at creating scripts for running commands on a terminal, automating cloud operations, or reorganizing files on a file system.\n\nThis pattern is a powerful complement for any system that can be computer controlled. The LLM can provide a set of steps that should be taken on the computer-controlled system and then the output can be translated into a script that allows the computer controlling the system to automatically take the steps. This is a direct pathway to allowing LLMs, such as ChatGPT, to integrate quality into - and to control - new computing systems that have a known scripting interface.\n\n5) Consequences: An important usage consideration of this pattern is that the automation artifact must be defined concretely. Without a concrete meaning for how to \"automate\" the steps, the LLM often states that it \"can't automate things\" since that is beyond its capabilities. LLMs typically accept requests to produce code, however, so the goal is to instruct the LLM to generate text/code, which can be executed to automate something. This subtle distinction in meaning is important to help an LLM disambiguate the prompt meaning.\n\nOne caveat of the Output Automater pattern is the LLM needs sufficient conversational context to generate an automation artifact that is functional in the target context, such as the file system of a project on a Mac vs. Windows computer. This pattern works best when the full context needed for the automation is contained within the conversation, e.g., when a software application is generated from scratch using the conversation and all actions on the local file system are performed using a sequence of generated automation artifacts rather than manual actions unknown to the LLM. Alternatively, self-contained sequences of steps work well, such as \"how do I find the list of open ports on my Mac computer\".\n\nIn some cases, the LLM may produce a long output with multiple steps and not include an automation artifact. This omission may arise for various reasons, including exceeding the output length limitation the LLM supports. A simple workaround for this situation is to remind the LLM via a follow-on prompt, such as \"But you didn't automate it\" which provides the context that the automation artifact was omitted and should be generated.\n\nAt this point in the evolution of LLMs, the Output Automater pattern is best employed by users who can read and understand the generated automation artifact. LLMs can (and do) produce inaccuracies in their output, so blindly accepting and executing an automation artifact carries significant risk. Although this pattern may alleviate the user from performing certain manual steps, it does not alleviate their responsibility to understand the actions they undertake using the output. When users execute automation scripts, therefore they assume responsibility for the outcomes."
@@ -109,4 +113,10 @@ PATTERN_TO_CONTEXT = {
     Pattern.GAME_PLAY.value: GAME_PLAY_CONTEXT,
     Pattern.INFINITE_GENERATION.value: INFINITE_GENERATION_CONTEXT,
     Pattern.CONTEXT_MANAGER.value: CONTEXT_MANAGER_CONTEXT,
-}
\ No newline at end of file
+}
+
+# First section ("Intent and Context") of each pattern context, used to triage all patterns in one call
+PATTERN_TO_SUMMARY = {
+    pattern: context.split("\n\n2)")[0].replace("1) Intent and Context: ", "", 1)
+    for pattern, context in PATTERN_TO_CONTEXT.items()
+}
@@ -0,0 +1,113 @@
+"""
+Immutable conversations for LLM calls.
+
+A `Conversation` is a persistent linked list of messages: `then()` returns a new
+conversation that points at its parent instead of copying it, so the evaluation and
+improvement steps of a pattern both extend the same feedback exchange without
+duplicating or mutating it. Every call gets a fresh tuple of messages.
+
+Before a call, `prompt_messages` enforces LLM_MAX_PROMPT_TOKENS. Conversations over the
+ceiling are truncated with a fixed policy: the longest message is cut in the middle
+(keeping its head and tail), then the next longest, until the conversation fits.
+Message order and roles never change and no message is dropped.
+"""
+import os
+import logging
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+from langchain.schema import BaseMessage, HumanMessage
+
+from app.tokens import count_message_tokens, count_tokens, truncate_middle
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Most prompt tokens a single call may send; 0 disables the ceiling
+LLM_MAX_PROMPT_TOKENS = int(os.getenv("LLM_MAX_PROMPT_TOKENS", "100000"))
+
+logger = logging.getLogger(__name__)
+
+MessageLike = Union[str, BaseMessage]
+
+
+def _message(message: MessageLike) -> BaseMessage:
+    return HumanMessage(content=message) if isinstance(message, str) else message
+
+
+@dataclass(frozen=True)
+class Conversation:
+    """
+    One message and the conversation before it.
+
+    Args:
+        message (BaseMessage): Last message of the conversation.
+        parent (Conversation, optional): The conversation this message follows.
+    """
+
+    message: BaseMessage
+    parent: Optional["Conversation"] = None
+
+    @classmethod
+    def of(cls, messages: Iterable[MessageLike]) -> Optional["Conversation"]:
+        """Conversation of the given messages, None if there are none."""
+        conversation = None
+        for message in messages:
+            conversation = cls(_message(message), conversation)
+        return conversation
+
+    def then(self, message: MessageLike) -> "Conversation":
+        """New conversation continuing this one; this one is left unchanged."""
+        return Conversation(_message(message), self)
+
+    @property
+    def messages(self) -> Tuple[BaseMessage, ...]:
+        messages = []
+        node = self
+        while node is not None:
+            messages.append(node.message)
+            node = node.parent
+        return tuple(reversed(messages))
+
+
+def prompt_messages(
+    query: MessageLike,
+    history: Union[Conversation, Iterable[MessageLike], None] = None,
+    model: Optional[str] = None,
+    max_tokens: int = LLM_MAX_PROMPT_TOKENS,
+) -> Tuple[Tuple[BaseMessage, ...], int]:
+    """
+    Messages for one call: the history followed by the query, within the token ceiling.
+
+    Args:
+        query (str or BaseMessage): Message to send.
+        history (Conversation or messages, optional): Earlier messages; never modified.
+        model (str, optional): Model name used to count tokens.
+        max_tokens (int): Token ceiling of the whole prompt; 0 disables it.
+
+    Returns:
+        Tuple: The messages and how many tokens were truncated (0 if none).
+    """
+    if history is not None and not isinstance(history, Conversation):
+        history = Conversation.of(history)
+    conversation = history.then(query) if history is not None else Conversation(_message(query))
+    messages = conversation.messages
+
+    total = count_message_tokens(messages, model)
+    if not max_tokens or total <= max_tokens:
+        return messages, 0
+
+    truncated = list(messages)
+    excess = total - max_tokens
+    for index in sorted(range(len(truncated)), key=lambda i: -count_tokens(str(truncated[i].content), model)):
+        content = str(truncated[index].content)
+        size = count_tokens(content, model)
+        shortened = truncate_middle(content, max(0, size - excess), model)
+        truncated[index] = truncated[index].model_copy(update={"content": shortened})
+        excess -= size - count_tokens(shortened, model)
+        if excess <= 0:
+            break
+
+    logger.warning(f"Prompt of {total} tokens truncated to the {max_tokens} token ceiling")
+    return tuple(truncated), total - count_message_tokens(truncated, model)
@@ -0,0 +1,116 @@
+"""
+Cancel generation work whose client has gone away.
+
+`cancel_on_disconnect` runs a request's pipeline work as a task next to a watcher that
+polls the connection. When the client disconnects (tab closed, frontend timeout) the
+work is cancelled; the cancellation propagates through the nested gathers down to the
+in-flight LLM calls, which release their scheduler slots.
+
+Patterns that finished before the disconnect are already in the result cache, so a
+retry of the same request reuses them. Calls made before the disconnect are still
+logged for the user's budget by the caller.
+"""
+import os
+import asyncio
+import logging
+from typing import Awaitable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.metrics import LLM_CALLS_SAVED, REQUEST_CANCELLATIONS
+from app.usage import UsageLedger
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Seconds between checks of the client connection; 0 disables the watcher
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+logger = logging.getLogger(__name__)
+
+
+class ClientDisconnected(Exception):
+    """Raised instead of a result when the client disconnected and the work was cancelled."""
+
+
+class CallEstimates:
+    """Moving average of LLM calls per completed request, by route."""
+
+    def __init__(self, weight: float = 0.2):
+        self.weight = weight
+        self._calls: Dict[str, float] = {}
+
+    def observe(self, route: str, calls: int):
+        previous = self._calls.get(route)
+        self._calls[route] = calls if previous is None else previous + self.weight * (calls - previous)
+
+    def saved(self, route: str, calls_made: int) -> int:
+        """Calls a cancelled request of the route would still have made."""
+        return max(0, round(self._calls.get(route, 0) - calls_made))
+
+
+# Same estimates get used in instance
+call_estimates = CallEstimates()
+
+
+def record_cancellation(route: str, usage: Optional[UsageLedger] = None):
+    """Count a cancelled request and the LLM calls it would still have made."""
+    calls_made = len(usage.calls) if usage is not None else 0
+    saved = call_estimates.saved(route, calls_made)
+    REQUEST_CANCELLATIONS.inc(route=route)
+    LLM_CALLS_SAVED.inc(saved, route=route)
+    logger.info(f"Client disconnected, cancelled {route} after {calls_made} LLM calls (~{saved} saved)")
+
+
+async def _wait_for_disconnect(request, poll_seconds: float):
+    try:
+        while not await request.is_disconnected():
+            await asyncio.sleep(poll_seconds)
+    except Exception as e:
+        # Never cancel work because the connection cannot be watched
+        logger.warning(f"Cannot watch the client connection: {e}")
+        await asyncio.Event().wait()
+
+
+async def cancel_on_disconnect(
+    request,
+    work: Awaitable,
+    route: str,
+    usage: Optional[UsageLedger] = None,
+    poll_seconds: float = DISCONNECT_POLL_SECONDS,
+):
+    """
+    Await `work`, cancelling it if the client of `request` disconnects first.
+
+    Args:
+        request (Request): Incoming request whose connection is watched.
+        work (Awaitable): Pipeline work of the request.
+        route (str): Route name for metrics.
+        usage (UsageLedger, optional): Ledger of the request, used to estimate saved calls.
+        poll_seconds (float): Seconds between connection checks; 0 only awaits the work.
+
+    Raises:
+        ClientDisconnected: The client disconnected before the work finished.
+    """
+    if not poll_seconds:
+        return await work
+
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request, poll_seconds))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            # Disconnected, or this handler itself was cancelled
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    if task.cancelled():
+        record_cancellation(route, usage)
+        raise ClientDisconnected(f"Client disconnected during {route}")
+
+    result = task.result()
+    if usage is not None:
+        call_estimates.observe(route, len(usage.calls))
+    return result
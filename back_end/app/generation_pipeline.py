@@ -1,27 +1,69 @@
 import os
 import re
+import time
 import asyncio
-from typing import List
+import logging
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, AIMessage
 from app.config import (
     Category,
     Pattern,
     CATEGORY_TO_PATTERNS,
-    PATTERN_TO_CONTEXT,
-    TEMPLATE_PROMPT,
-    EVALUATION_PROMPT,
-    IMPROVEMENT_PROMPT,
-    STANDARDIZATION_PROMPT,
-    MANUAL_IMPROVEMENT_PROMPT
+    PATTERN_TO_SUMMARY,
+)
+from app.prompts import prompt_registry
+from app.conversation import Conversation, prompt_messages
+from app.llm import llm_router
+from app.cache import result_cache
+from app.rate_limit import llm_scheduler
+from app.resilience import CircuitOpen, llm_resilience
+from app.tokens import count_message_tokens
+from app.usage import current_ledger, record_call, tracking
+from app.singleflight import single_flight
+from app.speculation import speculation_policy
+from app.streaming import TagExtractor
+from app.metrics import (
+    LLM_CALL_SECONDS,
+    LLM_CALLS,
+    LLM_PROMPT_TRUNCATED_TOKENS,
+    PIPELINE_FAILED_PATTERNS,
+    PIPELINE_MERGES,
+    PIPELINE_STAGE_SECONDS,
+    current_labels,
+    labelled,
 )
 
 # Load environment variables from .env file
 load_dotenv()
 
-OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-MODEL = os.getenv("MODEL")
+# Changes whenever a model profile or route changes, so cached results of other models are not reused
+MODEL_VERSION = llm_router.version
+
+# "sequential" runs feedback -> evaluation -> improvement as three calls per pattern,
+# "fused" asks for all three in a single structured call
+PATTERN_MODE = os.getenv("PATTERN_MODE", "sequential")
+
+# Score every pattern's relevance in one call first and only run the per-pattern chain
+# for patterns scoring at least TRIAGE_THRESHOLD (0-10)
+PATTERN_TRIAGE = os.getenv("PATTERN_TRIAGE", "false").lower() == "true"
+TRIAGE_THRESHOLD = float(os.getenv("TRIAGE_THRESHOLD", "4"))
+
+# How applied pattern outputs are reduced to the final prompt:
+# "two_level" merges each category into its preview, then merges the previews;
+# "flat" merges every applied pattern output in a single call;
+# "tree" merges them in parallel groups of MERGE_FAN_IN until one prompt is left.
+# With "flat" and "tree", category previews that need a merge are left empty and
+# computed when the UI asks for them.
+MERGE_STRATEGIES = ("two_level", "flat", "tree")
+MERGE_STRATEGY = os.getenv("MERGE_STRATEGY", "two_level")
+MERGE_FAN_IN = int(os.getenv("MERGE_FAN_IN", "4"))
+
+logger = logging.getLogger(__name__)
+
+# Bumps automatically whenever a prompt template changes, invalidating cached results
+TEMPLATE_VERSION = prompt_registry.version
 
 # =============================
 # Public API Functions
@@ -38,10 +80,29 @@ async def manually_improve_prompt(user_feedback: str, generated_prompt: str):
     Returns:
         str: Improved prompt extracted from LLM response.
     """
-    response = await _generate_response(MANUAL_IMPROVEMENT_PROMPT.format(prompt=generated_prompt, feedback=user_feedback))
+    with labelled(step="manual_improvement"):
+        prompt = prompt_registry.get("manual").format(prompt=generated_prompt, feedback=user_feedback)
+        response = await _generate_response(prompt)
     return _extract_prompt(response)
 
 
+async def iter_manually_improve_prompt(user_feedback: str, generated_prompt: str) -> AsyncIterator[dict]:
+    """
+    Streaming variant of manually_improve_prompt.
+
+    Yields:
+        dict: {"event": "token", "data": {"text"}} for each piece of the improved prompt as
+        the model writes it, then {"event": "result", "data": {"output"}} with the whole prompt.
+    """
+    extractor = TagExtractor("PROMPT")
+    with labelled(step="manual_improvement"):
+        query = prompt_registry.get("manual").format(prompt=generated_prompt, feedback=user_feedback)
+        async with aclosing(_stream_tag(query, extractor)) as texts:
+            async for text in texts:
+                yield {"event": "token", "data": {"text": text}}
+    yield {"event": "result", "data": {"output": _extract_prompt(extractor.raw)}}
+
+
 async def merge_prompts(prompts: List[str]):
     """
     Merge multiple prompts into a single unified prompt using a standardization prompt.
@@ -55,32 +116,177 @@ async def merge_prompts(prompts: List[str]):
     unique_prompts = list(set(prompts))
 
     if len(unique_prompts) > 1:
+        cache_key = result_cache.key("merge", prompts, MODEL_VERSION, prompt_registry.version_of("merge"))
+        merged_prompt = await result_cache.get(cache_key)
+        if merged_prompt is not None:
+            return merged_prompt
+
         formatted_prompts = [f"\"\"\"{prompt}\"\"\"" for prompt in prompts]
-        response = await _generate_response(STANDARDIZATION_PROMPT.format(prompts="\n\n".join(formatted_prompts)))
+        with PIPELINE_STAGE_SECONDS.time(stage="merge_prompts", **current_labels("pattern", "category")):
+            with labelled(step="merge"):
+                prompt = prompt_registry.get("merge").format(prompts="\n\n".join(formatted_prompts))
+                response = await _generate_response(prompt)
         merged_prompt = _extract_prompt(response)
+        await result_cache.set(cache_key, merged_prompt)
     else:
         merged_prompt = unique_prompts[0]
 
     return merged_prompt 
 
 
-async def improve_prompt(user_input: str):
+async def iter_merge_prompts(prompts: List[str]) -> AsyncIterator[dict]:
+    """
+    Streaming variant of merge_prompts. A merge served from the cache, or not needed at all,
+    arrives as a single token.
+
+    Yields:
+        dict: {"event": "token", "data": {"text"}} for each piece of the merged prompt as
+        the model writes it, then {"event": "result", "data": {"output"}} with the whole prompt.
+    """
+    unique_prompts = list(set(prompts))
+
+    if len(unique_prompts) > 1:
+        cache_key = result_cache.key("merge", prompts, MODEL_VERSION, prompt_registry.version_of("merge"))
+        merged_prompt = await result_cache.get(cache_key)
+        if merged_prompt is None:
+            formatted_prompts = [f"\"\"\"{prompt}\"\"\"" for prompt in prompts]
+            extractor = TagExtractor("PROMPT")
+            with PIPELINE_STAGE_SECONDS.time(stage="merge_prompts", **current_labels("pattern", "category")):
+                with labelled(step="merge"):
+                    query = prompt_registry.get("merge").format(prompts="\n\n".join(formatted_prompts))
+                    async with aclosing(_stream_tag(query, extractor)) as texts:
+                        async for text in texts:
+                            yield {"event": "token", "data": {"text": text}}
+            merged_prompt = _extract_prompt(extractor.raw)
+            await result_cache.set(cache_key, merged_prompt)
+            yield {"event": "result", "data": {"output": merged_prompt}}
+            return
+    else:
+        merged_prompt = unique_prompts[0]
+
+    yield {"event": "token", "data": {"text": merged_prompt}}
+    yield {"event": "result", "data": {"output": merged_prompt}}
+
+
+async def improve_prompt(user_input: str, fused=None, triage=None, merge_strategy=None):
     """
     Apply all categories to the input and generate an improved version with categorized previews.
 
     Args:
         user_input (str): Original user input prompt.
+        fused (bool, optional): Use the single-call pattern mode. Defaults to PATTERN_MODE.
+        triage (bool, optional): Skip patterns scored irrelevant by one triage call. Defaults to PATTERN_TRIAGE.
+        merge_strategy (str, optional): One of MERGE_STRATEGIES. Defaults to MERGE_STRATEGY.
 
     Returns:
-        dict: Contains original input, improved output, and applied categories.
+        dict: Contains original input, improved output, applied categories, a `reduction`
+            report (strategy, merges, seconds) and the generation `status`: "partial" with the
+            `failed` patterns when some patterns failed, else "complete".
+    """
+    strategy = _merge_strategy(merge_strategy)
+    if fused is None:
+        fused = PATTERN_MODE == "fused"
+    triage = _use_triage(triage)
+
+    # Identical concurrent submissions share one fan-out, also across workers when configured
+    key = result_cache.key("improve", user_input, fused, triage, strategy, MODEL_VERSION, TEMPLATE_VERSION)
+    return await single_flight.do(key, lambda: _improve_prompt(user_input, fused, triage, strategy), distributed=True)
+
+
+async def iter_improve_prompt(user_input: str, fused=None, triage=None, merge_strategy=None) -> AsyncIterator[dict]:
+    """
+    Same work as improve_prompt, but yield progress events in completion order.
+
+    The triage scores are yielded first (when triage is enabled), then each pattern result
+    as soon as it finishes, each category preview as soon as all of its patterns are done,
+    and finally the merged result.
+
+    Args:
+        user_input (str): Original user input prompt.
+        fused (bool, optional): Use the single-call pattern mode. Defaults to PATTERN_MODE.
+        triage (bool, optional): Skip patterns scored irrelevant by one triage call. Defaults to PATTERN_TRIAGE.
+        merge_strategy (str, optional): One of MERGE_STRATEGIES. Defaults to MERGE_STRATEGY.
+
+    Yields:
+        dict: {"event": "triage" | "pattern" | "category" | "result", "data": ...}
     """
-    tasks = [apply_category(user_input, category) for category in CATEGORY_TO_PATTERNS.keys()]
-    output = await asyncio.gather(*tasks)
+    strategy = _merge_strategy(merge_strategy)
+    scores = None
+    if _use_triage(triage):
+        scores = await _triage_patterns(user_input)
+        yield {"event": "triage", "data": {
+            pattern: {"score": score, "reason": reason} for pattern, (score, reason) in scores.items()
+        }}
 
-    return await _standardize_category_outputs(output)
+    categories = list(CATEGORY_TO_PATTERNS.keys())
+    pattern_outputs = {category: [None] * len(CATEGORY_TO_PATTERNS[category]) for category in categories}
+    remaining = {category: len(CATEGORY_TO_PATTERNS[category]) for category in categories}
+    category_outputs = {}
 
+    pattern_tasks = {}
+    for category in categories:
+        for index, pattern in enumerate(CATEGORY_TO_PATTERNS[category]):
+            task = asyncio.ensure_future(_apply_or_skip_pattern(user_input, category, pattern, scores, fused))
+            pattern_tasks[task] = (category, index)
+    category_tasks = {}
+    pending = set(pattern_tasks)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task in pattern_tasks:
+                    category, index = pattern_tasks[task]
+                    output = task.result()
+                    pattern_outputs[category][index] = output
+                    yield {"event": "pattern", "data": {
+                        "category": category,
+                        "pattern": output["pattern"],
+                        "applied": output["applied"],
+                        "feedback": output["feedback"],
+                        "error": output.get("error"),
+                    }}
+
+                    remaining[category] -= 1
+                    if remaining[category] > 0:
+                        continue
+                    patterns_done = time.perf_counter()
+                    if strategy == "two_level":
+                        merge_task = asyncio.ensure_future(
+                            _standardize_pattern_outputs(pattern_outputs[category], category)
+                        )
+                        category_tasks[merge_task] = category
+                        pending.add(merge_task)
+                        continue
+                    category_output = _lazy_category_output(pattern_outputs[category], category)
+                else:
+                    category_output = task.result()
+                category_outputs[category_output["category"]] = category_output
+                yield {"event": "category", "data": {
+                    "category": category_output["category"],
+                    "patterns": category_output["patterns"],
+                    "preview": category_output["preview"],
+                }}
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if strategy == "two_level":
+        result = await _standardize_category_outputs([category_outputs[category] for category in categories])
+        merges = _two_level_merges(result)
+    else:
+        result, merges = await _reduce_pattern_outputs(pattern_outputs, strategy)
+    yield {"event": "result", "data": _mark_failures(_report_reduction(result, strategy, merges, patterns_done))}
 
-async def apply_category(user_input: str, category: str, force_patterns=[]):
+
+async def apply_category(
+    user_input: str,
+    category: str,
+    force_patterns=[],
+    fused=None,
+    triage=None,
+    stored_patterns=None,
+):
     """
     Apply all or specific patterns from a category to the user input.
 
@@ -88,6 +294,12 @@ async def apply_category(user_input: str, category: str, force_patterns=[]):
         user_input (str): Original prompt.
         category (str): Name of the category.
         force_patterns (List[str], optional): Explicit patterns to apply.
+        fused (bool, optional): Use the single-call pattern mode. Defaults to PATTERN_MODE.
+        triage (dict, optional): Triage scores from improve_prompt; low scoring patterns are skipped.
+            Ignored when patterns are forced.
+        stored_patterns (Dict[str, dict], optional): Stored pattern results by pattern name
+            (feedback, output, input_hash). Forced patterns whose stored output was computed
+            from this input are reused instead of being applied again.
 
     Returns:
         dict: Standardized output for the category, with applied patterns and preview.
@@ -105,17 +317,349 @@ async def apply_category(user_input: str, category: str, force_patterns=[]):
                 raise Exception(f"Illegal Pattern for Category {category}")
         patterns = force_patterns
 
-    tasks = [_apply_pattern(user_input, category, pattern, force_applied=force_applied) for pattern in patterns]
-    output = await asyncio.gather(*tasks)
+    async def run():
+        with PIPELINE_STAGE_SECONDS.time(stage="apply_category", category=category):
+            if force_applied:
+                tasks = [
+                    _isolated(
+                        user_input, category, pattern,
+                        _reuse_or_apply_pattern(
+                            user_input, category, pattern, (stored_patterns or {}).get(pattern), fused
+                        )
+                    )
+                    for pattern in patterns
+                ]
+                output = await asyncio.gather(*tasks)
+            else:
+                output = await _apply_category_patterns(user_input, category, triage=triage, fused=fused)
+
+            return await _standardize_pattern_outputs(output, category)
+
+    key = result_cache.key(
+        "category", user_input, category, force_patterns, fused, triage, stored_patterns,
+        MODEL_VERSION, TEMPLATE_VERSION
+    )
+    return await single_flight.do(key, run)
+
+
+def pattern_input_hash(user_input: str, category: str, pattern: str) -> str:
+    """
+    Fingerprint of everything a pattern's improved output depends on: the input, the
+    pattern, the model and the prompt templates.
+    """
+    return result_cache.key("pattern-output", user_input, category, pattern, MODEL_VERSION, _pattern_version(pattern))
+
+
+async def retry_failed_patterns(user_input: str, stored: Dict[str, Dict[str, dict]], fused=None, merge_strategy=None):
+    """
+    Complete a partial generation. Patterns stored without an error are reused as they are,
+    missing and failed patterns are applied again, then everything is reduced as usual
+    (merges of unchanged categories come from the result cache).
+
+    Args:
+        user_input (str): Original prompt.
+        stored (Dict[str, Dict[str, dict]]): Category -> pattern -> stored result
+            (applied, feedback, output, error).
+        fused (bool, optional): Use the single-call pattern mode. Defaults to PATTERN_MODE.
+        merge_strategy (str, optional): One of MERGE_STRATEGIES. Defaults to MERGE_STRATEGY.
+
+    Returns:
+        dict: Same as improve_prompt.
+    """
+    strategy = _merge_strategy(merge_strategy)
+
+    async def run_pattern(category, pattern):
+        result = stored.get(category, {}).get(pattern)
+        reusable = (
+            result is not None
+            and not result.get("error")
+            and (not result["applied"] or result.get("output") is not None)
+        )
+        if reusable:
+            return {
+                "input": user_input,
+                "pattern": pattern,
+                "applied": result["applied"],
+                "feedback": result["feedback"],
+                "output": result["output"] if result["applied"] else user_input,
+            }
+        return await _isolated(
+            user_input, category, pattern, _apply_pattern(user_input, category, pattern, fused=fused)
+        )
+
+    categories = list(CATEGORY_TO_PATTERNS.keys())
+    outputs = await asyncio.gather(*[
+        asyncio.gather(*[run_pattern(category, pattern) for pattern in CATEGORY_TO_PATTERNS[category]])
+        for category in categories
+    ])
+    patterns_done = time.perf_counter()
+    pattern_outputs = {category: list(output) for category, output in zip(categories, outputs)}
+
+    if strategy == "two_level":
+        category_outputs = await asyncio.gather(*[
+            _standardize_pattern_outputs(output, category) for category, output in pattern_outputs.items()
+        ])
+        result = await _standardize_category_outputs(list(category_outputs))
+        merges = _two_level_merges(result)
+    else:
+        result, merges = await _reduce_pattern_outputs(pattern_outputs, strategy)
 
-    return await _standardize_pattern_outputs(output, category)
+    return _mark_failures(_report_reduction(result, strategy, merges, patterns_done))
 
 
 # =============================
 # Internal Utilities
 # =============================
 
-async def _apply_pattern(user_input: str, category: str, pattern: str, force_applied=False):
+def _use_triage(triage: Optional[bool]) -> bool:
+    return PATTERN_TRIAGE if triage is None else triage
+
+
+def _merge_strategy(strategy: Optional[str]) -> str:
+    strategy = MERGE_STRATEGY if strategy is None else strategy
+    if strategy not in MERGE_STRATEGIES:
+        raise Exception(f"Unknown merge strategy {strategy}")
+    return strategy
+
+
+async def _improve_prompt(user_input: str, fused: bool, triage: bool, strategy: str):
+    """improve_prompt with resolved settings, run once per distinct in-flight request."""
+    scores = await _triage_patterns(user_input) if triage else None
+    categories = list(CATEGORY_TO_PATTERNS.keys())
+    patterns_done = []
+
+    async def run_category(category):
+        with PIPELINE_STAGE_SECONDS.time(stage="apply_category", category=category):
+            output = await _apply_category_patterns(user_input, category, triage=scores, fused=fused)
+            patterns_done.append(time.perf_counter())
+            if strategy == "two_level":
+                return await _standardize_pattern_outputs(output, category)
+            return output
+
+    outputs = await asyncio.gather(*[run_category(category) for category in categories])
+
+    if strategy == "two_level":
+        result = await _standardize_category_outputs(outputs)
+        merges = _two_level_merges(result)
+    else:
+        result, merges = await _reduce_pattern_outputs(dict(zip(categories, outputs)), strategy)
+
+    return _mark_failures(_report_reduction(result, strategy, merges, max(patterns_done)))
+
+
+async def _apply_category_patterns(user_input: str, category: str, triage=None, fused=None) -> List[dict]:
+    """Run every pattern of a category (minus those triage skips) and return the raw pattern outputs."""
+    tasks = [
+        _apply_or_skip_pattern(user_input, category, pattern, triage, fused)
+        for pattern in CATEGORY_TO_PATTERNS[category]
+    ]
+    return list(await asyncio.gather(*tasks))
+
+
+def _applied_outputs(patterns: List[dict]) -> List[str]:
+    """Distinct improved prompts of the applied patterns, in pattern order."""
+    return list(dict.fromkeys(p["output"] for p in patterns if p["applied"]))
+
+
+def _two_level_merges(result: dict) -> int:
+    """Merges a two_level reduction performed: one per category needing it, plus the final one."""
+    merges = sum(_needs_merge(_applied_outputs(c["patterns"])) for c in result["categories"])
+    return merges + _needs_merge([c["preview"] for c in result["categories"]])
+
+
+def _needs_merge(prompts: List[str]) -> int:
+    """1 if merge_prompts would call the LLM (or its cache) for these prompts, else 0."""
+    return int(len(set(prompts)) > 1)
+
+
+async def _reduce_pattern_outputs(pattern_outputs: Dict[str, List[dict]], strategy: str) -> Tuple[dict, int]:
+    """
+    Reduce every applied pattern output straight to the final prompt (flat or tree strategy).
+
+    Category previews are only filled in when they need no merge; the others are left as
+    None to be merged on demand.
+
+    Returns:
+        Tuple[dict, int]: improve_prompt result and the number of merges performed.
+    """
+    categories = [_lazy_category_output(output, category) for category, output in pattern_outputs.items()]
+    original_prompt = categories[0]["input"]
+    partial_prompts = _applied_outputs([p for output in pattern_outputs.values() for p in output])
+
+    if not partial_prompts:
+        new_prompt, merges = original_prompt, 0
+    elif strategy == "flat":
+        new_prompt, merges = await merge_prompts(partial_prompts), _needs_merge(partial_prompts)
+    else:
+        new_prompt, merges = await _tree_merge(partial_prompts, MERGE_FAN_IN)
+
+    return {
+        "input": original_prompt,
+        "categories": [
+            {"category": c["category"], "patterns": c["patterns"], "preview": c["preview"]}
+            for c in categories
+        ],
+        "output": new_prompt
+    }, merges
+
+
+async def _tree_merge(prompts: List[str], fan_in: int) -> Tuple[str, int]:
+    """
+    Merge prompts as a balanced tree: each level merges groups of `fan_in` prompts in
+    parallel, until a single prompt is left.
+
+    Returns:
+        Tuple[str, int]: Merged prompt and the number of merges performed.
+    """
+    if fan_in < 2:
+        raise Exception("MERGE_FAN_IN must be at least 2")
+
+    merges = 0
+    prompts = list(dict.fromkeys(prompts))
+    while len(prompts) > 1:
+        groups = [prompts[i:i + fan_in] for i in range(0, len(prompts), fan_in)]
+        merges += sum(_needs_merge(group) for group in groups)
+        prompts = list(dict.fromkeys(await asyncio.gather(*[merge_prompts(group) for group in groups])))
+    return prompts[0], merges
+
+
+def _report_reduction(result: dict, strategy: str, merges: int, patterns_done: float) -> dict:
+    """
+    Attach the reduction report to a result and record it in the metrics.
+
+    The reported latency is the time between the last pattern finishing and the final
+    prompt being ready, i.e. what the reduction adds to the critical path.
+    """
+    seconds = max(time.perf_counter() - patterns_done, 0.0)
+    PIPELINE_STAGE_SECONDS.observe(seconds, stage=f"reduce_{strategy}")
+    PIPELINE_MERGES.inc(merges, strategy=strategy)
+    return {**result, "reduction": {"strategy": strategy, "merges": merges, "seconds": seconds}}
+
+
+async def _triage_patterns(user_input: str) -> Dict[str, Tuple[float, str]]:
+    """
+    Score the relevance of every pattern to the input with a single call.
+
+    Patterns the model leaves out, and every pattern if the call fails, get the threshold
+    score so they still go through the full chain.
+
+    Returns:
+        Dict[str, Tuple[float, str]]: Pattern -> (score from 0 to 10, short reason).
+    """
+    cache_key = result_cache.key("triage", user_input, MODEL_VERSION, prompt_registry.version_of("triage"))
+    cached = await result_cache.get(cache_key)
+    if cached is not None:
+        return {pattern: tuple(value) for pattern, value in cached.items()}
+
+    scores = {pattern: (TRIAGE_THRESHOLD, "Not scored by triage") for pattern in PATTERN_TO_SUMMARY}
+
+    try:
+        with PIPELINE_STAGE_SECONDS.time(stage="triage"), labelled(step="triage"):
+            response = await _generate_response(prompt_registry.get("triage").format(prompt=user_input))
+        scores.update(_parse_triage_scores(_extract_tag(response, "SCORES")))
+    except Exception as e:
+        logger.warning(f"Pattern triage failed, applying every pattern: {e}")
+        return scores
+
+    await result_cache.set(cache_key, {pattern: list(value) for pattern, value in scores.items()})
+    return scores
+
+
+def _parse_triage_scores(text: str) -> Dict[str, Tuple[float, str]]:
+    """Parse "Pattern Name | score | reason" lines, ignoring unknown patterns and malformed lines."""
+    known = {pattern.lower(): pattern for pattern in PATTERN_TO_SUMMARY}
+    scores = {}
+    for line in text.splitlines():
+        parts = [part.strip(" -*") for part in line.split("|")]
+        if len(parts) < 2 or parts[0].lower() not in known:
+            continue
+        try:
+            score = float(parts[1].split("/")[0])
+        except ValueError:
+            continue
+        scores[known[parts[0].lower()]] = (score, parts[2] if len(parts) > 2 else "")
+    return scores
+
+
+async def _apply_or_skip_pattern(user_input: str, category: str, pattern: str, triage=None, fused=None):
+    """
+    Run _apply_pattern unless triage scored the pattern below TRIAGE_THRESHOLD, in which
+    case it is recorded as not applied with the triage reason as feedback.
+    """
+    if triage is not None and triage[pattern][0] < TRIAGE_THRESHOLD:
+        score, reason = triage[pattern]
+        return {
+            "input": user_input,
+            "pattern": pattern,
+            "applied": False,
+            "feedback": f"Skipped by relevance triage ({score:g}/10): {reason}",
+            "output": user_input,
+        }
+    return await _isolated(user_input, category, pattern, _apply_pattern(user_input, category, pattern, fused=fused))
+
+
+async def _isolated(user_input: str, category: str, pattern: str, work) -> dict:
+    """
+    Await a pattern unit, turning its failure into a not-applied result that carries the
+    error, so one failing pattern does not fail its category or the whole generation.
+
+    An open circuit breaker is raised as is: every other pattern would fail the same way.
+    """
+    try:
+        return await work
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        logger.warning(f"Pattern {pattern} of {category} failed: {type(e).__name__}: {e}")
+        PIPELINE_FAILED_PATTERNS.inc(category=category, pattern=pattern)
+        return {
+            "input": user_input,
+            "pattern": pattern,
+            "applied": False,
+            "feedback": "",
+            "output": user_input,
+            "error": f"{type(e).__name__}: {e}",
+        }
+
+
+def _mark_failures(result: dict) -> dict:
+    """
+    Add the generation status and the failed patterns to an improve_prompt result.
+
+    Raises:
+        Exception: Every pattern failed, so there is nothing worth keeping.
+    """
+    patterns = [(c["category"], p) for c in result["categories"] for p in c["patterns"]]
+    failed = [
+        {"category": category, "pattern": p["pattern"], "error": p["error"]}
+        for category, p in patterns if p.get("error")
+    ]
+    if failed and len(failed) == len(patterns):
+        raise Exception(f"Every pattern failed, e.g. {failed[0]['pattern']}: {failed[0]['error']}")
+    return {**result, "status": "partial" if failed else "complete", "failed": failed}
+
+
+async def _reuse_or_apply_pattern(user_input: str, category: str, pattern: str, stored: Optional[dict], fused=None):
+    """
+    Force-apply a pattern, reusing its stored output when it is still fresh, i.e. was
+    computed from the same input hash.
+    """
+    if (
+        stored is not None
+        and stored.get("output") is not None
+        and stored.get("input_hash") == pattern_input_hash(user_input, category, pattern)
+    ):
+        return {
+            "input": user_input,
+            "pattern": pattern,
+            "applied": True,
+            "feedback": stored.get("feedback", ""),
+            "output": stored["output"],
+        }
+    return await _apply_pattern(user_input, category, pattern, force_applied=True, fused=fused)
+
+
+async def _apply_pattern(user_input: str, category: str, pattern: str, force_applied=False, fused=None):
     """
     Apply a single pattern to the input prompt and decide whether to use the result.
 
@@ -124,6 +668,39 @@ async def _apply_pattern(user_input: str, category: str, pattern: str, force_app
         category (str): Category being applied.
         pattern (str): Pattern to apply.
         force_applied (bool): Skip evaluation and apply regardless.
+        fused (bool, optional): Use the single-call pattern mode. Defaults to PATTERN_MODE.
+
+    Returns:
+        dict: Result containing pattern feedback, whether it was applied, and the output.
+    """
+    if fused is None:
+        fused = PATTERN_MODE == "fused"
+
+    with PIPELINE_STAGE_SECONDS.time(stage="apply_pattern", pattern=pattern, category=category):
+        cache_key = result_cache.key(
+            "pattern", user_input, category, pattern, force_applied, fused, MODEL_VERSION, _pattern_version(pattern)
+        )
+        cached = await result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        async def run():
+            with labelled(category=category, pattern=pattern):
+                if fused:
+                    output = await _apply_pattern_fused(user_input, category, pattern, force_applied)
+                else:
+                    output = await _apply_pattern_sequential(user_input, category, pattern, force_applied)
+
+            await result_cache.set(cache_key, output)
+            return output
+
+        # Concurrent misses for the same pattern wait for one computation
+        return await single_flight.do(cache_key, run)
+
+
+async def _apply_pattern_sequential(user_input: str, category: str, pattern: str, force_applied: bool):
+    """
+    Apply a pattern with separate feedback, evaluation and improvement calls.
 
     Returns:
         dict: Result containing pattern feedback, whether it was applied, and the output.
@@ -132,17 +709,24 @@ async def _apply_pattern(user_input: str, category: str, pattern: str, force_app
     pattern_prompt = _build_pattern_prompt(user_input, category, pattern)
 
     # Step 1: Generate feedback based on the pattern
-    feedback_input = HumanMessage(content=pattern_prompt)
-    feedback_response = await _generate_response(feedback_input)
+    feedback_input = Conversation(HumanMessage(content=pattern_prompt))
+    with labelled(step="feedback"):
+        feedback_response = await _generate_response(feedback_input.message)
 
-    # Step 2: Evaluate if the pattern should be applied (unless forced)
-    if not force_applied:
-        evaluation_input = HumanMessage(content=EVALUATION_PROMPT)
-        evaluation_history = [feedback_input, AIMessage(content=feedback_response)]
-        evaluation_response = await _generate_response(evaluation_input, evaluation_history)
-        output["applied"] = "yes" in evaluation_response.strip().lower()
-    else:
+    # Evaluation and improvement both continue this exchange
+    feedback_history = feedback_input.then(AIMessage(content=feedback_response))
+
+    # Step 2: Evaluate if the pattern should be applied (unless forced). A speculative
+    # improvement starts together with the evaluation instead of after its verdict
+    improvement_response = None
+    if force_applied:
         output["applied"] = True
+    elif speculation_policy.should_speculate(pattern, llm_scheduler.load):
+        output["applied"], improvement_response = await _evaluate_with_speculation(pattern, feedback_history)
+    else:
+        output["applied"] = await _evaluate(feedback_history)
+    if not force_applied:
+        speculation_policy.observe(pattern, output["applied"])
 
     output["feedback"] = feedback_response
 
@@ -151,15 +735,98 @@ async def _apply_pattern(user_input: str, category: str, pattern: str, force_app
         output["output"] = user_input
         return output
 
-    improvement_input = HumanMessage(content=IMPROVEMENT_PROMPT)
-    improvement_history = [feedback_input, AIMessage(content=feedback_response)]
-    improvement_response = await _generate_response(improvement_input, improvement_history)
+    if improvement_response is None:
+        improvement_response = await _improve(feedback_history)
 
     output["output"] = _extract_prompt(improvement_response)
 
     return output
 
 
+async def _evaluate(feedback_history: Conversation) -> bool:
+    """Ask whether the pattern's feedback is worth applying."""
+    evaluation_input = HumanMessage(content=prompt_registry.get("evaluation").format())
+    with labelled(step="evaluation"):
+        evaluation_response = await _generate_response(evaluation_input, feedback_history)
+    return "yes" in evaluation_response.strip().lower()
+
+
+async def _improve(feedback_history: Conversation) -> str:
+    """Ask for the prompt improved according to the pattern's feedback."""
+    improvement_input = HumanMessage(content=prompt_registry.get("improvement").format())
+    with labelled(step="improvement"):
+        return await _generate_response(improvement_input, feedback_history)
+
+
+async def _evaluate_with_speculation(pattern: str, feedback_history: Conversation) -> Tuple[bool, Optional[str]]:
+    """
+    Run the evaluation and the improvement concurrently. The improvement is kept on a yes
+    verdict and cancelled (or discarded, if already finished) on a no.
+
+    Returns:
+        Tuple[bool, Optional[str]]: The verdict and, if applied, the improvement response.
+    """
+    # The speculative call gets its own ledger so the tokens of a discarded one are known;
+    # its calls are still added to the request's ledger
+    parent = current_ledger.get()
+    start = time.perf_counter()
+
+    async def improve():
+        response = await _improve(feedback_history)
+        return response, time.perf_counter()
+
+    with tracking(parent.user_id if parent is not None else None) as speculative:
+        improvement = asyncio.ensure_future(improve())
+
+    try:
+        applied = await _evaluate(feedback_history)
+        verdict_at = time.perf_counter()
+        if applied:
+            response, improved_at = await improvement
+            speculation_policy.record(pattern, used=True, saved_seconds=min(verdict_at, improved_at) - start)
+            return True, response
+
+        finished = improvement.done()
+        improvement.cancel()
+        await asyncio.gather(improvement, return_exceptions=True)
+        if finished:
+            input_tokens, output_tokens = speculative.input_tokens, speculative.output_tokens
+        else:
+            # Cancelled in flight: the prompt was (most likely) already sent
+            improvement_input = HumanMessage(content=prompt_registry.get("improvement").format())
+            input_tokens, output_tokens = count_message_tokens(feedback_history.then(improvement_input).messages), 0
+        speculation_policy.record(pattern, used=False, input_tokens=input_tokens, output_tokens=output_tokens)
+        return False, None
+    finally:
+        if not improvement.done():
+            improvement.cancel()
+            await asyncio.gather(improvement, return_exceptions=True)
+        if parent is not None:
+            parent.calls.extend(speculative.calls)
+
+
+async def _apply_pattern_fused(user_input: str, category: str, pattern: str, force_applied: bool):
+    """
+    Apply a pattern with a single call returning feedback, decision and improved prompt together.
+
+    Returns:
+        dict: Result containing pattern feedback, whether it was applied, and the output.
+    """
+    fused_prompt = prompt_registry.fused(pattern).format(prompt=user_input)
+    with labelled(step="fused"):
+        response = await _generate_response(HumanMessage(content=fused_prompt))
+
+    applied = force_applied or "yes" in _extract_tag(response, "DECISION").lower()
+
+    return {
+        "input": user_input,
+        "pattern": pattern,
+        "applied": applied,
+        "feedback": _extract_tag(response, "FEEDBACK"),
+        "output": _extract_prompt(response) if applied else user_input,
+    }
+
+
 async def _standardize_category_outputs(output: list[dict]):
     """
     Merge outputs from different categories into a single final prompt.
@@ -202,24 +869,55 @@ async def _standardize_pattern_outputs(output: list[dict], category: str):
     """
     original_prompt = output[0]["input"]
     partial_prompts = [o["output"] for o in output if o["applied"]]
-    new_prompt = await merge_prompts(partial_prompts) if partial_prompts else original_prompt
-
-    patterns = []
-    for o in output:
-        patterns.append({
-            "pattern": o["pattern"], 
-            "applied": o["applied"], 
-            "feedback": o["feedback"]
-        })
+    with labelled(category=category):
+        new_prompt = await merge_prompts(partial_prompts) if partial_prompts else original_prompt
 
     return {
         "input": original_prompt,
         "category": category,
-        "patterns": patterns,
+        "patterns": _pattern_summaries(output, category),
         "preview": new_prompt
     }
 
 
+def _lazy_category_output(output: list[dict], category: str):
+    """
+    Same shape as _standardize_pattern_outputs, but without merging: the preview is only
+    set when it needs no merge (zero or one distinct applied output) and None otherwise.
+    """
+    original_prompt = output[0]["input"]
+    partial_prompts = _applied_outputs(output)
+    if len(partial_prompts) > 1:
+        preview = None
+    else:
+        preview = partial_prompts[0] if partial_prompts else original_prompt
+
+    return {
+        "input": original_prompt,
+        "category": category,
+        "patterns": _pattern_summaries(output, category),
+        "preview": preview
+    }
+
+
+def _pattern_summaries(output: list[dict], category: str) -> List[dict]:
+    """
+    Per-pattern metadata kept with a category. The output and the hash of the input it was
+    computed from are stored so previews can be merged later and toggles can reuse them.
+    """
+    patterns = []
+    for o in output:
+        patterns.append({
+            "pattern": o["pattern"],
+            "applied": o["applied"],
+            "feedback": o["feedback"],
+            "output": o["output"],
+            "input_hash": pattern_input_hash(o["input"], category, o["pattern"]) if o["applied"] else None,
+            "error": o.get("error"),
+        })
+    return patterns
+
+
 def _build_pattern_prompt(user_input: str, category: str, pattern: str):
     """
     Construct the prompt template for a specific pattern and category.
@@ -227,32 +925,160 @@ def _build_pattern_prompt(user_input: str, category: str, pattern: str):
     Returns:
         str: Filled-in template prompt.
     """
-    return TEMPLATE_PROMPT.format(
-        category=category,
-        pattern=pattern,
-        prompt=user_input,
-        context=PATTERN_TO_CONTEXT[pattern]
-    )
+    return prompt_registry.pattern(pattern).format(prompt=user_input)
 
 
-async def _generate_response(query, history=[]):
+def _pattern_version(pattern: str) -> str:
+    """
+    Version of the prompts a pattern's result depends on, so editing one pattern's context
+    only invalidates that pattern's cached results.
+    """
+    if f"pattern/{pattern}" not in prompt_registry:
+        return TEMPLATE_VERSION
+    return prompt_registry.version_of(f"pattern/{pattern}", f"fused/{pattern}", "evaluation", "improvement")
+
+
+async def _generate_response(query, history: Optional[Conversation] = None):
     """
     Send a prompt (optionally with history) to the LLM and get a response.
 
     Args:
         query (str or HumanMessage): Input message to send to the LLM.
-        history (list): List of prior messages for context.
+        history (Conversation, optional): Prior messages for context; never modified.
 
     Returns:
         str: The LLM-generated message content.
     """
-    llm = ChatOpenAI(model=MODEL, openai_api_key=OPENAI_KEY, temperature=0.0)
-    messages = history
-    messages.append(query)
-    response = await llm.ainvoke(messages)
+    labels = current_labels("step", "pattern", "category")
+    step = labels["step"] or "unknown"
+    profile = llm_router.resolve(step, labels["pattern"] or None)
+    # Retries are handled by llm_resilience, so the client itself must not retry
+    llm = profile.client(include_response_headers=True, max_retries=0)
+    messages, truncated = prompt_messages(query, history, profile.model)
+    if truncated:
+        LLM_PROMPT_TRUNCATED_TOKENS.inc(truncated, step=step)
+    prompt_tokens = count_message_tokens(messages, profile.model)
+
+    async def attempt(reservation):
+        try:
+            with LLM_CALL_SECONDS.time(**labels):
+                response = await llm.ainvoke(messages)
+        except asyncio.CancelledError:
+            LLM_CALLS.inc(step=labels["step"], status="cancelled")
+            raise
+        except Exception:
+            LLM_CALLS.inc(step=labels["step"], status="error")
+            raise
+        LLM_CALLS.inc(step=labels["step"], status="ok")
+        llm_scheduler.observe(reservation, response)
+        return response
+
+    # Deadline, retries, hedging and circuit breaker; the scheduler slot is awaited outside the deadline
+    start = time.perf_counter()
+    try:
+        response = await llm_resilience.call(step, attempt, slot=lambda: llm_scheduler.slot(prompt_tokens))
+    except Exception:
+        llm_router.observe(step, profile, time.perf_counter() - start, error=True)
+        raise
+    record = record_call(profile.model, messages, response)
+    llm_router.observe(step, profile, time.perf_counter() - start, record.input_tokens, record.output_tokens)
     return response.content
 
 
+async def _stream_response(query, history: Optional[Conversation] = None) -> AsyncIterator[str]:
+    """
+    Streaming variant of _generate_response: yields the completion text as it arrives.
+
+    Deadline, retries and the circuit breaker cover the call up to its first chunk (it is
+    never hedged); after that every chunk has to arrive within the step deadline and an
+    error is raised to the caller, since text has already been yielded.
+
+    Args:
+        query (str or HumanMessage): Input message to send to the LLM.
+        history (Conversation, optional): Prior messages for context; never modified.
+    """
+    labels = current_labels("step", "pattern", "category")
+    step = labels["step"] or "unknown"
+    profile = llm_router.resolve(step, labels["pattern"] or None)
+    llm = profile.client(include_response_headers=True, max_retries=0, stream_usage=True)
+    messages, truncated = prompt_messages(query, history, profile.model)
+    if truncated:
+        LLM_PROMPT_TRUNCATED_TOKENS.inc(truncated, step=step)
+    prompt_tokens = count_message_tokens(messages, profile.model)
+    deadline = llm_resilience.step_deadline(step)
+
+    @asynccontextmanager
+    async def slot():
+        # The scheduler slot is held from the request until the stream ends, so a successful
+        # attempt hands it over to the caller instead of releasing it
+        call = AsyncExitStack()
+        reservation = await call.enter_async_context(llm_scheduler.slot(prompt_tokens))
+        try:
+            yield call, reservation
+        except BaseException:
+            await call.aclose()
+            raise
+
+    async def attempt(held):
+        call, reservation = held
+        stream = llm.astream(messages)
+        call.push_async_callback(stream.aclose)
+        try:
+            return call, reservation, stream, await stream.__anext__()
+        except StopAsyncIteration:
+            raise Exception("Empty completion stream")
+
+    start = time.perf_counter()
+    try:
+        with LLM_CALL_SECONDS.time(**labels):
+            try:
+                call, reservation, stream, response = await llm_resilience.call(step, attempt, hedge=False, slot=slot)
+            except asyncio.CancelledError:
+                LLM_CALLS.inc(step=labels["step"], status="cancelled")
+                raise
+            except Exception:
+                LLM_CALLS.inc(step=labels["step"], status="error")
+                raise
+
+            async with call:
+                try:
+                    if response.content:
+                        yield response.content
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), deadline)
+                        except StopAsyncIteration:
+                            break
+                        response += chunk
+                        if chunk.content:
+                            yield chunk.content
+                except (asyncio.CancelledError, GeneratorExit):
+                    LLM_CALLS.inc(step=labels["step"], status="cancelled")
+                    raise
+                except Exception:
+                    LLM_CALLS.inc(step=labels["step"], status="error")
+                    raise
+                LLM_CALLS.inc(step=labels["step"], status="ok")
+                llm_scheduler.observe(reservation, response)
+    except Exception:
+        llm_router.observe(step, profile, time.perf_counter() - start, error=True)
+        raise
+    record = record_call(profile.model, messages, response)
+    llm_router.observe(step, profile, time.perf_counter() - start, record.input_tokens, record.output_tokens)
+
+
+async def _stream_tag(query, extractor: TagExtractor) -> AsyncIterator[str]:
+    """
+    Stream a completion, yielding only the text inside the extractor's tag. Closing this
+    generator closes the LLM stream, so abandoned rewrites free their slot at once.
+    """
+    async with aclosing(_stream_response(query)) as texts:
+        async for text in texts:
+            text = extractor.feed(text)
+            if text:
+                yield text
+
+
 def _extract_prompt(response):
     """
     Extract content between <PROMPT>...</PROMPT> tags from the model response.
@@ -263,7 +1089,21 @@ def _extract_prompt(response):
     Returns:
         str: Extracted prompt content.
     """
-    match = re.search(r"<PROMPT>(.*?)</PROMPT>", response, re.DOTALL)
+    return _extract_tag(response, "PROMPT")
+
+
+def _extract_tag(response, tag):
+    """
+    Extract content between <TAG>...</TAG> tags from the model response.
+
+    Args:
+        response (str): Raw response from LLM.
+        tag (str): Tag name to look for.
+
+    Returns:
+        str: Extracted tag content.
+    """
+    match = re.search(rf"<{tag}>(.*?)</{tag}>", response, re.DOTALL)
     if not match:
         raise Exception(response)
     return match.group(1).strip()
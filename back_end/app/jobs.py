@@ -0,0 +1,242 @@
+"""
+Postgres-backed generation job queue and async worker pool.
+
+Jobs are claimed with `SELECT ... FOR UPDATE SKIP LOCKED`, so any number of workers,
+in the API process or in separate processes, can share the same queue table. A worker
+heartbeats the lease of the job it runs; a job whose worker went silent is claimed
+again, or marked failed by the sweep when it was on its last attempt.
+
+Run standalone workers (set JOB_WORKERS_IN_PROCESS=false on the API tier):
+
+    python -m app.jobs
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+JOB_WORKERS_IN_PROCESS = os.getenv("JOB_WORKERS_IN_PROCESS", "true").lower() == "true"
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+# A running job whose worker has been silent for this long is considered abandoned
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+# Seconds between lease refreshes of a running job, and between sweeps for abandoned jobs
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "60"))
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_INTERVAL", "60"))
+
+logger = logging.getLogger(__name__)
+
+CLAIM_JOB_SQL = """
+UPDATE "GenerationJob"
+SET status = 'running', attempts = attempts + 1, locked_at = timezone('utc', now()), updated_at = timezone('utc', now())
+WHERE job_id = (
+    SELECT job_id FROM "GenerationJob"
+    WHERE attempts < max_attempts
+      AND (
+        (status = 'queued' AND available_at <= timezone('utc', now()))
+        OR (status = 'running' AND locked_at < timezone('utc', now()) - make_interval(secs => $1))
+      )
+    ORDER BY created_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING job_id, user_id, input, fused, attempts, max_attempts
+"""
+
+# Abandoned jobs that cannot be claimed again
+EXPIRE_JOBS_SQL = """
+UPDATE "GenerationJob"
+SET status = 'failed', error = $2, finished_at = timezone('utc', now()), updated_at = timezone('utc', now())
+WHERE status = 'running'
+  AND attempts >= max_attempts
+  AND locked_at < timezone('utc', now()) - make_interval(secs => $1)
+"""
+
+
+class JobQueue:
+    """Data access for the `GenerationJob` queue table."""
+
+    def __init__(self, client=None):
+        if client is None:
+            from app.client import prisma_client as client
+        self.client = client
+
+    async def enqueue(self, user_id: str, user_input: str, fused: Optional[bool] = None):
+        return await self.client.generationjob.create(
+            data={
+                "user_id": user_id,
+                "input": user_input,
+                "fused": fused,
+                "max_attempts": JOB_MAX_ATTEMPTS,
+            }
+        )
+
+    async def get(self, job_id: str):
+        return await self.client.generationjob.find_unique(where={"job_id": job_id})
+
+    async def claim(self) -> Optional[dict]:
+        """Atomically claim the oldest runnable job, or return None if there is none."""
+        rows = await self.client.query_raw(CLAIM_JOB_SQL, JOB_LEASE_SECONDS)
+        return rows[0] if rows else None
+
+    async def heartbeat(self, job: dict):
+        """Refresh the lease of a running job, unless it was claimed again since."""
+        await self.client.generationjob.update_many(
+            where={"job_id": job["job_id"], "status": "running", "attempts": job["attempts"]},
+            data={"locked_at": datetime.now(timezone.utc)},
+        )
+
+    async def expire_abandoned(self) -> int:
+        """Mark abandoned jobs without attempts left as failed. Returns how many."""
+        return await self.client.execute_raw(
+            EXPIRE_JOBS_SQL, JOB_LEASE_SECONDS, "Worker stopped responding on the last attempt"
+        )
+
+    async def complete(self, job_id: str, response_id: str):
+        await self.client.generationjob.update(
+            where={"job_id": job_id},
+            data={
+                "status": "succeeded",
+                "response_id": response_id,
+                "error": None,
+                "finished_at": datetime.now(timezone.utc),
+            }
+        )
+
+    async def fail(self, job: dict, error: str):
+        """Requeue the job with exponential backoff, or mark it failed when out of attempts."""
+        now = datetime.now(timezone.utc)
+        if job["attempts"] < job["max_attempts"]:
+            data = {
+                "status": "queued",
+                "error": error,
+                "available_at": now + timedelta(seconds=JOB_RETRY_BACKOFF * 2 ** (job["attempts"] - 1)),
+            }
+        else:
+            data = {"status": "failed", "error": error, "finished_at": now}
+
+        await self.client.generationjob.update(where={"job_id": job["job_id"]}, data=data)
+
+
+class JobWorkerPool:
+    """
+    Pool of async workers that claim and run jobs until stopped.
+
+    Args:
+        queue (JobQueue): Queue to claim jobs from.
+        handler (Callable): Runs a claimed job and returns the created response id.
+        concurrency (int): Number of concurrent workers.
+        poll_interval (float): Seconds to sleep when the queue is empty.
+        heartbeat_interval (float): Seconds between lease refreshes of a running job.
+        sweep_interval (float): Seconds between sweeps for abandoned jobs.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[dict], Awaitable[str]],
+        concurrency: int = JOB_WORKER_CONCURRENCY,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL,
+        sweep_interval: float = JOB_SWEEP_INTERVAL,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.sweep_interval = sweep_interval
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        self._workers.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def run_once(self) -> bool:
+        """Claim and run a single job. Returns False if the queue was empty."""
+        job = await self.queue.claim()
+        if job is None:
+            return False
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            response_id = await self.handler(job)
+        except asyncio.CancelledError:
+            # Shutting down: let the lease expire so another worker picks the job up
+            raise
+        except Exception as e:
+            logger.exception(f"Generation job {job['job_id']} failed (attempt {job['attempts']}): {e}")
+            await self.queue.fail(job, str(e))
+        else:
+            await self.queue.complete(job["job_id"], response_id)
+        finally:
+            heartbeat.cancel()
+        return True
+
+    async def _heartbeat(self, job: dict):
+        # Keeps the job from being claimed again while its handler is still running
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.queue.heartbeat(job)
+            except Exception as e:
+                logger.warning(f"Heartbeat of generation job {job['job_id']} failed: {e}")
+
+    async def _sweeper(self):
+        while True:
+            try:
+                expired = await self.queue.expire_abandoned()
+                if expired:
+                    logger.warning(f"Marked {expired} abandoned generation jobs without attempts left as failed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job sweep error: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                if not await self.run_once():
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {index} error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+
+async def _run_standalone():
+    from app.client import connect_db, disconnect_db
+    from app.llm import llm_registry
+    from app.main import job_workers
+
+    await connect_db()
+    await llm_registry.start()
+    await job_workers.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_workers.stop()
+        await llm_registry.close()
+        await disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(_run_standalone())
@@ -0,0 +1,231 @@
+import os
+import json
+import hashlib
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+
+from app.metrics import LLM_ROUTE_SECONDS
+
+# Load environment variables from .env file
+load_dotenv()
+
+OPENAI_KEY = os.getenv("OPENAI_API_KEY")
+# Override to point at an OpenAI-compatible server (e.g. the fake server of the benchmark suite)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+
+# Connection pool sizing for the shared HTTP client used by every LLM call
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "100"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+
+# Model profiles by name; "default" uses MODEL and "fast" uses LLM_FAST_MODEL (MODEL when unset).
+# LLM_PROFILES='{"fast": {"model": "gpt-4.1-nano"}, "rewrite": {"model": "gpt-4.1", "temperature": 0.2}}'
+# adds or overrides profiles.
+MODEL = os.getenv("MODEL")
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL") or MODEL
+LLM_PROFILES = json.loads(os.getenv("LLM_PROFILES", "{}"))
+
+# Pipeline step -> profile. Keys are a step ("evaluation"), a step for one pattern
+# ("improvement/Persona") or every step of a pattern ("*/Persona"); the most specific key wins.
+# LLM_ROUTES='{"merge": "rewrite", "*/Template": "default"}' adds or overrides routes.
+DEFAULT_ROUTES = {"evaluation": "fast", "triage": "fast"}
+LLM_ROUTES = {**DEFAULT_ROUTES, **json.loads(os.getenv("LLM_ROUTES", "{}"))}
+
+
+class LLMRegistry:
+    """
+    Process-wide registry of chat model clients.
+
+    Clients are keyed by (model, temperature, settings) and all of them share a
+    single pooled HTTP client, so connections (and their TLS sessions) are kept
+    alive and reused across pipeline calls instead of being rebuilt per call.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        pool_size: int = LLM_POOL_SIZE,
+        keepalive_connections: int = LLM_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+        base_url: Optional[str] = None,
+    ):
+        self.api_key = api_key or OPENAI_KEY
+        self.base_url = base_url or OPENAI_BASE_URL
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._clients: Dict[Tuple, ChatOpenAI] = {}
+
+    async def start(self):
+        """Open the shared HTTP connection pool (called on app startup)."""
+        self._ensure_http_client()
+
+    async def close(self):
+        """Drop all cached clients and close the shared connection pool (called on app shutdown)."""
+        self._clients.clear()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    def get(self, model: str, temperature: float = 0.0, **settings) -> ChatOpenAI:
+        """
+        Return the shared client for a model configuration, creating it on first use.
+
+        Args:
+            model (str): Model name.
+            temperature (float): Sampling temperature.
+            **settings: Extra ChatOpenAI keyword arguments; must be hashable.
+
+        Returns:
+            ChatOpenAI: Cached client bound to the shared connection pool.
+        """
+        key = (model, temperature, tuple(sorted(settings.items())))
+        llm = self._clients.get(key)
+        if llm is None:
+            llm = ChatOpenAI(
+                model=model,
+                openai_api_key=self.api_key,
+                openai_api_base=self.base_url,
+                temperature=temperature,
+                http_async_client=self._ensure_http_client(),
+                **settings
+            )
+            self._clients[key] = llm
+        return llm
+
+    def _ensure_http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(limits=self.limits)
+            # Clients bound to a closed pool cannot be reused
+            self._clients.clear()
+        return self._http_client
+
+
+# Same registry gets used in instance
+llm_registry = LLMRegistry()
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """
+    Model configuration a pipeline step is routed to.
+
+    Args:
+        name (str): Profile name used in the routing table.
+        model (str): Model name.
+        temperature (float): Sampling temperature.
+        settings (dict): Extra ChatOpenAI keyword arguments (e.g. reasoning_effort).
+    """
+
+    name: str
+    model: str
+    temperature: float = 0.0
+    settings: Dict[str, object] = field(default_factory=dict)
+
+    def client(self, **settings) -> ChatOpenAI:
+        """Shared client for this profile."""
+        return llm_registry.get(self.model, temperature=self.temperature, **{**self.settings, **settings})
+
+
+class _RouteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+
+class LLMRouter:
+    """
+    Resolves the model profile of each LLM call from its step and pattern, and collects
+    per-route latency and token stats for tuning the routing table.
+
+    Args:
+        profiles (dict): Profile name -> {"model", "temperature", "settings"}.
+        routes (dict): Routing key -> profile name.
+        default (str): Profile of calls without a matching route.
+    """
+
+    def __init__(
+        self,
+        profiles: Optional[Dict[str, dict]] = None,
+        routes: Optional[Dict[str, str]] = None,
+        default: str = "default",
+    ):
+        profiles = {
+            "default": {"model": MODEL},
+            "fast": {"model": LLM_FAST_MODEL},
+            **(LLM_PROFILES if profiles is None else profiles),
+        }
+        self.profiles = {name: ModelProfile(name=name, **config) for name, config in profiles.items()}
+        self.routes = LLM_ROUTES if routes is None else routes
+        self.default = default
+        for profile in [*self.routes.values(), default]:
+            if profile not in self.profiles:
+                raise Exception(f"Unknown model profile {profile}")
+        self._stats: Dict[Tuple[str, str, str], _RouteStats] = {}
+
+    @property
+    def version(self) -> str:
+        """Fingerprint of the profiles and routes, for cache keys of generated results."""
+        table = {"profiles": {name: asdict(profile) for name, profile in self.profiles.items()}, "routes": self.routes}
+        return hashlib.sha256(json.dumps(table, sort_keys=True, default=str).encode()).hexdigest()
+
+    def resolve(self, step: str, pattern: Optional[str] = None) -> ModelProfile:
+        """Profile for a call: "<step>/<pattern>", then "*/<pattern>", then "<step>", then the default."""
+        keys = [f"{step}/{pattern}", f"*/{pattern}"] if pattern else []
+        for key in keys + [step]:
+            if key in self.routes:
+                return self.profiles[self.routes[key]]
+        return self.profiles[self.default]
+
+    def observe(
+        self,
+        step: str,
+        profile: ModelProfile,
+        seconds: float,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        error: bool = False,
+    ):
+        """Record one finished call of a route."""
+        LLM_ROUTE_SECONDS.observe(seconds, step=step, profile=profile.name, model=profile.model)
+        stats = self._stats.setdefault((step, profile.name, profile.model), _RouteStats())
+        stats.calls += 1
+        stats.errors += error
+        stats.seconds += seconds
+        stats.input_tokens += input_tokens
+        stats.output_tokens += output_tokens
+
+    def stats(self) -> dict:
+        """Routing table and per-route call counts, latency and tokens."""
+        return {
+            "profiles": {name: asdict(profile) for name, profile in self.profiles.items()},
+            "routes": self.routes,
+            "default": self.default,
+            "observed": [
+                {
+                    "step": step,
+                    "profile": profile,
+                    "model": model,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "avg_seconds": stats.seconds / stats.calls if stats.calls else 0.0,
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                }
+                for (step, profile, model), stats in sorted(self._stats.items())
+            ],
+        }
+
+
+# Same router gets used in instance
+llm_router = LLMRouter()
@@ -2,39 +2,57 @@
 # Imports and Setup
 # ============================
 
-from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from prisma import Prisma
-from typing import List
-import traceback
+from typing import Optional
+from contextlib import aclosing
+from datetime import datetime
+import json
 import time
+import asyncio
 import logging
 
 from app.dependencies import use_logging
-from app.middleware import LoggingMiddleware, AuthMiddleware
+from app.middleware import LoggingMiddleware, AuthMiddleware, MetricsMiddleware
+from app.middleware.auth import SESSION_COOKIE, session_cache
 from app.types.response import (
     ResponseCreate, ResponseRead, UserRead, UserCreate,
     ResponseOutputUpdate, CategoryRead, CategoryPatternUpdate,
-    MergePreviewPrompts
+    MergePreviewPrompts, ManualImprovement, JobRead, ResponsePage, ResponseSummary
+)
+from app.generation_pipeline import (
+    improve_prompt, iter_improve_prompt, apply_category, merge_prompts, iter_merge_prompts,
+    iter_manually_improve_prompt, retry_failed_patterns
 )
-from app.generation_pipeline import improve_prompt, apply_category, merge_prompts
 from app.client import prisma_client as prisma
+from app.llm import llm_registry, llm_router
+from app.cache import result_cache
+from app.rate_limit import llm_scheduler
+from app.metrics import labelled, registry as metrics_registry
+from app.jobs import JobQueue, JobWorkerPool, JOB_WORKERS_IN_PROCESS
+from app.repository import (
+    ResponseStore, applied_patterns, category_priority, sort_category, sort_response, truncate
+)
+from app.usage import BudgetExceeded, UsageStore, tracking
+from app.resilience import CircuitOpen
+from app.disconnect import ClientDisconnected, cancel_on_disconnect, record_cancellation
+from app.prompts import prompt_registry
+from app.speculation import speculation_policy
 
-# Initialize FastAPI app and set logging level
-logging.basicConfig(level=logging.ERROR)
+# Initialize FastAPI app; logging is configured by LoggingMiddleware
 app = FastAPI()
 
-# Priority sorting logic for category display
-category_priority = {
-    "Input Semantics": 0,
-    "Output Customization": 1,
-    "Error Identification": 2,
-    "Prompt Improvement": 3,
-    "Interaction": 4,
-    "Context Control": 5,
-}
+# Propagates to the request-context aware, queue-backed root handler set up by LoggingMiddleware
+logger = logging.getLogger(app.title)
+
+# Write layer for responses, categories and patterns
+response_store = ResponseStore(prisma)
+
+# Per-user daily token usage and budgets
+usage_store = UsageStore(prisma)
 
 # ============================
 # Exception Handling
@@ -51,7 +69,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     except Exception:
         body = "<could not parse body>"
 
-    logging.error(f"""
+    logger.error(f"""
 ❌ 422 Validation error on POST {request.url.path}
     → Payload: {body!r}
     → Errors: {exc.errors()}
@@ -62,6 +80,24 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": exc.errors()}
     )
 
+@app.exception_handler(CircuitOpen)
+async def circuit_open_exception_handler(request: Request, exc: CircuitOpen):
+    """
+    The LLM provider is failing; tell clients to come back later instead of a 500.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after) + 1)}
+    )
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_exception_handler(request: Request, exc: ClientDisconnected):
+    """
+    The client is gone and nobody reads this; 499 keeps it apart from server errors in logs.
+    """
+    return JSONResponse(status_code=499, content={"detail": str(exc)})
+
 # ============================
 # Middleware Setup
 # ============================
@@ -77,6 +113,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the recorded latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # ============================
 # Basic Health Check
 # ============================
@@ -88,9 +127,51 @@ async def root(request: Request, logger=Depends(use_logging)):
 
 @app.post("/api/v1/health")
 async def health_check(request: Request):
-    print("Health check endpoint called")
+    logger.info("Health check endpoint called")
     return JSONResponse(content={"status": "ok"}, status_code=200)
 
+@app.get("/api/v1/cache/stats")
+async def cache_stats(request: Request):
+    """
+    Hit/miss counters of the generation result cache.
+    """
+    return result_cache.stats()
+
+@app.get("/api/v1/scheduler/stats")
+async def scheduler_stats(request: Request):
+    """
+    Queue depth, wait times and throttle counters of the LLM call scheduler.
+    """
+    return llm_scheduler.stats()
+
+@app.get("/api/v1/prompts/stats")
+async def prompt_stats(request: Request):
+    """
+    Template version, static prefix sizes and provider prompt cache hit rates.
+    """
+    return prompt_registry.stats()
+
+@app.get("/api/v1/llm/routes")
+async def llm_routes(request: Request):
+    """
+    Model profiles, step routing table and per-route latency and token stats.
+    """
+    return llm_router.stats()
+
+@app.get("/api/v1/speculation/stats")
+async def speculation_stats(request: Request):
+    """
+    Speculative improvement policy with per-pattern apply rates, tokens wasted and seconds saved.
+    """
+    return speculation_policy.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """
+    Prometheus scrape endpoint.
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # ============================
 # User Management
 # ============================
@@ -109,6 +190,15 @@ async def create_user(request: Request, user: UserCreate):
     )
     return new_user
 
+@app.post("/api/v1/users/signout", status_code=status.HTTP_204_NO_CONTENT)
+async def sign_out(request: Request):
+    """
+    Forget the caller's cached session so the token is resolved again if it is ever reused.
+    """
+    token = request.cookies.get(SESSION_COOKIE)
+    if token:
+        session_cache.invalidate(token)
+
 # ============================
 # Response CRUD
 # ============================
@@ -145,23 +235,38 @@ async def delete_response_by_id(request: Request, response_id: str):
     await prisma.response.delete(where={"response_id": response_id})
     return  # 204 No Content
 
-@app.get("/api/v1/responses/", response_model=List[ResponseRead])
-async def get_all_responses(request: Request):
-    """
-    Get all responses belonging to the authenticated user.
+@app.get("/api/v1/responses/", response_model=ResponsePage)
+async def get_all_responses(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    text_length: int = Query(280, ge=1, le=10000),
+):
     """
-    responses = await prisma.response.find_many(
-        where={"user_id": request.state.userId},
-        include={"categories": {"include": {"patterns": True}}}
-    )
+    Get a page of summaries of the responses belonging to the authenticated user, newest first.
 
-    # Sort each response's categories and patterns
-    for response in responses:
-        response.categories.sort(key=lambda c: category_priority.get(c.category, float('inf')))
-        for category in response.categories:
-            category.patterns.sort(key=lambda p: p.pattern.lower())
-
-    return responses
+    Pass the returned `next_cursor` as `cursor` to get the following page.
+    Use get_response_by_id for the categories and patterns of a response.
+    """
+    try:
+        responses, next_cursor = await response_store.list_summaries(
+            request.state.userId, limit, cursor, created_after, created_before
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items = [
+        ResponseSummary(
+            response_id=response.response_id,
+            input=truncate(response.input, text_length),
+            output=truncate(response.output, text_length),
+            created_at=response.created_at,
+        )
+        for response in responses
+    ]
+    return ResponsePage(items=items, next_cursor=next_cursor)
 
 @app.post("/api/v1/responses/", response_model=ResponseRead)
 async def create_response(request: Request, response: ResponseCreate):
@@ -169,63 +274,154 @@ async def create_response(request: Request, response: ResponseCreate):
     Generate a new response using the prompt improvement pipeline,
     store it along with associated categories and patterns.
     """
-    print("Creating response...")
+    logger.info("Creating response...")
     start = time.time()
     user_id = request.state.userId
+    await _check_budget(user_id)
 
+    usage = None
     try:
-        print("📥 Received input:", response.input)
+        logger.info(f"📥 Received input: {response.input}")
         start_ai = time.time()
-        improvement = await improve_prompt(response.input)
-        print(f"🧠 AI call took {time.time() - start_ai:.2f}s")
-
-        # Store response
-        new_response = await prisma.response.create(
-            data={
-                "user_id": user_id,
-                "input": response.input,
-                "output": improvement["output"],
-            }
-        )
-
-        # Store associated categories and patterns
-        for category_data in improvement["categories"]:
-            new_category = await prisma.category.create(
-                data={
-                    "response_id": new_response.response_id,
-                    "category": category_data["category"],
-                    "input": improvement["input"],
-                    "preview": category_data["preview"],
-                }
+        with tracking(user_id) as usage:
+            improvement = await cancel_on_disconnect(
+                request, improve_prompt(response.input, fused=response.fused), "create_response", usage
             )
-
-            for pattern_data in category_data.get("patterns", []):
-                await prisma.pattern.create(
-                    data={
-                        "category_id": new_category.category_id,
-                        "pattern": pattern_data["pattern"],
-                        "feedback": pattern_data.get("feedback", ""),
-                        "applied": pattern_data.get("applied", False),
-                    }
-                )
-
-        # Fetch full response including nested data
-        full_response = await prisma.response.find_unique(
-            where={"response_id": new_response.response_id},
-            include={"categories": {"include": {"patterns": True}}}
+        logger.info(
+            f"🧠 AI call took {time.time() - start_ai:.2f}s "
+            f"({usage.summary()}, reduction {improvement.get('reduction')})"
         )
 
-        # Sort categories and patterns
-        full_response.categories.sort(key=lambda c: category_priority.get(c.category, float('inf')))
-        for category in full_response.categories:
-            category.patterns.sort(key=lambda p: p.pattern.lower())
+        full_response = await response_store.store_improvement(user_id, response.input, improvement, usage)
 
-        print(f"✅ Done in {time.time() - start:.2f}s")
+        outcome, failed = improvement.get("status", "complete"), len(improvement.get("failed", []))
+        logger.info(f"✅ Done in {time.time() - start:.2f}s ({outcome}, {failed} failed patterns)")
         return full_response
 
+    except (ClientDisconnected, CircuitOpen):
+        await _record_unstored(usage)
+        raise
+    except Exception as e:
+        await _record_unstored(usage)
+        logger.exception(f"❌ Error in create_response: {e}")
+        raise HTTPException(status_code=500, detail="Something went wrong while processing your request.")
+
+@app.post("/api/v1/responses/stream")
+async def create_response_stream(request: Request, response: ResponseCreate):
+    """
+    Streaming variant of create_response using Server-Sent Events.
+
+    Emits a `pattern` event per pattern verdict, a `category` event per category preview,
+    a `result` event with the final merged output, and finally a `response` event with
+    the stored response once it has been persisted.
+    """
+    user_id = request.state.userId
+    await _check_budget(user_id)
+
+    async def event_stream():
+        usage = None
+        try:
+            improvement = None
+            with tracking(user_id) as usage:
+                async for event in iter_improve_prompt(response.input, fused=response.fused):
+                    if event["event"] == "result":
+                        improvement = event["data"]
+                        yield _sse("result", {
+                            "input": improvement["input"],
+                            "output": improvement["output"],
+                            "reduction": improvement.get("reduction"),
+                        })
+                    else:
+                        yield _sse(event["event"], event["data"])
+
+            full_response = await response_store.store_improvement(user_id, response.input, improvement, usage)
+            stored = ResponseRead.model_validate(full_response, from_attributes=True)
+            yield _sse("response", stored.model_dump(mode="json"))
+
+        except asyncio.CancelledError:
+            # The stream is cancelled when the client disconnects; pending pattern tasks are cancelled with it
+            record_cancellation("create_response_stream", usage)
+            await _record_unstored(usage)
+            raise
+        except Exception as e:
+            await _record_unstored(usage)
+            logger.exception(f"❌ Error in create_response_stream: {e}")
+            yield _sse("error", {"detail": "Something went wrong while processing your request."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _record_unstored(usage):
+    """Log the LLM calls of a failed or cancelled generation so they still count against the budget."""
+    if usage is None:
+        return
+    try:
+        await usage_store.record_calls(usage)
+    except Exception as e:
+        logger.warning(f"Could not log the LLM calls of an unstored generation: {e}")
+
+def _sse(event: str, data) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _check_budget(user_id: str):
+    """Reject the request before any LLM call if the user has spent today's token budget."""
+    try:
+        await usage_store.check_budget(user_id)
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+@app.post("/api/v1/responses/{response_id}/retry", response_model=ResponseRead)
+async def retry_response(request: Request, response_id: str):
+    """
+    Re-run the patterns that failed in a partial response and merge again.
+
+    Patterns that succeeded are reused as stored, so only the failed ones (and the merges
+    over them) call the LLM. A complete response is returned unchanged.
+    """
+    existing = await prisma.response.find_unique(
+        where={"response_id": response_id},
+        include={"categories": {"include": {"patterns": True}}}
+    )
+    if not existing:
+        raise HTTPException(status_code=404, detail="Response not found")
+    if existing.status == "complete":
+        return sort_response(existing)
+    user_id = request.state.userId
+    await _check_budget(user_id)
+
+    stored = {
+        category.category: {
+            pattern.pattern: {
+                "applied": pattern.applied,
+                "feedback": pattern.feedback,
+                "output": pattern.output,
+                "error": pattern.error,
+            }
+            for pattern in category.patterns
+        }
+        for category in existing.categories
+    }
+
+    usage = None
+    try:
+        with tracking(user_id) as usage:
+            improvement = await cancel_on_disconnect(
+                request, retry_failed_patterns(existing.input, stored), "retry_response", usage
+            )
+        failed = len(improvement["failed"])
+        logger.info(f"Retried response {response_id}: {improvement['status']}, {failed} patterns still failing")
+        return await response_store.update_improvement(existing, improvement, usage)
+
+    except (ClientDisconnected, CircuitOpen):
+        await _record_unstored(usage)
+        raise
     except Exception as e:
-        print("❌ Error in create_response:", str(e))
-        traceback.print_exc()
+        await _record_unstored(usage)
+        logger.exception(f"❌ Error in retry_response: {e}")
         raise HTTPException(status_code=500, detail="Something went wrong while processing your request.")
 
 # ============================
@@ -240,21 +436,87 @@ async def merge_and_update_response(request: Request, response_id: str, previews
     existing_response = await prisma.response.find_unique(where={"response_id": response_id})
     if not existing_response:
         raise HTTPException(status_code=404, detail="Response not found")
+    await _check_budget(request.state.userId)
 
-    merged_prompt = await merge_prompts(previews_input.previews)
+    with tracking(request.state.userId) as usage:
+        try:
+            merged_prompt = await merge_prompts(previews_input.previews)
+        except Exception:
+            await _record_unstored(usage)
+            raise
 
-    updated_response = await prisma.response.update(
-        where={"response_id": response_id},
-        data={"output": merged_prompt},
-        include={"categories": {"include": {"patterns": True}}}
+    return await response_store.update_output(response_id, merged_prompt, usage)
+
+@app.put("/api/v1/responses/merge/{response_id}/stream")
+async def merge_and_update_response_stream(request: Request, response_id: str, previews_input: MergePreviewPrompts):
+    """
+    Streaming variant of merge_and_update_response using Server-Sent Events.
+
+    Emits a `token` event per piece of the merged prompt as the model writes it, then a
+    `response` event with the response once the merged prompt has been stored.
+    """
+    existing_response = await prisma.response.find_unique(where={"response_id": response_id})
+    if not existing_response:
+        raise HTTPException(status_code=404, detail="Response not found")
+    await _check_budget(request.state.userId)
+
+    return _rewrite_stream(
+        request.state.userId, response_id, iter_merge_prompts(previews_input.previews),
+        "merge_and_update_response_stream"
     )
 
-    # Sort after update
-    updated_response.categories.sort(key=lambda c: category_priority.get(c.category, float('inf')))
-    for category in updated_response.categories:
-        category.patterns.sort(key=lambda p: p.pattern.lower())
+@app.post("/api/v1/responses/{response_id}/improve/stream")
+async def improve_response_stream(request: Request, response_id: str, improvement: ManualImprovement):
+    """
+    Rewrite a response's prompt according to the user's feedback, streamed with Server-Sent Events.
+
+    Emits a `token` event per piece of the improved prompt as the model writes it, then a
+    `response` event with the response once the improved prompt has been stored as its output.
+    """
+    existing_response = await prisma.response.find_unique(where={"response_id": response_id})
+    if not existing_response:
+        raise HTTPException(status_code=404, detail="Response not found")
+    await _check_budget(request.state.userId)
+
+    prompt = improvement.prompt if improvement.prompt is not None else existing_response.output
+    return _rewrite_stream(
+        request.state.userId, response_id, iter_manually_improve_prompt(improvement.feedback, prompt),
+        "improve_response_stream"
+    )
 
-    return updated_response
+def _rewrite_stream(user_id: str, response_id: str, events, route: str) -> StreamingResponse:
+    """Forward the token events of a rewrite and store its result as the response output."""
+    async def event_stream():
+        usage = None
+        try:
+            output = None
+            with tracking(user_id) as usage:
+                async with aclosing(events):
+                    async for event in events:
+                        if event["event"] == "result":
+                            output = event["data"]["output"]
+                        else:
+                            yield _sse(event["event"], event["data"])
+
+            full_response = await response_store.update_output(response_id, output, usage)
+            stored = ResponseRead.model_validate(full_response, from_attributes=True)
+            yield _sse("response", stored.model_dump(mode="json"))
+
+        except asyncio.CancelledError:
+            # Cancelled with the stream when the client disconnects, which closes the LLM stream too
+            record_cancellation(route, usage)
+            await _record_unstored(usage)
+            raise
+        except Exception as e:
+            await _record_unstored(usage)
+            logger.exception(f"❌ Error in {route}: {e}")
+            yield _sse("error", {"detail": "Something went wrong while processing your request."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.put("/api/v1/responses/update/{response_id}", response_model=ResponseRead)
 async def update_response_output(request: Request, response_id: str, output_update: ResponseOutputUpdate):
@@ -265,28 +527,18 @@ async def update_response_output(request: Request, response_id: str, output_upda
     if not existing_response:
         raise HTTPException(status_code=404, detail="Response not found")
 
-    updated_response = await prisma.response.update(
-        where={"response_id": response_id},
-        data={"output": output_update.output},
-        include={"categories": {"include": {"patterns": True}}}
-    )
-
-    updated_response.categories.sort(key=lambda c: category_priority.get(c.category, float('inf')))
-    for category in updated_response.categories:
-        category.patterns.sort(key=lambda p: p.pattern.lower())
-
-    return updated_response
+    return await response_store.update_output(response_id, output_update.output)
 
 # ============================
 # Category & Pattern Management
 # ============================
 
 @app.put("/api/v1/categories/{category_id}/patterns", response_model=CategoryRead)
-async def update_category_patterns(category_id: str, update_data: CategoryPatternUpdate):
+async def update_category_patterns(request: Request, category_id: str, update_data: CategoryPatternUpdate):
     """
     Toggle active patterns for a given category and regenerate the preview.
     """
-    logging.info("category_id", category_id)
+    logger.info(f"Updating patterns of category {category_id}")
 
     category = await prisma.category.find_unique(
         where={"category_id": category_id},
@@ -295,35 +547,131 @@ async def update_category_patterns(category_id: str, update_data: CategoryPatter
 
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
-
-    # Update applied status for each pattern
-    for pattern_update in update_data.patterns:
-        await prisma.pattern.update(
-            where={"pattern_id": pattern_update.pattern_id},
-            data={"applied": pattern_update.applied}
+    await _check_budget(request.state.userId)
+
+    # Generate new preview using only active patterns; stored outputs that are still
+    # fresh are reused, so usually only the merge needs the LLM
+    applied = {pattern_update.pattern_id: pattern_update.applied for pattern_update in update_data.patterns}
+    stored = {
+        pattern.pattern: {"feedback": pattern.feedback, "output": pattern.output, "input_hash": pattern.input_hash}
+        for pattern in category.patterns
+    }
+
+    force_patterns = applied_patterns(category.patterns, applied)
+    with tracking(request.state.userId) as usage:
+        if not force_patterns:
+            # Every pattern is toggled off, so the preview is the input as is
+            new_preview = {"preview": category.input, "patterns": []}
+        else:
+            try:
+                new_preview = await cancel_on_disconnect(request, apply_category(
+                    user_input=category.input,
+                    category=category.category,
+                    force_patterns=force_patterns,
+                    stored_patterns=stored
+                ), "update_category_patterns", usage)
+            except Exception:
+                await _record_unstored(usage)
+                raise
+
+    # Keep outputs that had to be recomputed for the next toggle, and the errors of patterns that failed
+    pattern_ids = {pattern.pattern: pattern.pattern_id for pattern in category.patterns}
+    errors = {pattern.pattern: pattern.error for pattern in category.patterns}
+    outputs = {}
+    for p in new_preview["patterns"]:
+        output = (
+            {"output": None, "input_hash": None, "error": p["error"]} if p.get("error")
+            else {"output": p["output"], "input_hash": p["input_hash"], "error": None}
         )
+        previous = stored[p["pattern"]]
+        current = (output["output"], output["input_hash"], output["error"])
+        if current != (previous["output"], previous["input_hash"], errors[p["pattern"]]):
+            outputs[pattern_ids[p["pattern"]]] = output
 
-    # Generate new preview using only active patterns
-    updated_patterns = await prisma.pattern.find_many(
-        where={"category_id": category_id, "applied": True}
-    )
-
-    new_preview = await apply_category(
-        user_input=category.input,
-        category=category.category,
-        force_patterns=[pattern.pattern for pattern in updated_patterns]
-    )
+    # Store toggles, preview, recomputed outputs and usage together
+    return await response_store.update_category(category_id, applied, new_preview["preview"], usage, outputs)
 
-    updated_category = await prisma.category.update(
+@app.get("/api/v1/categories/{category_id}/preview", response_model=CategoryRead)
+async def get_category_preview(request: Request, category_id: str):
+    """
+    Return a category with its preview, merging the applied pattern outputs first if the
+    merge strategy left the preview to be computed on demand.
+    """
+    category = await prisma.category.find_unique(
         where={"category_id": category_id},
-        data={"preview": new_preview["preview"]},
         include={"patterns": True}
     )
 
-    # Sort patterns
-    updated_category.patterns.sort(key=lambda p: p.pattern.lower())
+    if not category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    if category.preview is not None:
+        return sort_category(category)
+    await _check_budget(request.state.userId)
+
+    outputs = [pattern.output for pattern in category.patterns if pattern.applied and pattern.output]
+    with tracking(request.state.userId) as usage, labelled(category=category.category):
+        try:
+            preview = await merge_prompts(outputs) if outputs else category.input
+        except Exception:
+            await _record_unstored(usage)
+            raise
+
+    return await response_store.update_preview(category_id, preview, usage)
+
+# ============================
+# Generation Jobs
+# ============================
+
+job_queue = JobQueue(prisma)
+
+async def _run_generation_job(job: dict) -> str:
+    """
+    Run a claimed generation job and store its result. Returns the new response id.
+    """
+    with tracking(job["user_id"]) as usage:
+        try:
+            improvement = await improve_prompt(job["input"], fused=job["fused"])
+        except Exception:
+            # The job fails (and may be retried), but its calls were still made
+            await _record_unstored(usage)
+            raise
+    stored = await response_store.store_improvement(job["user_id"], job["input"], improvement, usage)
+    return stored.response_id
+
+job_workers = JobWorkerPool(job_queue, _run_generation_job)
+
+@app.post("/api/v1/jobs/", response_model=JobRead, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(request: Request, response: ResponseCreate):
+    """
+    Enqueue a prompt improvement job and return its id immediately.
+    """
+    await _check_budget(request.state.userId)
+    return await job_queue.enqueue(request.state.userId, response.input, response.fused)
+
+@app.get("/api/v1/jobs/{job_id}", response_model=JobRead)
+async def get_job(request: Request, job_id: str):
+    """
+    Get the status of a generation job.
+    """
+    job = await job_queue.get(job_id)
+    if not job or job.user_id != request.state.userId:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+@app.get("/api/v1/jobs/{job_id}/response", response_model=ResponseRead)
+async def get_job_response(request: Request, job_id: str):
+    """
+    Get the finished response produced by a generation job.
+    """
+    job = await job_queue.get(job_id)
+    if not job or job.user_id != request.state.userId:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
 
-    return updated_category
+    return await get_response_by_id(request, job.response_id)
 
 # ============================
 # Lifecycle Events
@@ -331,11 +679,16 @@ async def update_category_patterns(category_id: str, update_data: CategoryPatter
 
 @app.on_event("startup")
 async def startup() -> None:
-    """Connect Prisma client on app startup."""
+    """Connect Prisma client, open the shared LLM connection pool and start job workers on app startup."""
     await prisma.connect()
+    await llm_registry.start()
+    if JOB_WORKERS_IN_PROCESS:
+        await job_workers.start()
 
 @app.on_event("shutdown")
 async def shutdown() -> None:
-    """Disconnect Prisma client on app shutdown."""
+    """Stop job workers, disconnect Prisma client and close the shared LLM connection pool on app shutdown."""
+    await job_workers.stop()
     if prisma.is_connected():
         await prisma.disconnect()
+    await llm_registry.close()
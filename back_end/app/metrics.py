@@ -0,0 +1,261 @@
+"""
+Minimal Prometheus-compatible metrics (counters, histograms and callback gauges)
+rendered in the text exposition format on `/metrics`.
+"""
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Latency buckets in seconds, spanning fast DB queries to slow LLM rewrites
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# Labels describing the pipeline unit currently running (step, pattern, category)
+call_labels: ContextVar[Dict[str, str]] = ContextVar("call_labels", default={})
+
+
+@contextmanager
+def labelled(**labels):
+    """Add labels for everything measured inside the block (inherited by spawned tasks)."""
+    token = call_labels.set({**call_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        call_labels.reset(token)
+
+
+def current_labels(*names: str) -> Dict[str, str]:
+    """Values of the given context labels, empty when unset."""
+    labels = call_labels.get()
+    return {name: labels.get(name, "") for name in names}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Iterable[str], values: Iterable, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def series(self) -> List[Tuple[Dict[str, str], float]]:
+        """Every labelled value recorded so far."""
+        with self._lock:
+            values = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in values]
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts, +Inf count, sum)
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.setdefault(key, [[0] * len(self.buckets), 0, 0.0])
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return series[1] if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            values = [(key, (list(series[0]), series[1], series[2])) for key, series in self._values.items()]
+        for key, (bucket_counts, count, total) in values:
+            cumulative = 0
+            labels = _format_labels(self.labelnames, key)
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Value read from a callback at scrape time, e.g. counters kept by another component."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float], kind: str = "gauge"):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self.type = kind
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {self.callback()}"]
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise Exception(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], float], **kwargs) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, callback, **kwargs))
+
+    def render(self) -> str:
+        """Text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# Same registry gets used in instance
+registry = MetricsRegistry()
+
+# =============================
+# Metric Definitions
+# =============================
+
+LLM_CALL_SECONDS = registry.histogram(
+    "llm_call_duration_seconds", "Latency of a single LLM call.", ("step", "pattern", "category")
+)
+LLM_ROUTE_SECONDS = registry.histogram(
+    "llm_route_duration_seconds", "Latency of LLM calls (including retries) by routed model profile.",
+    ("step", "profile", "model")
+)
+LLM_CALLS = registry.counter(
+    "llm_calls_total", "LLM calls by outcome.", ("step", "status")
+)
+LLM_RESILIENCE_EVENTS = registry.counter(
+    "llm_resilience_events_total", "LLM call timeouts, retries, hedges and short circuits.", ("step", "event")
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "LLM tokens by model and direction (input or output).", ("model", "kind")
+)
+LLM_PROMPT_CACHE_TOKENS = registry.counter(
+    "llm_prompt_cache_tokens_total", "Input tokens served from (hit) or missing (miss) the provider's prompt cache.",
+    ("step", "result")
+)
+LLM_PROMPT_TRUNCATED_TOKENS = registry.counter(
+    "llm_prompt_truncated_tokens_total", "Prompt tokens cut to stay under the per-call token ceiling.", ("step",)
+)
+PIPELINE_STAGE_SECONDS = registry.histogram(
+    "pipeline_stage_duration_seconds", "Latency of generation pipeline stages.", ("stage", "pattern", "category")
+)
+PIPELINE_MERGES = registry.counter(
+    "pipeline_merges_total", "Prompt merges performed while reducing pattern outputs, by strategy.", ("strategy",)
+)
+PIPELINE_FAILED_PATTERNS = registry.counter(
+    "pipeline_failed_patterns_total", "Patterns that failed and were left out of a partial result.",
+    ("category", "pattern")
+)
+PIPELINE_SPECULATIONS = registry.counter(
+    "pipeline_speculations_total",
+    "Improvements started before the evaluation verdict, by outcome (used or discarded).",
+    ("pattern", "outcome")
+)
+PIPELINE_SPECULATION_WASTED_TOKENS = registry.counter(
+    "pipeline_speculation_wasted_tokens_total",
+    "Tokens of discarded speculative improvements by direction; prompts of cancelled calls are estimated.",
+    ("pattern", "kind")
+)
+PIPELINE_SPECULATION_SAVED_SECONDS = registry.counter(
+    "pipeline_speculation_saved_seconds_total", "Critical-path seconds saved by used speculative improvements.",
+    ("pattern",)
+)
+REQUEST_CANCELLATIONS = registry.counter(
+    "request_cancellations_total", "Generations cancelled because the client disconnected.", ("route",)
+)
+LLM_CALLS_SAVED = registry.counter(
+    "llm_calls_saved_total", "Estimated LLM calls not made because their generation was cancelled.", ("route",)
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds", "Latency of a single Prisma query.", ("model", "method")
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Latency of HTTP requests.", ("method", "route", "status")
+)
@@ -1,2 +1,3 @@
 from .logging import LoggingMiddleware
-from .auth import AuthMiddleware
\ No newline at end of file
+from .auth import AuthMiddleware
+from .metrics import MetricsMiddleware
\ No newline at end of file
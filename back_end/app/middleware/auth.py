@@ -3,16 +3,29 @@ from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 import os
 import json
-from typing import Any
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Optional
 from Crypto.Protocol.KDF import HKDF # pip install pycryptodome
-from Crypto.Hash import SHA256 
+from Crypto.Hash import SHA256
 from jose import jwe # pip install python-jose
 from app.client import prisma_client as prisma
-import os
 
+# Resolved sessions are remembered for at most this long (and never past the token's exp).
+# Users are edited by the NextAuth Prisma adapter, not through this backend, so this also
+# bounds how long a token keeps resolving to a user that was deleted or changed email.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000"))
+
+SESSION_COOKIE = "next-auth.session-token"
+
+@lru_cache(maxsize=8)
 def getDerivedEncryptionKey(secret: str) -> Any:
     # Think about including the context in your environment variables.
-    context = str.encode("NextAuth.js Generated Encryption Key") 
+    context = str.encode("NextAuth.js Generated Encryption Key")
     return HKDF(
         master=secret.encode(),
         key_len=32,
@@ -28,7 +41,7 @@ def get_token(token: str) -> dict[str, Any]:
     Get the JWE payload from a NextAuth.js JWT/JWE token in Python
 
     Steps:
-    1. Get the encryption key using HKDF defined in RFC5869
+    1. Get the encryption key using HKDF defined in RFC5869 (derived once per secret)
     2. Decrypt the JWE token using the encryption key
     3. Create a JSON object from the decrypted JWE token
     '''
@@ -37,26 +50,117 @@ def get_token(token: str) -> dict[str, Any]:
     encryption_key = getDerivedEncryptionKey(jwt_secret)
     payload_str = jwe.decrypt(token, encryption_key).decode()
     payload: dict[str, Any] = json.loads(payload_str)
-    
+
     return payload
 
 
+class SessionCache:
+    """
+    Bounded LRU cache mapping a session token digest to its user id until expiry.
+
+    Sessions are forgotten on sign-out; changes to a user made outside the backend are
+    picked up once AUTH_CACHE_TTL runs out.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_size: int = AUTH_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[str]:
+        key = self.digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        user_id, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return user_id
+
+    def set(self, token: str, user_id: str, token_exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+
+        key = self.digest(token)
+        self._entries[key] = (user_id, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        """Forget a single session token (e.g. on sign-out)."""
+        self._entries.pop(self.digest(token), None)
+
+    def invalidate_user(self, user_id: str):
+        """Forget every cached session of a user (e.g. when the user is deleted)."""
+        for key in [key for key, (cached_user_id, _) in self._entries.items() if cached_user_id == user_id]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Same cache gets used in instance
+session_cache = SessionCache()
+
+
 class AuthMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, cache: SessionCache = session_cache):
+        super().__init__(app)
+        self.cache = cache
+        # Derive the encryption key once at startup instead of per request
+        secret = os.getenv("NEXT_AUTH_SECRET")
+        if secret:
+            getDerivedEncryptionKey(secret)
+
+    async def resolve_user_id(self, session_token: str) -> Optional[str]:
+        """
+        Map a session token to a user id, using the cache when possible.
+
+        Uncached tokens are decrypted off the event loop and looked up by email.
+        """
+        user_id = self.cache.get(session_token)
+        if user_id is not None:
+            return user_id
+
+        session = await asyncio.to_thread(get_token, session_token)
+        if not session:
+            return None
+
+        if session.get("exp") is not None and float(session["exp"]) <= time.time():
+            return None
+
+        user = await prisma.user.find_unique(where={'email': session.get("email")})
+        if not user:
+            return None
+
+        self.cache.set(session_token, user.id, session.get("exp"))
+        return user.id
+
     async def dispatch(self, request: Request, call_next):
-        # Allow access to OpenAPI and docs without auth
-        if request.url.path in ["/docs", "/openapi.json", "/redoc"]:
+        # Allow access to OpenAPI, docs and the metrics scrape endpoint without auth
+        if request.url.path in ["/docs", "/openapi.json", "/redoc", "/metrics"]:
             return await call_next(request)
 
-        session_token = request.cookies.get("next-auth.session-token")
+        session_token = request.cookies.get(SESSION_COOKIE)
         if session_token:
             try:
-                session = get_token(session_token)
-                if session:
-                    email = session.get("email")
-                    user = await prisma.user.find_unique(where={'email': email})
-                    if user:
-                        request.state.userId = user.id
-                        return await call_next(request)
+                user_id = await self.resolve_user_id(session_token)
+                if user_id:
+                    request.state.userId = user_id
+                    return await call_next(request)
             except Exception:
                 pass  # Optional: log the error for debugging
 
@@ -1,62 +1,132 @@
+import atexit
 import logging
+import queue
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from typing import IO, Optional, Tuple
 
 from fastapi import FastAPI
 from fastapi.requests import HTTPConnection
-from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from uvicorn.logging import ColourizedFormatter
 
 
+@dataclass(frozen=True)
+class RequestContext:
+    """Context of the request currently being handled."""
+
+    request_id: str
+    client_addr: str
+    request_line: str
+
+
+# Set for the duration of each request; tasks spawned by the request inherit it
+request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
 class _ContextFilter(logging.Filter):
-    """Attaches request context to logs."""
+    """Attaches the current request context to logs."""
 
-    def __init__(self, remote: str, request_line: str):
+    def __init__(self):
         super().__init__("request-context")
-        self.remote = remote
-        self.request_line = request_line
 
     def filter(self, record) -> bool:
+        context = request_context.get()
         record.levelprefix = record.levelname
-        record.client_addr = self.remote
-        record.request_line = self.request_line
+        record.request_id = context.request_id if context else "-"
+        record.client_addr = context.client_addr if context else "-"
+        record.request_line = context.request_line if context else "-"
         return True
 
 
+def configure_logging(
+    level: int,
+    use_colors: bool,
+    stream: Optional[IO] = None,
+    app_loggers: Tuple[str, ...] = ("app",),
+) -> Optional[QueueListener]:
+    """
+    Send every record through one request-context aware, queue-backed handler on the root logger.
+
+    `app_loggers` (and the module loggers below them) log at `level`, other libraries from
+    WARNING. Records are enqueued on the event loop and written to the stream by a
+    background thread; uvicorn's loggers keep their own handlers and do not propagate.
+
+    Returns:
+        QueueListener: The started listener, or None if logging was already configured.
+    """
+    root_logger = logging.getLogger()
+    if any(isinstance(handler, QueueHandler) for handler in root_logger.handlers):
+        return None  # Already configured by an earlier middleware stack build
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(
+        ColourizedFormatter(
+            "%(levelprefix)s %(client_addr)s - \"%(request_line)s\" [%(request_id)s] %(message)s",
+            use_colors=use_colors
+        ))
+
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(_ContextFilter())
+    listener = QueueListener(queue_handler.queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(max(level, logging.WARNING))
+    for name in app_loggers:
+        logging.getLogger(name).setLevel(level)
+    return listener
+
+
 class LoggingMiddleware:
-    """Configure logging and attach a contextual logger to each request's state."""
+    """Configure logging and attach the app logger and a request id to each request's state."""
 
     def __init__(self, app: ASGIApp, fastapi: FastAPI) -> None:
         self.asgi = app
         self.fastapi = fastapi
+        self.logger = logging.getLogger(self.fastapi.title)
         self._configure_logging()
 
     def _configure_logging(self) -> None:
-        app_logger = logging.getLogger(self.fastapi.title)
-
-        # Steal log handler and log level from uvicorn
+        # Steal log level and colors from uvicorn
         uvicorn_logger = logging.getLogger("uvicorn.access")
-        
+
         if not uvicorn_logger.handlers:
             return
-        app_logger.setLevel(uvicorn_logger.level)
         # This should always exist as we only use uvicorn
         use_color = uvicorn_logger.handlers[0].formatter.use_colors  # type: ignore[reportOptionalMemberAccess]
-
-        stream_handler = logging.StreamHandler()
-        stream_handler.setFormatter(
-            ColourizedFormatter(
-                "%(levelprefix)s %(client_addr)s - \"%(request_line)s\" %(message)s",
-                use_colors=use_color
-            ))
-        app_logger.addHandler(stream_handler)
+        # The app logger has no handler of its own, its records reach the root handler
+        configure_logging(uvicorn_logger.level, use_color, app_loggers=("app", self.logger.name))
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        """Add a logger to request state that inherits from the uvicorn root logger."""
-        if scope["type"] in ["http", "websocket"]:
-            connection = HTTPConnection(scope)
-            connection.state.logger = logging.getLogger(f"{self.fastapi.title}.{scope['path']}")
+        """Set the request context and add the app logger to request state."""
+        if scope["type"] not in ["http", "websocket"]:
+            await self.asgi(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        request_id = connection.headers.get("x-request-id") or uuid.uuid4().hex
+        client = scope.get("client")
+        context = RequestContext(
+            request_id=request_id,
+            client_addr=f"{client[0]}:{client[1]}" if client else "-",
+            request_line=f"{scope.get('method', 'WS')} {scope['path']} HTTP/{scope['http_version']}",
+        )
+
+        connection.state.logger = self.logger
+        connection.state.request_id = request_id
 
-            request_line = f"{scope['method']} {scope['path']} HTTP/{scope['http_version']}"
-            remote_client = f"{scope['client'][0]}:{scope['client'][1]}"
-            connection.state.logger.addFilter(_ContextFilter(remote_client, request_line))
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+            await send(message)
 
-        await self.asgi(scope, receive, send)
+        token = request_context.set(context)
+        try:
+            await self.asgi(scope, receive, send_with_request_id)
+        finally:
+            request_context.reset(token)
@@ -0,0 +1,206 @@
+"""
+Prompt registry compiled from the templates in app.config at import time.
+
+Each prompt is split into its static text (instructions, pattern name and context) and
+the per-request variables. The templates put the variables last, so every call for the
+same prompt starts with a byte-identical prefix that the provider can serve from its
+prompt cache (OpenAI caches prefixes of 1024 tokens and more).
+
+Compiled prompts carry precomputed token counts and a content hash; the hashes are
+the template versions used in result cache keys.
+"""
+import os
+import hashlib
+import json
+from dataclasses import dataclass
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.config import (
+    CATEGORY_TO_PATTERNS,
+    PATTERN_TO_CONTEXT,
+    PATTERN_TO_SUMMARY,
+    TEMPLATE_PROMPT,
+    EVALUATION_PROMPT,
+    IMPROVEMENT_PROMPT,
+    STANDARDIZATION_PROMPT,
+    MANUAL_IMPROVEMENT_PROMPT,
+    FUSED_PATTERN_PROMPT,
+    TRIAGE_PROMPT,
+)
+from app.metrics import LLM_PROMPT_CACHE_TOKENS
+from app.tokens import count_tokens
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Shortest prefix the provider caches
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """
+    A template with its static fields filled in.
+
+    Args:
+        name (str): Registry name, e.g. "pattern/Persona".
+        parts (Tuple): (is_variable, text) pairs; variable parts hold the field name.
+        static_tokens (int): Tokens of all static text.
+        prefix_tokens (int): Tokens of the static text before the first variable.
+        hash (str): Content hash of the compiled prompt.
+    """
+
+    name: str
+    parts: Tuple[Tuple[bool, str], ...]
+    static_tokens: int
+    prefix_tokens: int
+    hash: str
+
+    @property
+    def variables(self) -> List[str]:
+        return [text for is_variable, text in self.parts if is_variable]
+
+    @property
+    def prefix(self) -> str:
+        """Static text shared by every call of this prompt."""
+        prefix = []
+        for is_variable, text in self.parts:
+            if is_variable:
+                break
+            prefix.append(text)
+        return "".join(prefix)
+
+    @property
+    def cacheable(self) -> bool:
+        return self.prefix_tokens >= PROMPT_CACHE_MIN_TOKENS
+
+    def format(self, **variables) -> str:
+        missing = set(self.variables) - set(variables)
+        if missing:
+            raise Exception(f"Missing variables for prompt {self.name}: {sorted(missing)}")
+        return "".join(variables[text] if is_variable else text for is_variable, text in self.parts)
+
+
+def compile_prompt(name: str, template: str, model: Optional[str] = None, **static) -> CompiledPrompt:
+    """
+    Fill the `static` fields of a str.format template and keep the others as variables.
+
+    Static values are inserted verbatim, so they may contain braces.
+    """
+    parts: List[Tuple[bool, str]] = []
+    for literal, field, _, _ in Formatter().parse(template):
+        text = literal
+        if field is not None and field in static:
+            text += str(static[field])
+            field = None
+        if text:
+            if parts and not parts[-1][0]:
+                parts[-1] = (False, parts[-1][1] + text)
+            else:
+                parts.append((False, text))
+        if field is not None:
+            parts.append((True, field))
+
+    static_texts = [text for is_variable, text in parts if not is_variable]
+    prefix = parts[0][1] if parts and not parts[0][0] else ""
+    return CompiledPrompt(
+        name=name,
+        parts=tuple(parts),
+        static_tokens=sum(count_tokens(text, model) for text in static_texts),
+        prefix_tokens=count_tokens(prefix, model) if prefix else 0,
+        hash=hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest(),
+    )
+
+
+class PromptRegistry:
+    """Compiled prompts by name, with a combined version over all of them."""
+
+    def __init__(self):
+        self._prompts: Dict[str, CompiledPrompt] = {}
+
+    def register(self, prompt: CompiledPrompt) -> CompiledPrompt:
+        if prompt.name in self._prompts:
+            raise Exception(f"Duplicate prompt {prompt.name}")
+        self._prompts[prompt.name] = prompt
+        return prompt
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._prompts
+
+    def get(self, name: str) -> CompiledPrompt:
+        prompt = self._prompts.get(name)
+        if prompt is None:
+            raise Exception(f"Unknown prompt {name}")
+        return prompt
+
+    def pattern(self, pattern: str) -> CompiledPrompt:
+        """Feedback prompt of a pattern (sequential mode)."""
+        return self.get(f"pattern/{pattern}")
+
+    def fused(self, pattern: str) -> CompiledPrompt:
+        """Single-call prompt of a pattern (fused mode)."""
+        return self.get(f"fused/{pattern}")
+
+    def version_of(self, *names: str) -> str:
+        """Hash of the given prompts, for cache keys that depend on only those."""
+        return hashlib.sha256("".join(self.get(name).hash for name in names).encode()).hexdigest()
+
+    @property
+    def version(self) -> str:
+        """Hash of every prompt; changes whenever any template or context changes."""
+        return self.version_of(*sorted(self._prompts))
+
+    def stats(self) -> dict:
+        """Static prefix of every prompt and the provider's prompt cache hit rate per step."""
+        steps: Dict[str, Dict[str, float]] = {}
+        for labels, value in LLM_PROMPT_CACHE_TOKENS.series():
+            steps.setdefault(labels["step"], {"hit": 0, "miss": 0})[labels["result"]] = value
+        for counts in steps.values():
+            total = counts["hit"] + counts["miss"]
+            counts["hit_rate"] = counts["hit"] / total if total else 0.0
+
+        return {
+            "version": self.version,
+            "cache_min_tokens": PROMPT_CACHE_MIN_TOKENS,
+            "prompts": [
+                {
+                    "name": prompt.name,
+                    "hash": prompt.hash,
+                    "static_tokens": prompt.static_tokens,
+                    "prefix_tokens": prompt.prefix_tokens,
+                    "cacheable": prompt.cacheable,
+                }
+                for prompt in self._prompts.values()
+            ],
+            "steps": steps,
+        }
+
+
+def build_registry(model: Optional[str] = None) -> PromptRegistry:
+    """Compile every prompt of app.config."""
+    registry = PromptRegistry()
+
+    for category, patterns in CATEGORY_TO_PATTERNS.items():
+        for pattern in patterns:
+            static = {"category": category, "pattern": pattern, "context": PATTERN_TO_CONTEXT[pattern]}
+            registry.register(compile_prompt(f"pattern/{pattern}", TEMPLATE_PROMPT, model, **static))
+            registry.register(compile_prompt(f"fused/{pattern}", FUSED_PATTERN_PROMPT, model, **static))
+
+    triage_patterns = "\n".join(
+        f"- {pattern} ({category}): {PATTERN_TO_SUMMARY[pattern]}"
+        for category, patterns in CATEGORY_TO_PATTERNS.items()
+        for pattern in patterns
+    )
+    registry.register(compile_prompt("triage", TRIAGE_PROMPT, model, patterns=triage_patterns))
+    registry.register(compile_prompt("evaluation", EVALUATION_PROMPT, model))
+    registry.register(compile_prompt("improvement", IMPROVEMENT_PROMPT, model))
+    registry.register(compile_prompt("merge", STANDARDIZATION_PROMPT, model))
+    registry.register(compile_prompt("manual", MANUAL_IMPROVEMENT_PROMPT, model))
+    return registry
+
+
+# Same registry gets used in instance
+prompt_registry = build_registry(os.getenv("MODEL"))
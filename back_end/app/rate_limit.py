@@ -0,0 +1,237 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Mapping, Optional
+
+from dotenv import load_dotenv
+
+from app.metrics import registry
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Provider limits; refined at runtime from the x-ratelimit-* response headers
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "200000"))
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "32"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "1000"))
+# Completion tokens reserved per call until the real usage is known
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "512"))
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerQueueFull(Exception):
+    """Raised when too many LLM calls are already waiting for capacity."""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.available -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.available = min(self.capacity, self.available + amount)
+
+    def set_limit(self, per_minute: float, remaining: Optional[float] = None):
+        """Adopt the provider's advertised limit and remaining budget."""
+        self._refill()
+        self.capacity = float(per_minute)
+        self.available = min(self.available, self.capacity)
+        if remaining is not None:
+            self.available = min(self.available, float(remaining))
+
+
+class LLMScheduler:
+    """
+    Global admission control for LLM calls.
+
+    Every call waits for a request token (RPM bucket), its estimated tokens (TPM bucket)
+    and a free in-flight slot. Waiters are served in FIFO order and at most `max_queue`
+    calls may wait at once; beyond that calls fail fast with SchedulerQueueFull.
+    """
+
+    def __init__(
+        self,
+        rpm: int = LLM_RPM_LIMIT,
+        tpm: int = LLM_TPM_LIMIT,
+        max_in_flight: int = LLM_MAX_IN_FLIGHT,
+        max_queue: int = LLM_MAX_QUEUE,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+
+        self._loop = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.throttle_events = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _primitives(self):
+        # asyncio primitives are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._lock = asyncio.Lock()
+        return self._semaphore, self._lock
+
+    @asynccontextmanager
+    async def slot(self, prompt_tokens: int):
+        """
+        Wait for capacity to send a call of `prompt_tokens` input tokens.
+
+        Usage:
+            async with llm_scheduler.slot(tokens) as reservation:
+                response = await llm.ainvoke(messages)
+                llm_scheduler.observe(reservation, response)
+        """
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerQueueFull(f"{self.queue_depth} LLM calls already waiting")
+
+        semaphore, lock = self._primitives()
+        reservation = {"tokens": prompt_tokens + LLM_EXPECTED_OUTPUT_TOKENS}
+
+        self.queue_depth += 1
+        start = time.monotonic()
+        try:
+            await semaphore.acquire()
+            try:
+                async with lock:
+                    throttled = False
+                    while True:
+                        delay = max(self.requests.delay(1), self.tokens.delay(reservation["tokens"]))
+                        if delay <= 0:
+                            break
+                        throttled = True
+                        await asyncio.sleep(delay)
+                    if throttled:
+                        self.throttle_events += 1
+                    self.requests.consume(1)
+                    self.tokens.consume(reservation["tokens"])
+            except BaseException:
+                semaphore.release()
+                raise
+        finally:
+            self.queue_depth -= 1
+            waited = time.monotonic() - start
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+        self.calls += 1
+        self.in_flight += 1
+        try:
+            yield reservation
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    @property
+    def load(self) -> float:
+        """Calls in flight and waiting, relative to the in-flight limit."""
+        return (self.in_flight + self.queue_depth) / self.max_in_flight
+
+    def observe(self, reservation: dict, response):
+        """
+        Reconcile a finished call: refund over-reserved tokens and adopt the
+        provider's rate-limit headers when the response carries them.
+        """
+        usage = getattr(response, "usage_metadata", None) or {}
+        used = usage.get("total_tokens")
+        if used is not None and used < reservation["tokens"]:
+            self.tokens.refund(reservation["tokens"] - used)
+
+        headers = (getattr(response, "response_metadata", None) or {}).get("headers")
+        if headers:
+            self.update_from_headers(headers)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Update limits from OpenAI-style x-ratelimit-* headers."""
+        headers = {k.lower(): v for k, v in headers.items()}
+        try:
+            if "x-ratelimit-limit-requests" in headers:
+                self.requests.set_limit(
+                    float(headers["x-ratelimit-limit-requests"]),
+                    _optional_float(headers.get("x-ratelimit-remaining-requests")),
+                )
+            if "x-ratelimit-limit-tokens" in headers:
+                self.tokens.set_limit(
+                    float(headers["x-ratelimit-limit-tokens"]),
+                    _optional_float(headers.get("x-ratelimit-remaining-tokens")),
+                )
+        except ValueError as e:
+            logger.warning(f"Ignoring malformed rate-limit headers: {e}")
+
+    def stats(self) -> dict:
+        """Queue depth, wait times and throttle counters for monitoring."""
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "throttle_events": self.throttle_events,
+            "rejected": self.rejected,
+            "total_wait_seconds": self.total_wait,
+            "avg_wait_seconds": self.total_wait / self.calls if self.calls else 0.0,
+            "max_wait_seconds": self.max_wait,
+            "rpm_limit": self.requests.capacity,
+            "tpm_limit": self.tokens.capacity,
+        }
+
+
+def _optional_float(value: Optional[str]) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+# Same scheduler gets used in instance
+llm_scheduler = LLMScheduler()
+
+registry.gauge("llm_scheduler_queue_depth", "LLM calls waiting for capacity.", lambda: llm_scheduler.queue_depth)
+registry.gauge("llm_scheduler_in_flight", "LLM calls currently running.", lambda: llm_scheduler.in_flight)
+registry.gauge(
+    "llm_scheduler_throttle_events_total", "Calls that had to wait for rate limit capacity.",
+    lambda: llm_scheduler.throttle_events, kind="counter"
+)
+registry.gauge(
+    "llm_scheduler_rejected_total", "Calls rejected because the queue was full.",
+    lambda: llm_scheduler.rejected, kind="counter"
+)
+registry.gauge(
+    "llm_scheduler_wait_seconds_total", "Total time calls spent waiting for capacity.",
+    lambda: llm_scheduler.total_wait, kind="counter"
+)
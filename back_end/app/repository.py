@@ -0,0 +1,326 @@
+import base64
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.usage import UsageLedger
+
+# Priority sorting logic for category display
+category_priority = {
+    "Input Semantics": 0,
+    "Output Customization": 1,
+    "Error Identification": 2,
+    "Prompt Improvement": 3,
+    "Interaction": 4,
+    "Context Control": 5,
+}
+
+
+def sort_response(response):
+    """Sort a response's categories by display priority and their patterns by name."""
+    response.categories.sort(key=lambda c: category_priority.get(c.category, float('inf')))
+    for category in response.categories:
+        sort_category(category)
+    return response
+
+
+def sort_category(category):
+    """Sort a category's patterns by name."""
+    category.patterns.sort(key=lambda p: p.pattern.lower())
+    return category
+
+
+def encode_cursor(created_at: datetime, response_id: str) -> str:
+    """Opaque keyset cursor pointing at a response in (created_at, response_id) order."""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{response_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor. Raises ValueError on malformed cursors."""
+    try:
+        created_at, response_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), response_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def truncate(text: str, length: int) -> str:
+    """Shorten text to at most `length` characters, marking the cut with an ellipsis."""
+    return text if len(text) <= length else text[:max(length - 1, 0)] + "…"
+
+
+class ResponseStore:
+    """
+    Data access layer for responses, categories and patterns.
+
+    Every write is issued as a single statement or transaction and returns the rows
+    as written, so callers never need to re-query what they just stored.
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            from app.client import prisma_client as client
+        self.client = client
+
+    async def store_improvement(
+        self,
+        user_id: str,
+        user_input: str,
+        improvement: dict,
+        usage: Optional[UsageLedger] = None,
+    ):
+        """
+        Persist an improve_prompt result as one nested create.
+
+        Args:
+            user_id (str): Owner of the response.
+            user_input (str): Original prompt.
+            improvement (dict): Result of improve_prompt.
+            usage (UsageLedger, optional): LLM calls of the generation, logged and rolled up onto the response.
+
+        Returns:
+            Response: Stored response with nested categories and patterns, sorted for display.
+        """
+        categories = [
+            {
+                "category": category_data["category"],
+                "input": improvement["input"],
+                "preview": category_data["preview"],
+                "patterns": {"create": [
+                    {
+                        "pattern": pattern_data["pattern"],
+                        "feedback": pattern_data.get("feedback", ""),
+                        "applied": pattern_data.get("applied", False),
+                        "output": pattern_data.get("output") if pattern_data.get("applied") else None,
+                        "input_hash": pattern_data.get("input_hash") if pattern_data.get("applied") else None,
+                        "error": pattern_data.get("error"),
+                    }
+                    for pattern_data in category_data.get("patterns", [])
+                ]},
+            }
+            for category_data in improvement["categories"]
+        ]
+
+        data = {
+            "user_id": user_id,
+            "input": user_input,
+            "output": improvement["output"],
+            "status": improvement.get("status", "complete"),
+            "categories": {"create": categories},
+        }
+        if usage is not None and usage.calls:
+            data.update(usage.summary())
+            data["calls"] = {"create": usage.rows()}
+
+        response = await self.client.response.create(
+            data=data,
+            include={"categories": {"include": {"patterns": True}}}
+        )
+        return sort_response(response)
+
+    async def list_summaries(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ):
+        """
+        Fetch one page of a user's responses, newest first, without nested data.
+
+        Args:
+            user_id (str): Owner of the responses.
+            limit (int): Page size.
+            cursor (str, optional): Cursor returned with the previous page.
+            created_after (datetime, optional): Only responses created at or after this time.
+            created_before (datetime, optional): Only responses created before this time.
+
+        Returns:
+            Tuple[list, Optional[str]]: Responses of the page and the cursor of the next page.
+        """
+        conditions = [{"user_id": user_id}]
+        if created_after is not None:
+            conditions.append({"created_at": {"gte": created_after}})
+        if created_before is not None:
+            conditions.append({"created_at": {"lt": created_before}})
+        if cursor is not None:
+            cursor_created_at, cursor_response_id = decode_cursor(cursor)
+            conditions.append({"OR": [
+                {"created_at": {"lt": cursor_created_at}},
+                {"created_at": cursor_created_at, "response_id": {"lt": cursor_response_id}},
+            ]})
+
+        # Fetch one extra row to know whether there is a next page
+        responses = await self.client.response.find_many(
+            where={"AND": conditions},
+            order=[{"created_at": "desc"}, {"response_id": "desc"}],
+            take=limit + 1,
+        )
+
+        next_cursor = None
+        if len(responses) > limit:
+            responses = responses[:limit]
+            next_cursor = encode_cursor(responses[-1].created_at, responses[-1].response_id)
+
+        return responses, next_cursor
+
+    async def update_category(
+        self,
+        category_id: str,
+        applied: Dict[str, bool],
+        preview: str,
+        usage: Optional[UsageLedger] = None,
+        outputs: Optional[Dict[str, dict]] = None,
+    ):
+        """
+        Apply pattern toggles and the regenerated preview in one transaction.
+
+        Args:
+            category_id (str): Category to update.
+            applied (Dict[str, bool]): Pattern id -> new applied state.
+            preview (str): New category preview.
+            usage (UsageLedger, optional): LLM calls of the regeneration, logged and added to the response.
+            outputs (Dict[str, dict], optional): Pattern id -> recomputed output and input_hash,
+                or the error of a pattern that failed to recompute.
+
+        Returns:
+            Category: Updated category with its patterns, sorted for display.
+        """
+        async with self.client.tx() as transaction:
+            for state in (True, False):
+                pattern_ids = [pattern_id for pattern_id, value in applied.items() if value is state]
+                if pattern_ids:
+                    await transaction.pattern.update_many(
+                        where={"category_id": category_id, "pattern_id": {"in": pattern_ids}},
+                        data={"applied": state}
+                    )
+            for pattern_id, output in (outputs or {}).items():
+                await transaction.pattern.update(
+                    where={"pattern_id": pattern_id},
+                    data={"output": output["output"], "input_hash": output["input_hash"], "error": output.get("error")}
+                )
+
+            category = await transaction.category.update(
+                where={"category_id": category_id},
+                data={"preview": preview},
+                include={"patterns": True}
+            )
+            if usage is not None and usage.calls:
+                await transaction.response.update(where={"response_id": category.response_id}, data=usage.increments())
+                await transaction.llmcall.create_many(data=usage.rows(category.response_id))
+
+        return sort_category(category)
+
+    async def update_improvement(self, response, improvement: dict, usage: Optional[UsageLedger] = None):
+        """
+        Store the result of retrying a partial response in one transaction. Only patterns
+        whose stored state differs from the new result are written.
+
+        Args:
+            response (Response): Stored response with nested categories and patterns.
+            improvement (dict): Result of retry_failed_patterns.
+            usage (UsageLedger, optional): LLM calls of the retry, logged and added to the response.
+
+        Returns:
+            Response: Updated response with nested categories and patterns, sorted for display.
+        """
+        results = {
+            (category_data["category"], pattern_data["pattern"]): pattern_data
+            for category_data in improvement["categories"]
+            for pattern_data in category_data["patterns"]
+        }
+        previews = {category_data["category"]: category_data["preview"] for category_data in improvement["categories"]}
+
+        data = {"output": improvement["output"], "status": improvement["status"]}
+        if usage is not None and usage.calls:
+            data.update(usage.increments())
+
+        async with self.client.tx() as transaction:
+            for category in response.categories:
+                for pattern in category.patterns:
+                    result = results.get((category.category, pattern.pattern))
+                    if result is None:
+                        continue
+                    values = {
+                        "feedback": result.get("feedback", ""),
+                        "applied": result.get("applied", False),
+                        "output": result.get("output") if result.get("applied") else None,
+                        "input_hash": result.get("input_hash") if result.get("applied") else None,
+                        "error": result.get("error"),
+                    }
+                    if any(getattr(pattern, key) != value for key, value in values.items()):
+                        await transaction.pattern.update(where={"pattern_id": pattern.pattern_id}, data=values)
+                if category.category in previews and previews[category.category] != category.preview:
+                    await transaction.category.update(
+                        where={"category_id": category.category_id},
+                        data={"preview": previews[category.category]}
+                    )
+
+            updated = await transaction.response.update(
+                where={"response_id": response.response_id},
+                data=data,
+                include={"categories": {"include": {"patterns": True}}}
+            )
+            if usage is not None and usage.calls:
+                await transaction.llmcall.create_many(data=usage.rows(response.response_id))
+
+        return sort_response(updated)
+
+    async def update_preview(self, category_id: str, preview: str, usage: Optional[UsageLedger] = None):
+        """
+        Store a category preview merged on demand, adding the LLM calls that produced it to the response.
+
+        Args:
+            category_id (str): Category to update.
+            preview (str): Merged preview.
+            usage (UsageLedger, optional): LLM calls of the merge.
+
+        Returns:
+            Category: Updated category with its patterns, sorted for display.
+        """
+        async with self.client.tx() as transaction:
+            category = await transaction.category.update(
+                where={"category_id": category_id},
+                data={"preview": preview},
+                include={"patterns": True}
+            )
+            if usage is not None and usage.calls:
+                await transaction.response.update(where={"response_id": category.response_id}, data=usage.increments())
+                await transaction.llmcall.create_many(data=usage.rows(category.response_id))
+
+        return sort_category(category)
+
+    async def update_output(self, response_id: str, output: str, usage: Optional[UsageLedger] = None):
+        """
+        Replace a response's output, adding the LLM calls that produced it to its totals.
+
+        Args:
+            response_id (str): Response to update.
+            output (str): New output.
+            usage (UsageLedger, optional): LLM calls that produced the output.
+
+        Returns:
+            Response: Updated response with nested categories and patterns, sorted for display.
+        """
+        data = {"output": output}
+        if usage is not None and usage.calls:
+            data.update(usage.increments())
+
+        async with self.client.tx() as transaction:
+            response = await transaction.response.update(
+                where={"response_id": response_id},
+                data=data,
+                include={"categories": {"include": {"patterns": True}}}
+            )
+            if usage is not None and usage.calls:
+                await transaction.llmcall.create_many(data=usage.rows(response_id))
+
+        return sort_response(response)
+
+
+def applied_patterns(patterns: List, applied: Dict[str, bool]) -> List[str]:
+    """Names of the patterns that are applied once `applied` toggles are taken into account."""
+    return [
+        pattern.pattern for pattern in patterns
+        if applied.get(pattern.pattern_id, pattern.applied)
+    ]
@@ -0,0 +1,330 @@
+"""
+Resilience policy for LLM calls: per-step deadlines, jittered exponential-backoff
+retries (honoring Retry-After), optional hedging and a provider-wide circuit breaker.
+
+Every decision is counted in `llm_resilience_events_total{step, event}` with events
+timeout, retry, exhausted, hedge, hedge_won and short_circuit.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, AsyncContextManager, Awaitable, Callable, Deque, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.metrics import LLM_RESILIENCE_EVENTS, registry
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Seconds a single attempt may take; LLM_STEP_DEADLINES='{"triage": 20}' overrides per step
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "60"))
+LLM_STEP_DEADLINES = {step: float(value) for step, value in json.loads(os.getenv("LLM_STEP_DEADLINES", "{}")).items()}
+
+# Retries after the first attempt, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+
+# Fire a duplicate attempt when the first is slower than the step's recent latency quantile
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+
+# Consecutive provider failures that open the circuit, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM provider circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# =============================
+# Error Classification
+# =============================
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx responses are worth retrying."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in (408, 409, 429) or status_code >= 500
+    # openai.APIConnectionError / APITimeoutError carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Errors that indicate a degraded provider; rate limiting alone does not."""
+    return is_retryable(error) and getattr(error, "status_code", None) != 429
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds requested by the provider's Retry-After(-Ms) header, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def backoff_delay(
+    attempt: int,
+    error: BaseException,
+    base: float = LLM_RETRY_BASE_DELAY,
+    cap: float = LLM_RETRY_MAX_DELAY,
+) -> float:
+    """Delay before retry number `attempt` (0-based): Retry-After when given, else full jitter."""
+    requested = retry_after(error)
+    if requested is not None:
+        return min(requested, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# =============================
+# Circuit Breaker
+# =============================
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive provider failures and rejects calls for
+    `cooldown` seconds. Then one probe call is let through (half-open): its success
+    closes the circuit, its failure opens it again.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened = 0
+        self._probing = False
+
+    def before_call(self):
+        """Raise CircuitOpen if calls are currently rejected."""
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpen(remaining)
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise CircuitOpen(self.cooldown)
+            self._probing = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened += 1
+                logger.warning(f"LLM circuit opened after {self.failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """Give up a probe without an outcome (e.g. the caller was cancelled)."""
+        self._probing = False
+
+    def state_value(self) -> int:
+        return {self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[self.state]
+
+
+# =============================
+# Resilient Calls
+# =============================
+
+class LLMResilience:
+    """
+    Wraps single LLM call attempts with deadlines, retries, hedging and the circuit breaker.
+
+    Usage:
+        response = await llm_resilience.call("feedback", attempt)
+    where `attempt` is an async callable making one provider call.
+    """
+
+    def __init__(
+        self,
+        deadline: float = LLM_DEADLINE_SECONDS,
+        step_deadlines: Optional[Dict[str, float]] = None,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedge: bool = LLM_HEDGE,
+        hedge_quantile: float = LLM_HEDGE_QUANTILE,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.deadline = deadline
+        self.step_deadlines = LLM_STEP_DEADLINES if step_deadlines is None else step_deadlines
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def step_deadline(self, step: str) -> float:
+        return self.step_deadlines.get(step, self.deadline)
+
+    def hedge_delay(self, step: str) -> Optional[float]:
+        """Recent latency quantile of the step, or None while there are too few samples."""
+        samples = sorted(self._latencies.get(step, ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(len(samples) - 1, int(self.hedge_quantile * len(samples)))
+        return max(samples[index], self.hedge_min_delay)
+
+    async def call(
+        self,
+        step: str,
+        attempt: Callable[..., Awaitable[Any]],
+        hedge: bool = True,
+        slot: Optional[Callable[[], AsyncContextManager]] = None,
+    ) -> Any:
+        """
+        Run `attempt` until it succeeds, retrying retryable errors up to max_retries times.
+
+        Pass hedge=False for attempts whose result must not be duplicated, e.g. opened streams.
+
+        `slot` is entered before every attempt, e.g. to wait for scheduler capacity, and the
+        attempt is called with the value it yields. Waiting for it counts toward neither the
+        deadline nor the hedge latencies, so local queueing never looks like a slow provider
+        and cannot open the circuit.
+
+        Raises:
+            CircuitOpen: The breaker is open; the provider was not called.
+            Exception: The last error once retries are exhausted, or any non-retryable error.
+        """
+        for retry in range(self.max_retries + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitOpen:
+                LLM_RESILIENCE_EVENTS.inc(step=step, event="short_circuit")
+                raise
+
+            try:
+                if hedge:
+                    result = await self._hedged(step, attempt, slot)
+                else:
+                    result = await self._timed(step, attempt, slot)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if is_provider_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                if not is_retryable(e):
+                    raise
+                if retry == self.max_retries:
+                    LLM_RESILIENCE_EVENTS.inc(step=step, event="exhausted")
+                    raise
+                delay = backoff_delay(retry, e)
+                LLM_RESILIENCE_EVENTS.inc(step=step, event="retry")
+                logger.info(f"Retrying {step} call in {delay:.2f}s after {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def _timed(
+        self,
+        step: str,
+        attempt: Callable[..., Awaitable[Any]],
+        slot: Optional[Callable[[], AsyncContextManager]] = None,
+        started: Optional[asyncio.Event] = None,
+    ) -> Any:
+        async with (slot() if slot else nullcontext()) as held:
+            if started is not None:
+                started.set()
+            # The deadline and latency only start once the slot is held
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(attempt(held) if slot else attempt(), self.step_deadline(step))
+            except asyncio.TimeoutError:
+                LLM_RESILIENCE_EVENTS.inc(step=step, event="timeout")
+                raise
+            self._latencies.setdefault(step, deque(maxlen=200)).append(time.perf_counter() - start)
+            return result
+
+    async def _hedged(
+        self,
+        step: str,
+        attempt: Callable[..., Awaitable[Any]],
+        slot: Optional[Callable[[], AsyncContextManager]] = None,
+    ) -> Any:
+        delay = self.hedge_delay(step) if self.hedge and self.breaker.state == CircuitBreaker.CLOSED else None
+        if delay is None:
+            return await self._timed(step, attempt, slot)
+
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self._timed(step, attempt, slot, started))
+        waiting = asyncio.ensure_future(started.wait())
+        pending = {primary}
+        try:
+            # The hedge delay counts from when the primary attempt got its slot
+            await asyncio.wait({primary, waiting}, return_when=asyncio.FIRST_COMPLETED)
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            LLM_RESILIENCE_EVENTS.inc(step=step, event="hedge")
+            hedge = asyncio.ensure_future(self._timed(step, attempt, slot))
+            pending.add(hedge)
+
+            # First success wins; an error only counts once both attempts have failed
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            LLM_RESILIENCE_EVENTS.inc(step=step, event="hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            waiting.cancel()
+            for task in pending:
+                task.cancel()
+
+
+# Same resilience policy gets used in instance
+llm_resilience = LLMResilience()
+
+registry.gauge(
+    "llm_circuit_state", "LLM circuit breaker state (0 closed, 1 half-open, 2 open).",
+    lambda: llm_resilience.breaker.state_value()
+)
+registry.gauge(
+    "llm_circuit_opened_total", "Times the LLM circuit breaker opened.",
+    lambda: llm_resilience.breaker.opened, kind="counter"
+)
@@ -0,0 +1,224 @@
+"""
+Single-flight coalescing of identical in-flight pipeline work.
+
+Concurrent calls with the same key share one execution: the first caller starts the
+work as a task and everyone (including the first caller) awaits it. A caller that is
+cancelled only leaves; the shared work is cancelled once its last waiter has left.
+Each LLM call of the shared work is billed once, to the first waiter that leaves after
+it was made (normally the caller that started the work); the other waiters log it as
+a zero-token coalesced call.
+
+With SINGLE_FLIGHT_BACKEND=postgres, work marked `distributed` is additionally
+serialized across processes by a lease row on the key in the `FlightLease` table.
+The process that gets the lease second re-runs the work once the first is done and
+finds its results in the result cache, so it requires RESULT_CACHE_BACKEND=postgres;
+without the shared cache the second process would only wait and then redo the work.
+"""
+import os
+import copy
+import uuid
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.cache import RESULT_CACHE_BACKEND
+from app.metrics import registry
+from app.usage import UsageLedger, current_ledger, tracking
+
+# Load environment variables from .env file
+load_dotenv()
+
+# "memory" (coalesce within this process), "postgres" (also across processes) or "none"
+SINGLE_FLIGHT_BACKEND = os.getenv("SINGLE_FLIGHT_BACKEND", "memory")
+# Longest a process holds the cross-process lease before others may take it over,
+# and longest another process waits for it before running the work unlocked
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", "300"))
+# Seconds between attempts to take a lease held by another process
+SINGLE_FLIGHT_POLL_SECONDS = float(os.getenv("SINGLE_FLIGHT_POLL_SECONDS", "0.25"))
+
+logger = logging.getLogger(__name__)
+
+# Takes the lease unless another holder's lease is still valid; returns a row when taken
+ACQUIRE_LEASE_SQL = """
+INSERT INTO "FlightLease" ("key", holder, expires_at)
+VALUES ($1, $2, timezone('utc', now()) + make_interval(secs => $3))
+ON CONFLICT ("key") DO UPDATE SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+WHERE "FlightLease".expires_at < timezone('utc', now())
+RETURNING "key"
+"""
+
+RELEASE_LEASE_SQL = 'DELETE FROM "FlightLease" WHERE "key" = $1 AND holder = $2'
+
+
+# =============================
+# Cross-process Lock
+# =============================
+
+class PostgresFlightLock:
+    """
+    Serializes work with the same key across processes with an expiring lease row.
+
+    Taking, polling and releasing the lease are single statements, so no database
+    connection is held while the work runs.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        timeout: float = SINGLE_FLIGHT_LOCK_TIMEOUT,
+        poll_seconds: float = SINGLE_FLIGHT_POLL_SECONDS,
+    ):
+        if client is None:
+            from app.client import prisma_client as client
+        self.client = client
+        self.timeout = timeout
+        self.poll_seconds = poll_seconds
+
+    async def _acquire(self, key: str, holder: str) -> bool:
+        """Wait for the lease on `key`; False if it is still held by another process after the timeout."""
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        while True:
+            if await self.client.query_raw(ACQUIRE_LEASE_SQL, key, holder, self.timeout):
+                return True
+            if asyncio.get_running_loop().time() >= deadline:
+                return False
+            await asyncio.sleep(self.poll_seconds)
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` while holding the lease for `key`.
+
+        Failing to take the lease is logged and the work runs unlocked; the lease never
+        fails a generation. The lease expires after `timeout` if it is not released.
+        """
+        holder = uuid.uuid4().hex
+        try:
+            leased = await self._acquire(key, holder)
+        except Exception as e:
+            logger.warning(f"Single-flight lease failed, running unlocked: {e}")
+            return await fn()
+        if not leased:
+            logger.warning(f"Single-flight lease still held after {self.timeout:.0f}s, running unlocked")
+            return await fn()
+
+        try:
+            return await fn()
+        finally:
+            try:
+                await self.client.execute_raw(RELEASE_LEASE_SQL, key, holder)
+            except Exception as e:
+                logger.warning(f"Releasing single-flight lease failed: {e}")
+
+
+# =============================
+# Single Flight
+# =============================
+
+class _Flight:
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.usage = UsageLedger()
+        self.waiters = 0
+        # Calls of `usage` already billed to a waiter
+        self.billed = 0
+
+
+class SingleFlight:
+    """
+    Registry of in-flight work by key.
+
+    Args:
+        lock (PostgresFlightLock, optional): Cross-process lock for distributed work.
+        enabled (bool): When False every call runs its own work.
+    """
+
+    def __init__(self, lock: Optional[PostgresFlightLock] = None, enabled: bool = True):
+        self.lock = lock
+        self.enabled = enabled
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], distributed: bool = False) -> Any:
+        """
+        Return the result of `fn`, sharing one execution among concurrent calls with `key`.
+
+        Every caller gets its own copy of the result, so callers may modify it.
+
+        Args:
+            key (str): Canonical key of the work, e.g. a result cache key.
+            fn (Callable): Starts the work; only called by the first caller.
+            distributed (bool): Also coalesce across processes when a lock is configured.
+        """
+        if not self.enabled:
+            return await fn()
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.ensure_future(self._lead(key, fn, distributed, flight))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # The last waiter left (cancelled); nobody needs the result anymore
+                flight.task.cancel()
+            # Bill this caller for the shared calls nobody was billed for yet
+            ledger = current_ledger.get()
+            if ledger is not None:
+                calls = flight.usage.calls
+                ledger.calls.extend(call.as_coalesced() for call in calls[:flight.billed])
+                ledger.calls.extend(copy.copy(call) for call in calls[flight.billed:])
+                flight.billed = len(calls)
+        return copy.deepcopy(result)
+
+    async def _lead(self, key: str, fn: Callable[[], Awaitable[Any]], distributed: bool, flight: _Flight) -> Any:
+        # The work records its calls in the flight's own ledger, not in the first caller's
+        with tracking() as flight.usage:
+            if distributed and self.lock is not None:
+                return await self.lock.run(key, fn)
+            return await fn()
+
+    def _finish(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Retrieve the exception so an abandoned failed flight is not reported as never retrieved
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+
+def _create_single_flight(name: str, cache_backend: str = RESULT_CACHE_BACKEND) -> SingleFlight:
+    if name == "memory":
+        return SingleFlight()
+    if name == "postgres":
+        if cache_backend != "postgres":
+            raise Exception("SINGLE_FLIGHT_BACKEND=postgres requires RESULT_CACHE_BACKEND=postgres")
+        return SingleFlight(PostgresFlightLock())
+    if name == "none":
+        return SingleFlight(enabled=False)
+    raise Exception(f"Unknown single-flight backend {name}")
+
+
+# Same single flight gets used in instance
+single_flight = _create_single_flight(SINGLE_FLIGHT_BACKEND)
+
+registry.gauge("single_flight_in_flight", "Distinct pipeline units currently running.", lambda: single_flight.in_flight)
+registry.gauge("single_flight_leaders_total", "Pipeline units started.", lambda: single_flight.leaders, kind="counter")
+registry.gauge(
+    "single_flight_coalesced_total", "Calls that joined an identical in-flight unit instead of starting one.",
+    lambda: single_flight.coalesced, kind="counter"
+)
@@ -0,0 +1,156 @@
+"""
+Speculative improvement for the sequential pattern chain.
+
+Evaluation and improvement both only need the feedback exchange, so the improvement
+can start together with the evaluation instead of after its verdict. When the verdict
+is yes, the improvement has had a head start of up to the whole evaluation call; when
+it is no, the improvement is cancelled (or discarded if it already finished). Outputs
+are the same either way, only latency and tokens change.
+
+SPECULATIVE_IMPROVEMENT selects the policy: "off", "always", or "adaptive", which only
+speculates for patterns whose recent apply rate is at least SPECULATION_MIN_APPLY_RATE,
+i.e. where the expected latency saved outweighs the tokens wasted on "no" verdicts.
+"""
+import os
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.metrics import (
+    PIPELINE_SPECULATIONS,
+    PIPELINE_SPECULATION_SAVED_SECONDS,
+    PIPELINE_SPECULATION_WASTED_TOKENS,
+)
+
+# Load environment variables from .env file
+load_dotenv()
+
+SPECULATION_MODES = ("off", "always", "adaptive")
+SPECULATIVE_IMPROVEMENT = os.getenv("SPECULATIVE_IMPROVEMENT", "off")
+
+# Adaptive mode: speculate once a pattern was evaluated SPECULATION_MIN_SAMPLES times
+# (out of the last SPECULATION_WINDOW) and applied at least this often
+SPECULATION_MIN_APPLY_RATE = float(os.getenv("SPECULATION_MIN_APPLY_RATE", "0.6"))
+SPECULATION_MIN_SAMPLES = int(os.getenv("SPECULATION_MIN_SAMPLES", "20"))
+SPECULATION_WINDOW = int(os.getenv("SPECULATION_WINDOW", "200"))
+
+# No speculation while the LLM scheduler is busier than this share of its in-flight limit:
+# the extra calls would hold up calls that are certainly needed
+SPECULATION_MAX_LOAD = float(os.getenv("SPECULATION_MAX_LOAD", "0.5"))
+
+
+class _PatternStats:
+    def __init__(self):
+        self.used = 0
+        self.discarded = 0
+        self.wasted_tokens = 0
+        self.saved_seconds = 0.0
+
+
+class SpeculationPolicy:
+    """
+    Decides which patterns get a speculative improvement and keeps their apply history.
+
+    Args:
+        mode (str): One of SPECULATION_MODES.
+        min_apply_rate (float): Adaptive mode threshold on the recent apply rate.
+        min_samples (int): Verdicts needed before adaptive mode speculates for a pattern.
+        window (int): Recent verdicts kept per pattern.
+        max_load (float): Scheduler load from which nothing is speculated.
+    """
+
+    def __init__(
+        self,
+        mode: str = SPECULATIVE_IMPROVEMENT,
+        min_apply_rate: float = SPECULATION_MIN_APPLY_RATE,
+        min_samples: int = SPECULATION_MIN_SAMPLES,
+        window: int = SPECULATION_WINDOW,
+        max_load: float = SPECULATION_MAX_LOAD,
+    ):
+        if mode not in SPECULATION_MODES:
+            raise Exception(f"Unknown speculation mode {mode}, expected one of {SPECULATION_MODES}")
+        self.mode = mode
+        self.min_apply_rate = min_apply_rate
+        self.min_samples = min_samples
+        self.window = window
+        self.max_load = max_load
+        self._verdicts: Dict[str, Deque[bool]] = {}
+        self._stats: Dict[str, _PatternStats] = {}
+
+    def observe(self, pattern: str, applied: bool):
+        """Record an evaluation verdict of a pattern."""
+        self._verdicts.setdefault(pattern, deque(maxlen=self.window)).append(applied)
+
+    def apply_rate(self, pattern: str) -> Optional[float]:
+        verdicts = self._verdicts.get(pattern)
+        return sum(verdicts) / len(verdicts) if verdicts else None
+
+    def should_speculate(self, pattern: str, load: float = 0.0) -> bool:
+        """
+        Args:
+            pattern (str): Pattern about to be evaluated.
+            load (float): Calls in flight and waiting, relative to the scheduler's in-flight limit.
+        """
+        if self.mode == "off" or load >= self.max_load:
+            return False
+        if self.mode == "always":
+            return True
+        verdicts = self._verdicts.get(pattern, ())
+        return len(verdicts) >= self.min_samples and self.apply_rate(pattern) >= self.min_apply_rate
+
+    def record(
+        self,
+        pattern: str,
+        used: bool,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        saved_seconds: float = 0.0,
+    ):
+        """
+        Account for a finished speculation.
+
+        Args:
+            pattern (str): Pattern speculated for.
+            used (bool): Whether the verdict was yes and the improvement was kept.
+            input_tokens (int): Prompt tokens of a discarded improvement.
+            output_tokens (int): Completion tokens of a discarded improvement.
+            saved_seconds (float): Critical-path time saved by a used improvement.
+        """
+        stats = self._stats.setdefault(pattern, _PatternStats())
+        PIPELINE_SPECULATIONS.inc(pattern=pattern, outcome="used" if used else "discarded")
+        if used:
+            stats.used += 1
+            stats.saved_seconds += saved_seconds
+            PIPELINE_SPECULATION_SAVED_SECONDS.inc(saved_seconds, pattern=pattern)
+        else:
+            stats.discarded += 1
+            stats.wasted_tokens += input_tokens + output_tokens
+            PIPELINE_SPECULATION_WASTED_TOKENS.inc(input_tokens, pattern=pattern, kind="input")
+            PIPELINE_SPECULATION_WASTED_TOKENS.inc(output_tokens, pattern=pattern, kind="output")
+
+    def stats(self) -> dict:
+        """Policy settings and, per pattern, apply rate, speculation decision, tokens wasted and seconds saved."""
+        patterns = {}
+        for pattern in sorted(set(self._verdicts) | set(self._stats)):
+            stats = self._stats.get(pattern, _PatternStats())
+            patterns[pattern] = {
+                "verdicts": len(self._verdicts.get(pattern, ())),
+                "apply_rate": self.apply_rate(pattern),
+                "speculating": self.should_speculate(pattern),
+                "used": stats.used,
+                "discarded": stats.discarded,
+                "wasted_tokens": stats.wasted_tokens,
+                "saved_seconds": stats.saved_seconds,
+            }
+        return {
+            "mode": self.mode,
+            "min_apply_rate": self.min_apply_rate,
+            "min_samples": self.min_samples,
+            "max_load": self.max_load,
+            "patterns": patterns,
+        }
+
+
+# Same policy gets used in instance
+speculation_policy = SpeculationPolicy()
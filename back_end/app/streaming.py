@@ -0,0 +1,85 @@
+"""
+Incremental extraction of tagged sections from streamed completions.
+
+Rewrites answer with `<PROMPT>...</PROMPT>` around the prompt. `TagExtractor` is fed the
+completion chunk by chunk and returns only the text inside the tags as soon as it is
+known not to be part of a tag, so the caller can forward it to the client right away.
+Whitespace is trimmed like `_extract_tag` does: the pieces returned add up to the
+stripped content of the first tagged section.
+"""
+
+
+def _partial_suffix(text: str, tag: str) -> int:
+    """Length of the longest end of `text` that could be the start of `tag`."""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+
+class TagExtractor:
+    """
+    Forwards the content of the first <TAG>...</TAG> section of a streamed response.
+
+    Args:
+        tag (str): Tag name, e.g. "PROMPT".
+
+    Usage:
+        extractor = TagExtractor("PROMPT")
+        for chunk in chunks:
+            text = extractor.feed(chunk)
+    """
+
+    BEFORE, INSIDE, AFTER = "before", "inside", "after"
+
+    def __init__(self, tag: str = "PROMPT"):
+        self.open = f"<{tag}>"
+        self.close = f"</{tag}>"
+        self.state = self.BEFORE
+        self.raw = ""
+        self._buffer = ""
+        self._whitespace = ""
+        self._started = False
+
+    @property
+    def done(self) -> bool:
+        """Whether the closing tag has been seen."""
+        return self.state == self.AFTER
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of the response; returns the tagged text it completes, possibly empty."""
+        self.raw += chunk
+        if self.state == self.AFTER:
+            return ""
+        self._buffer += chunk
+
+        if self.state == self.BEFORE:
+            start = self._buffer.find(self.open)
+            if start < 0:
+                keep = _partial_suffix(self._buffer, self.open)
+                self._buffer = self._buffer[len(self._buffer) - keep:]
+                return ""
+            self._buffer = self._buffer[start + len(self.open):]
+            self.state = self.INSIDE
+
+        end = self._buffer.find(self.close)
+        if end >= 0:
+            text, self._buffer = self._buffer[:end], ""
+            self.state = self.AFTER
+            return self._emit(text, closing=True)
+
+        keep = _partial_suffix(self._buffer, self.close)
+        text = self._buffer[:len(self._buffer) - keep]
+        self._buffer = self._buffer[len(self._buffer) - keep:]
+        return self._emit(text)
+
+    def _emit(self, text: str, closing: bool = False) -> str:
+        # Leading whitespace is dropped, trailing whitespace held back until more text follows
+        text = self._whitespace + text
+        if not self._started:
+            text = text.lstrip()
+        body = text.rstrip()
+        self._whitespace = "" if closing else text[len(body):]
+        if body:
+            self._started = True
+        return body
@@ -14,6 +14,60 @@ async def test_root(client):
     assert response.status_code == 200
     assert response.json() == {"message": "Your app is working!"}
 
+def test_request_id_and_no_filter_accumulation(client):
+    """
+    Every response carries a request id (echoed when supplied by the caller),
+    and handling requests must not attach anything to loggers.
+    """
+    import logging
+    from app.main import app
+
+    app_logger = logging.getLogger(app.title)
+    filters_before = len(app_logger.filters)
+
+    generated = client.get("/")
+    assert generated.headers["X-Request-ID"]
+
+    for _ in range(5):
+        echoed = client.get("/", headers={"X-Request-ID": "req-123"})
+        assert echoed.headers["X-Request-ID"] == "req-123"
+
+    assert len(app_logger.filters) == filters_before
+
+def test_module_and_app_logs_are_written_once_with_the_request_id():
+    import io
+    import atexit
+    import logging
+    from app.middleware.logging import RequestContext, configure_logging, request_context
+
+    root_logger = logging.getLogger()
+    app_loggers = ("app", "FastAPI")
+    saved = root_logger.handlers[:], root_logger.level, [logging.getLogger(name).level for name in app_loggers]
+    root_logger.handlers = []
+    stream = io.StringIO()
+    try:
+        listener = configure_logging(logging.INFO, use_colors=False, stream=stream, app_loggers=app_loggers)
+        assert configure_logging(logging.INFO, use_colors=False) is None
+
+        token = request_context.set(RequestContext("req-9", "1.2.3.4:5", "GET / HTTP/1.1"))
+        logging.getLogger("app.cache").warning("cache down")
+        logging.getLogger("app.jobs").info("job done")
+        logging.getLogger("FastAPI").info("handled")
+        logging.getLogger("httpx").info("library noise")
+        request_context.reset(token)
+        listener.stop()
+        atexit.unregister(listener.stop)
+    finally:
+        root_logger.handlers, level, app_levels = saved
+        root_logger.setLevel(level)
+        for name, app_level in zip(app_loggers, app_levels):
+            logging.getLogger(name).setLevel(app_level)
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 3
+    assert all("[req-9]" in line for line in lines)
+    assert "library noise" not in stream.getvalue()
+
 # def test_create_user(client, prisma_mock):
 #     sample = {"name":"Alice","email":"a@x.com","password":"pw"}
 #     created = {"user_id":"u1",**sample}
@@ -61,3 +115,16 @@ async def test_root(client):
 #     prisma_mock.user.find_unique.return_value = None
 #     r2 = client.get("/api/v1/users/u1")
 #     assert r2.status_code == 404
+
+def test_metrics_endpoint_records_request_latency(client):
+    """
+    `/metrics` is scrapeable without a session and reports request latency by route template.
+    """
+    client.get("/")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert '# TYPE http_request_duration_seconds histogram' in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/",status="200"}' in response.text
+    assert "llm_scheduler_queue_depth" in response.text
@@ -0,0 +1,84 @@
+import json
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from jose import jwe
+
+from app.middleware.auth import AuthMiddleware, SessionCache, getDerivedEncryptionKey
+
+SECRET = "test-next-auth-secret"
+
+# ===========================
+# Helpers
+# ===========================
+
+def _make_token(payload: dict) -> str:
+    """
+    Encrypt a payload the same way NextAuth.js does.
+    """
+    key = getDerivedEncryptionKey(SECRET)
+    return jwe.encrypt(json.dumps(payload), key, algorithm="dir", encryption="A256GCM").decode()
+
+@pytest.fixture
+def user_lookup(monkeypatch):
+    monkeypatch.setenv("NEXT_AUTH_SECRET", SECRET)
+    lookup = AsyncMock(return_value=SimpleNamespace(id="user-1"))
+    monkeypatch.setattr("app.middleware.auth.prisma", SimpleNamespace(user=SimpleNamespace(find_unique=lookup)))
+    return lookup
+
+# ===========================
+# Session Resolution
+# ===========================
+
+@pytest.mark.asyncio
+async def test_resolve_user_id_caches_sessions(user_lookup):
+    """
+    A token is decrypted and looked up once, then served from the cache.
+    """
+    middleware = AuthMiddleware(app=None, cache=SessionCache())
+    token = _make_token({"email": "a@x.com", "exp": time.time() + 3600})
+
+    assert await middleware.resolve_user_id(token) == "user-1"
+    assert await middleware.resolve_user_id(token) == "user-1"
+    assert user_lookup.await_count == 1
+
+    middleware.cache.invalidate(token)
+    assert await middleware.resolve_user_id(token) == "user-1"
+    assert user_lookup.await_count == 2
+
+@pytest.mark.asyncio
+async def test_resolve_user_id_rejects_expired_tokens(user_lookup):
+    middleware = AuthMiddleware(app=None, cache=SessionCache())
+    token = _make_token({"email": "a@x.com", "exp": time.time() - 1})
+
+    assert await middleware.resolve_user_id(token) is None
+    assert len(middleware.cache) == 0
+
+# ===========================
+# Session Cache
+# ===========================
+
+def test_session_cache_respects_ttl_token_expiry_and_size():
+    cache = SessionCache(ttl=300, max_size=2)
+
+    cache.set("expired", "u0", token_exp=time.time() - 1)
+    assert cache.get("expired") is None
+
+    cache.set("t1", "u1")
+    cache.set("t2", "u2")
+    cache.set("t3", "u2")
+    assert cache.get("t1") is None  # evicted
+    assert cache.get("t2") == "u2"
+
+    cache.invalidate("t2")
+    assert cache.get("t2") is None
+    assert cache.get("t3") == "u2"
+    cache.set("t2", "u2")
+    cache.invalidate_user("u2")
+    assert len(cache) == 0
+
+    # The TTL bounds how long a user id is served without a lookup
+    short = SessionCache(ttl=0.0)
+    short.set("t", "u")
+    assert short.get("t") is None
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from app.cache import MemoryCacheBackend, PostgresCacheBackend, ResultCache
+
+# ===========================
+# Memory Backend
+# ===========================
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts_least_recently_used():
+    """
+    Oldest untouched entries are dropped once max_size is exceeded.
+    """
+    backend = MemoryCacheBackend(max_size=2)
+    await backend.set("a", 1, ttl=60)
+    await backend.set("b", 2, ttl=60)
+    assert await backend.get("a") == 1  # "b" is now least recently used
+
+    await backend.set("c", 3, ttl=60)
+    assert await backend.get("b") is None
+    assert await backend.get("a") == 1
+    assert await backend.get("c") == 3
+
+@pytest.mark.asyncio
+async def test_memory_backend_expires_entries():
+    backend = MemoryCacheBackend()
+    await backend.set("a", {"x": 1}, ttl=0.01)
+    await asyncio.sleep(0.02)
+    assert await backend.get("a") is None
+    assert len(backend) == 0
+
+# ===========================
+# Postgres Backend
+# ===========================
+
+@pytest.mark.asyncio
+async def test_postgres_backend_purges_expired_rows_periodically():
+    table = SimpleNamespace(upsert=AsyncMock(), delete_many=AsyncMock(return_value=3))
+    backend = PostgresCacheBackend(SimpleNamespace(resultcache=table), purge_interval=60)
+
+    await backend.set("a", 1, ttl=60)
+    await backend.set("b", 2, ttl=60)
+
+    # The first write purges, the next ones wait for the interval
+    table.delete_many.assert_awaited_once()
+    assert "lt" in table.delete_many.await_args.kwargs["where"]["expires_at"]
+
+    backend._last_purge -= 60
+    table.delete_many.side_effect = Exception("db down")
+    await backend.set("c", 3, ttl=60)  # A failed purge does not fail the write
+    assert table.upsert.await_count == 3
+    assert table.delete_many.await_count == 2
+
+# ===========================
+# Result Cache
+# ===========================
+
+@pytest.mark.asyncio
+async def test_result_cache_counts_hits_and_misses():
+    cache = ResultCache(MemoryCacheBackend())
+    key = ResultCache.key("pattern", "input", "cat", "pat")
+
+    assert key == ResultCache.key("pattern", "input", "cat", "pat")
+    assert key != ResultCache.key("pattern", "input2", "cat", "pat")
+
+    assert await cache.get(key) is None
+    await cache.set(key, {"output": "o"})
+    assert await cache.get(key) == {"output": "o"}
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+@pytest.mark.asyncio
+async def test_result_cache_treats_backend_errors_as_misses():
+    class BrokenBackend:
+        async def get(self, key):
+            raise RuntimeError("db down")
+
+        async def set(self, key, value, ttl):
+            raise RuntimeError("db down")
+
+    cache = ResultCache(BrokenBackend())
+    await cache.set("k", "v")
+    assert await cache.get("k") is None
+    assert cache.misses == 1
@@ -0,0 +1,88 @@
+import pytest
+from types import SimpleNamespace
+from langchain.schema import AIMessage, HumanMessage
+
+from app.conversation import Conversation, prompt_messages
+from app.rate_limit import LLMScheduler
+from app.tokens import count_message_tokens, count_tokens, truncate_middle
+
+# ===========================
+# Immutable Conversations
+# ===========================
+
+def test_branches_share_their_prefix_without_copying():
+    feedback = Conversation(HumanMessage(content="pattern prompt")).then(AIMessage(content="feedback"))
+    evaluation = feedback.then("evaluate")
+    improvement = feedback.then("improve")
+
+    assert [m.content for m in evaluation.messages] == ["pattern prompt", "feedback", "evaluate"]
+    assert [m.content for m in improvement.messages] == ["pattern prompt", "feedback", "improve"]
+    assert evaluation.parent is improvement.parent is feedback
+    assert evaluation.messages[0] is improvement.messages[0]
+    assert len(feedback.messages) == 2
+
+def test_prompt_messages_never_modify_the_history():
+    history = [HumanMessage(content="a"), AIMessage(content="b")]
+    messages, truncated = prompt_messages("c", history)
+
+    assert isinstance(messages, tuple) and [m.content for m in messages] == ["a", "b", "c"]
+    assert truncated == 0
+    assert len(history) == 2
+    assert [m.content for m in prompt_messages("d")[0]] == ["d"]
+
+# ===========================
+# Token Ceiling
+# ===========================
+
+def test_truncate_middle_keeps_head_and_tail():
+    text = "HEAD " + "filler " * 2000 + " TAIL"
+    shortened = truncate_middle(text, 100)
+    assert count_tokens(shortened) <= 100
+    assert shortened.startswith("HEAD") and shortened.endswith("TAIL")
+    assert "tokens truncated" in shortened
+    assert truncate_middle("short", 100) == "short"
+
+def test_ceiling_truncates_the_longest_message_first():
+    history = Conversation(HumanMessage(content="instructions " + "x " * 4000)).then(AIMessage(content="feedback"))
+    messages, truncated = prompt_messages("decide", history, max_tokens=500)
+
+    assert count_message_tokens(messages) <= 500
+    assert truncated > 0
+    assert [type(m) for m in messages] == [HumanMessage, AIMessage, HumanMessage]
+    assert messages[0].content.startswith("instructions")
+    assert [m.content for m in messages[1:]] == ["feedback", "decide"]
+    assert len(history.message.content) == len("feedback")
+
+def test_disabled_ceiling_keeps_everything():
+    messages, truncated = prompt_messages("x " * 4000, max_tokens=0)
+    assert truncated == 0 and messages[0].content == "x " * 4000
+
+# ===========================
+# Soak
+# ===========================
+
+@pytest.mark.asyncio
+async def test_payload_stays_flat_over_many_calls(monkeypatch):
+    """
+    Standalone calls must not accumulate earlier queries: 10k merges send the same payload size.
+    """
+    from app import generation_pipeline
+    from app.metrics import labelled
+
+    sizes = []
+
+    class FakeLLM:
+        async def ainvoke(self, messages):
+            sizes.append(sum(len(str(m.content)) for m in messages))
+            usage_metadata = {"input_tokens": 1, "output_tokens": 1}
+            return SimpleNamespace(content="<PROMPT>merged</PROMPT>", usage_metadata=usage_metadata)
+
+    monkeypatch.setattr("app.llm.llm_registry.get", lambda model, **settings: FakeLLM())
+    monkeypatch.setattr(generation_pipeline, "llm_scheduler", LLMScheduler(rpm=10**9, tpm=10**12, max_in_flight=10))
+
+    with labelled(step="merge"):
+        for i in range(10_000):
+            await generation_pipeline._generate_response(f"merge request {i % 10}")
+
+    assert len(sizes) == 10_000
+    assert max(sizes) == min(sizes)
@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+
+from app.disconnect import CallEstimates, ClientDisconnected, cancel_on_disconnect
+from app.metrics import LLM_CALLS_SAVED, REQUEST_CANCELLATIONS
+from app.usage import tracking
+
+# ===========================
+# Helpers
+# ===========================
+
+class FakeRequest:
+    """Request whose client disconnects after `connected_checks` connection checks."""
+
+    def __init__(self, connected_checks: int = 10**9, error: Exception = None):
+        self.connected_checks = connected_checks
+        self.error = error
+
+    async def is_disconnected(self) -> bool:
+        if self.error is not None:
+            raise self.error
+        self.connected_checks -= 1
+        return self.connected_checks < 0
+
+# ===========================
+# Cancellation
+# ===========================
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_the_whole_task_tree():
+    started, cancelled = [], []
+
+    async def pattern(name):
+        started.append(name)
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+
+    async def category(names):
+        return await asyncio.gather(*(pattern(name) for name in names))
+
+    async def improve():
+        return await asyncio.gather(category(["a", "b"]), category(["c"]))
+
+    before = REQUEST_CANCELLATIONS.value(route="test")
+    with pytest.raises(ClientDisconnected):
+        await cancel_on_disconnect(FakeRequest(connected_checks=2), improve(), "test", poll_seconds=0.01)
+
+    assert sorted(started) == sorted(cancelled) == ["a", "b", "c"]
+    assert REQUEST_CANCELLATIONS.value(route="test") == before + 1
+
+@pytest.mark.asyncio
+async def test_connected_client_gets_the_result():
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    assert await cancel_on_disconnect(FakeRequest(), work(), "test", poll_seconds=0.005) == "done"
+
+@pytest.mark.asyncio
+async def test_unwatchable_connection_never_cancels_work():
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    request = FakeRequest(error=RuntimeError("no receive channel"))
+    assert await cancel_on_disconnect(request, work(), "test", poll_seconds=0.005) == "done"
+
+@pytest.mark.asyncio
+async def test_errors_of_the_work_are_raised():
+    async def failing():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await cancel_on_disconnect(FakeRequest(), failing(), "test", poll_seconds=0.005)
+
+# ===========================
+# Saved Calls
+# ===========================
+
+def test_saved_calls_follow_completed_requests():
+    estimates = CallEstimates(weight=0.5)
+    assert estimates.saved("create", 3) == 0
+
+    estimates.observe("create", 40)
+    estimates.observe("create", 20)
+    assert estimates.saved("create", 10) == 20
+    assert estimates.saved("create", 50) == 0
+
+@pytest.mark.asyncio
+async def test_cancellation_counts_the_calls_it_saved(monkeypatch):
+    estimates = CallEstimates()
+    estimates.observe("saved-test", 40)
+    monkeypatch.setattr("app.disconnect.call_estimates", estimates)
+
+    with tracking("u1") as usage:
+        with pytest.raises(ClientDisconnected):
+            await cancel_on_disconnect(
+                FakeRequest(connected_checks=0), asyncio.sleep(30), "saved-test", usage, poll_seconds=0.01
+            )
+
+    assert LLM_CALLS_SAVED.value(route="saved-test") == 40
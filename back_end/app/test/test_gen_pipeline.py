@@ -7,6 +7,7 @@ from app.generation_pipeline import (
     _standardize_category_outputs,
     apply_category,
     improve_prompt,
+    iter_improve_prompt,
     merge_prompts,
     manually_improve_prompt,
 )
@@ -17,6 +18,7 @@ from app.config import (
     STANDARDIZATION_PROMPT,
     MANUAL_IMPROVEMENT_PROMPT,
 )
+from app.cache import MemoryCacheBackend, result_cache
 from langchain.schema import HumanMessage, AIMessage
 
 # ===========================
@@ -37,6 +39,8 @@ async def _dummy_generate_response(query, history=None):
     Returns <PROMPT> tags or fallback values based on input.
     """
     txt = query.content if hasattr(query, "content") else query
+    if "<DECISION>" in txt:
+        return "<FEEDBACK>fused feedback</FEEDBACK><DECISION>Yes</DECISION><PROMPT>fused‐improved</PROMPT>"
     if EVALUATION_PROMPT in txt:
         return "Yes."
     if IMPROVEMENT_PROMPT in txt:
@@ -52,6 +56,15 @@ def patch_generate(monkeypatch):
     """
     monkeypatch.setattr("app.generation_pipeline._generate_response", _dummy_generate_response)
 
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """
+    Give every test an empty result cache.
+    """
+    monkeypatch.setattr(result_cache, "backend", MemoryCacheBackend())
+    monkeypatch.setattr(result_cache, "hits", 0)
+    monkeypatch.setattr(result_cache, "misses", 0)
+
 # ===========================
 # Unit Tests
 # ===========================
@@ -122,3 +135,351 @@ async def test_manual_and_full_pipeline():
     assert improve["input"] == "hello"
     assert isinstance(improve["categories"], list)
     assert "output" in improve
+
+@pytest.mark.asyncio
+async def test_apply_pattern_uses_result_cache(monkeypatch):
+    """
+    Repeating the same pattern application must not call the LLM again.
+    """
+    calls = []
+
+    async def counting_generate_response(query, history=None):
+        calls.append(query)
+        return await _dummy_generate_response(query, history)
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", counting_generate_response)
+
+    first = await _apply_pattern("cached", CATEGORY, PATTERN)
+    calls_after_first = len(calls)
+    second = await _apply_pattern("cached", CATEGORY, PATTERN)
+
+    assert second == first
+    assert len(calls) == calls_after_first
+    assert result_cache.hits == 1
+
+@pytest.mark.asyncio
+async def test_apply_pattern_fused_mode(monkeypatch):
+    """
+    Fused mode must make a single LLM call and produce the same result shape.
+    """
+    calls = []
+
+    async def counting_generate_response(query, history=None):
+        calls.append(query)
+        return await _dummy_generate_response(query, history)
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", counting_generate_response)
+
+    out = await _apply_pattern("foo", CATEGORY, PATTERN, fused=True)
+
+    assert len(calls) == 1
+    assert out == {
+        "input": "foo",
+        "pattern": PATTERN,
+        "applied": True,
+        "feedback": "fused feedback",
+        "output": "fused‐improved",
+    }
+
+    std = await _standardize_pattern_outputs([out], CATEGORY)
+    assert std["preview"] == "fused‐improved"
+
+@pytest.mark.asyncio
+async def test_iter_improve_prompt_streams_progress():
+    """
+    Every pattern and category is reported before the final merged result.
+    """
+    events = [event async for event in iter_improve_prompt("hello")]
+    kinds = [event["event"] for event in events]
+
+    assert kinds.count("pattern") == sum(len(p) for p in CATEGORY_TO_PATTERNS.values())
+    assert kinds.count("category") == len(CATEGORY_TO_PATTERNS)
+    assert kinds[-1] == "result"
+
+    result = events[-1]["data"]
+    assert result["input"] == "hello"
+    assert [c["category"] for c in result["categories"]] == list(CATEGORY_TO_PATTERNS)
+
+
+@pytest.mark.asyncio
+async def test_apply_pattern_labels_calls_and_stages(monkeypatch):
+    """
+    LLM calls see the step, pattern and category they belong to, and stage latency is recorded.
+    """
+    from app.metrics import PIPELINE_STAGE_SECONDS, current_labels
+
+    seen = []
+
+    async def labelling_generate_response(query, history=None):
+        seen.append(current_labels("step", "pattern", "category"))
+        return await _dummy_generate_response(query, history)
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", labelling_generate_response)
+    before = PIPELINE_STAGE_SECONDS.count(stage="apply_pattern", pattern=PATTERN, category=CATEGORY)
+
+    await _apply_pattern("labelled", CATEGORY, PATTERN)
+
+    assert seen[0] == {"step": "feedback", "pattern": PATTERN, "category": CATEGORY}
+    assert {labels["step"] for labels in seen} <= {"feedback", "evaluation", "improvement"}
+    assert PIPELINE_STAGE_SECONDS.count(stage="apply_pattern", pattern=PATTERN, category=CATEGORY) == before + 1
+
+# ===========================
+# Relevance Triage
+# ===========================
+
+def test_parse_triage_scores():
+    from app.generation_pipeline import _parse_triage_scores
+
+    scores = _parse_triage_scores(
+        "Persona | 8 | needs a point of view\n"
+        "- template | 2/10 | no format asked\n"
+        "Unknown Pattern | 9 | ignored\n"
+        "Reflection | high | malformed"
+    )
+    assert scores == {"Persona": (8.0, "needs a point of view"), "Template": (2.0, "no format asked")}
+
+@pytest.mark.asyncio
+async def test_improve_prompt_with_triage_skips_irrelevant_patterns(monkeypatch):
+    """
+    One triage call scores every pattern; only relevant ones run the per-pattern chain,
+    skipped ones are still reported as not applied with the triage reason.
+    """
+    from app.config import TRIAGE_PROMPT
+
+    calls = []
+
+    async def triaging_generate_response(query, history=None):
+        txt = query.content if hasattr(query, "content") else query
+        calls.append(txt)
+        if TRIAGE_PROMPT.split("{")[0] in txt:
+            return "<SCORES>\nPersona | 9 | needs a perspective\nTemplate | 1 | no format needed\n</SCORES>"
+        return await _dummy_generate_response(query, history)
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", triaging_generate_response)
+    monkeypatch.setattr("app.generation_pipeline.TRIAGE_THRESHOLD", 5)
+
+    result = await improve_prompt("triaged", triage=True)
+    patterns = {p["pattern"]: p for c in result["categories"] for p in c["patterns"]}
+
+    # Unscored patterns fail open to the threshold, so only Template is skipped
+    assert patterns["Template"]["applied"] is False
+    assert patterns["Template"]["feedback"] == "Skipped by relevance triage (1/10): no format needed"
+    assert patterns["Persona"]["applied"] is True
+    assert len(patterns) == sum(len(p) for p in CATEGORY_TO_PATTERNS.values())
+
+    triage_calls = [c for c in calls if TRIAGE_PROMPT.split("{")[0] in c]
+    assert len(triage_calls) == 1
+    assert not any("Template Pattern" in c for c in calls)
+
+@pytest.mark.asyncio
+async def test_triage_failure_applies_every_pattern():
+    """
+    An unparseable triage response must not drop any pattern.
+    """
+    from app.generation_pipeline import TRIAGE_THRESHOLD, _triage_patterns
+
+    scores = await _triage_patterns("unparseable")  # Dummy response has no <SCORES> tag
+    assert all(score == TRIAGE_THRESHOLD for score, _ in scores.values())
+
+# ===========================
+# Merge Reduction Strategies
+# ===========================
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("strategy", ["two_level", "flat", "tree"])
+async def test_merge_strategies_report_merges(monkeypatch, strategy):
+    """
+    Every strategy reports the merges it performed, matching the merge calls made;
+    flat and tree leave multi-pattern category previews to be merged on demand.
+    """
+    import math
+    from app.generation_pipeline import PIPELINE_MERGES
+
+    merge_calls = []
+
+    async def distinct_generate_response(query, history=None):
+        txt = query.content if hasattr(query, "content") else query
+        if STANDARDIZATION_PROMPT.split("{")[0] in txt:
+            merge_calls.append(txt)
+            return f"<PROMPT>merged {len(merge_calls)}</PROMPT>"
+        # Fused mode: a distinct improvement per pattern
+        return f"<FEEDBACK>f</FEEDBACK><DECISION>Yes</DECISION><PROMPT>improved {hash(txt)}</PROMPT>"
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", distinct_generate_response)
+    monkeypatch.setattr("app.generation_pipeline.MERGE_FAN_IN", 3)
+    before = PIPELINE_MERGES.value(strategy=strategy)
+
+    result = await improve_prompt("reduce me", fused=True, merge_strategy=strategy)
+
+    sizes = [len(patterns) for patterns in CATEGORY_TO_PATTERNS.values()]
+    if strategy == "two_level":
+        expected = sum(size > 1 for size in sizes) + 1
+    elif strategy == "flat":
+        expected = 1
+    else:
+        expected, level = 0, sum(sizes)
+        while level > 1:
+            expected += level // 3 + (level % 3 > 1)
+            level = math.ceil(level / 3)
+
+    assert result["reduction"]["strategy"] == strategy
+    assert result["reduction"]["merges"] == expected == len(merge_calls)
+    assert result["reduction"]["seconds"] >= 0
+    assert result["output"].startswith("merged")
+    assert PIPELINE_MERGES.value(strategy=strategy) == before + expected
+
+    for category, size in zip(CATEGORY_TO_PATTERNS, sizes):
+        preview = next(c["preview"] for c in result["categories"] if c["category"] == category)
+        if size == 1:
+            assert preview.startswith("improved")
+        elif strategy == "two_level":
+            assert preview.startswith("merged")
+        else:
+            assert preview is None
+
+@pytest.mark.asyncio
+async def test_unknown_merge_strategy_is_rejected():
+    with pytest.raises(Exception):
+        await improve_prompt("hello", merge_strategy="random")
+
+# ===========================
+# Incremental Pattern Toggles
+# ===========================
+
+@pytest.mark.asyncio
+async def test_apply_category_reuses_fresh_stored_outputs(monkeypatch):
+    """
+    Forced patterns with a stored output computed from the same input are not applied
+    again; a stale or missing output is recomputed. Only the merge remains.
+    """
+    from app.generation_pipeline import pattern_input_hash
+
+    category = next(c for c, patterns in CATEGORY_TO_PATTERNS.items() if len(patterns) >= 3)
+    fresh, stale, missing = CATEGORY_TO_PATTERNS[category][:3]
+    calls = []
+
+    async def counting_generate_response(query, history=None):
+        calls.append(query.content if hasattr(query, "content") else query)
+        return await _dummy_generate_response(query, history)
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", counting_generate_response)
+
+    stored = {
+        fresh: {"feedback": "kept", "output": "stored fresh", "input_hash": pattern_input_hash("in", category, fresh)},
+        stale: {
+            "feedback": "old", "output": "stored stale", "input_hash": pattern_input_hash("other", category, stale)
+        },
+        missing: {"feedback": "none", "output": None, "input_hash": None},
+    }
+    result = await apply_category("in", category, force_patterns=[fresh, stale, missing], stored_patterns=stored)
+    patterns = {p["pattern"]: p for p in result["patterns"]}
+
+    assert patterns[fresh]["output"] == "stored fresh"
+    assert patterns[fresh]["feedback"] == "kept"
+    assert patterns[stale]["output"] == "pattern‐improved"
+    assert patterns[missing]["output"] == "pattern‐improved"
+    assert all(p["input_hash"] == pattern_input_hash("in", category, name) for name, p in patterns.items())
+
+    # Feedback and improvement for the two recomputed patterns, then one merge
+    assert len(calls) == 5
+    assert STANDARDIZATION_PROMPT.split("{")[0] in calls[-1]
+
+# ===========================
+# Single-flight Coalescing
+# ===========================
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_improvements_share_one_fan_out(monkeypatch):
+    """
+    A double submit costs the LLM calls of one generation.
+    """
+    import asyncio
+
+    calls = []
+
+    async def slow_generate_response(query, history=None):
+        calls.append(1)
+        await asyncio.sleep(0.001)
+        return await _dummy_generate_response(query, history)
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", slow_generate_response)
+
+    await improve_prompt("warm up", fused=True)
+    single = len(calls)
+    calls.clear()
+    monkeypatch.setattr(result_cache, "backend", MemoryCacheBackend())
+
+    results = await asyncio.gather(improve_prompt("double", fused=True), improve_prompt("double", fused=True))
+    assert len(calls) == single
+    assert results[0]["output"] == results[1]["output"]
+    assert results[0] is not results[1]
+
+# ===========================
+# Failed Patterns and Retries
+# ===========================
+
+def _failing_generate_response(failing, calls):
+    """LLM stand-in that fails every call for the patterns in `failing` and logs the others."""
+    from app.prompts import prompt_registry
+
+    async def generate_response(query, history=None):
+        txt = query.content if hasattr(query, "content") else query
+        if any(prompt_registry.fused(pattern).prefix in txt for pattern in failing):
+            raise Exception("provider error")
+        calls.append(txt)
+        return await _dummy_generate_response(query, history)
+
+    return generate_response
+
+@pytest.mark.asyncio
+async def test_failed_pattern_gives_partial_result(monkeypatch):
+    """
+    A pattern whose call fails is reported instead of failing the whole generation.
+    """
+    from app.generation_pipeline import PIPELINE_FAILED_PATTERNS
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", _failing_generate_response([PATTERN], []))
+    before = PIPELINE_FAILED_PATTERNS.value(category=CATEGORY, pattern=PATTERN)
+
+    result = await improve_prompt("partly", fused=True)
+
+    assert result["status"] == "partial"
+    assert result["failed"] == [{"category": CATEGORY, "pattern": PATTERN, "error": "Exception: provider error"}]
+    failed = next(p for c in result["categories"] for p in c["patterns"] if p["pattern"] == PATTERN)
+    assert failed["applied"] is False and failed["error"] == "Exception: provider error"
+    assert PIPELINE_FAILED_PATTERNS.value(category=CATEGORY, pattern=PATTERN) == before + 1
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", _dummy_generate_response)
+    ok = await improve_prompt("fully", fused=True)
+    assert ok["status"] == "complete" and ok["failed"] == []
+
+@pytest.mark.asyncio
+async def test_every_pattern_failing_fails_the_generation(monkeypatch):
+    patterns = [pattern for patterns in CATEGORY_TO_PATTERNS.values() for pattern in patterns]
+    monkeypatch.setattr("app.generation_pipeline._generate_response", _failing_generate_response(patterns, []))
+    with pytest.raises(Exception):
+        await improve_prompt("nothing works", fused=True)
+
+@pytest.mark.asyncio
+async def test_retry_reruns_only_the_failed_patterns(monkeypatch):
+    """
+    Retrying a partial result applies the failed patterns again and reuses the stored ones.
+    """
+    from app.generation_pipeline import retry_failed_patterns
+    from app.prompts import prompt_registry
+
+    monkeypatch.setattr("app.generation_pipeline._generate_response", _failing_generate_response([PATTERN], []))
+    partial = await improve_prompt("retry me", fused=True)
+    stored = {c["category"]: {p["pattern"]: p for p in c["patterns"]} for c in partial["categories"]}
+
+    calls = []
+    monkeypatch.setattr("app.generation_pipeline._generate_response", _failing_generate_response([], calls))
+    monkeypatch.setattr(result_cache, "backend", MemoryCacheBackend())
+
+    result = await retry_failed_patterns("retry me", stored, fused=True)
+
+    assert result["status"] == "complete" and result["failed"] == []
+    retried = next(p for c in result["categories"] for p in c["patterns"] if p["pattern"] == PATTERN)
+    assert retried["applied"] is True and retried["output"] == "fused‐improved" and retried["error"] is None
+    pattern_calls = [txt for txt in calls if STANDARDIZATION_PROMPT.split("{")[0] not in txt]
+    assert len(pattern_calls) == 1 and prompt_registry.fused(PATTERN).prefix in pattern_calls[0]
@@ -3,6 +3,7 @@ from fastapi.testclient import TestClient
 from datetime import datetime
 from types import SimpleNamespace
 from unittest.mock import AsyncMock
+from contextlib import asynccontextmanager
 
 from app.main import app
 from app.types.response import ResponseRead, CategoryRead, PatternRead
@@ -23,10 +24,10 @@ def disable_auth_and_stub_pipeline(monkeypatch):
     monkeypatch.setattr(AuthMiddleware, "dispatch", dummy_dispatch)
 
     # Stub the generation pipeline functions to prevent LLM calls
-    async def stub_improve_prompt(user_input):
+    async def stub_improve_prompt(user_input, fused=None):
         return {"input": user_input, "categories": [], "output": user_input}
 
-    async def stub_apply_category(user_input, category, force_patterns=None):
+    async def stub_apply_category(user_input, category, force_patterns=None, fused=None, stored_patterns=None):
         return {"preview": f"{user_input}-preview", "patterns": []}
 
     async def stub_merge_prompts(previews):
@@ -42,6 +43,12 @@ def disable_auth_and_stub_pipeline(monkeypatch):
     monkeypatch.setattr(main_mod, "apply_category", stub_apply_category)
     monkeypatch.setattr(main_mod, "merge_prompts", stub_merge_prompts)
 
+    async def stub_iter_improve_prompt(user_input, fused=None):
+        yield {"event": "pattern", "data": {"category": "X", "pattern": "pat", "applied": False, "feedback": "f"}}
+        yield {"event": "result", "data": await stub_improve_prompt(user_input)}
+
+    monkeypatch.setattr(main_mod, "iter_improve_prompt", stub_iter_improve_prompt)
+
 # ===========================
 # Prisma Mock Fixture
 # ===========================
@@ -58,6 +65,8 @@ def prisma_mock(monkeypatch):
         response=SimpleNamespace(
             create=AsyncMock(),
             find_unique=AsyncMock(),
+            find_many=AsyncMock(),
+            update=AsyncMock(),
         ),
         category=SimpleNamespace(
             find_unique=AsyncMock(),
@@ -66,6 +75,7 @@ def prisma_mock(monkeypatch):
         pattern=SimpleNamespace(
             find_many=AsyncMock(),
             update=AsyncMock(),
+            update_many=AsyncMock(),
         ),
         user=SimpleNamespace(
             create=AsyncMock(),
@@ -74,8 +84,26 @@ def prisma_mock(monkeypatch):
             update=AsyncMock(),
             delete=AsyncMock(),
         ),
+        generationjob=SimpleNamespace(
+            create=AsyncMock(),
+            find_unique=AsyncMock(),
+        ),
+        llmcall=SimpleNamespace(
+            create_many=AsyncMock(),
+        ),
+        # Daily usage lookup: no per-user budget, nothing spent yet
+        query_raw=AsyncMock(return_value=[{"budget": None, "used": 0}]),
     )
+    # Transactions run against the same mock
+    @asynccontextmanager
+    async def tx():
+        yield mock
+    mock.tx = tx
+
     monkeypatch.setattr("app.main.prisma", mock)
+    monkeypatch.setattr("app.main.response_store.client", mock)
+    monkeypatch.setattr("app.main.job_queue.client", mock)
+    monkeypatch.setattr("app.main.usage_store.client", mock)
     return mock
 
 # ===========================
@@ -86,6 +114,22 @@ def prisma_mock(monkeypatch):
 def client():
     return TestClient(app)
 
+# ===========================
+# Test: Sign-out
+# ===========================
+
+def test_sign_out_forgets_the_cached_session(client, monkeypatch):
+    from app.middleware.auth import SESSION_COOKIE, SessionCache
+
+    cache = SessionCache()
+    cache.set("token", "test-user-123")
+    monkeypatch.setattr("app.main.session_cache", cache)
+
+    client.cookies.set(SESSION_COOKIE, "token")
+    r = client.post("/api/v1/users/signout")
+    assert r.status_code == 204
+    assert cache.get("token") is None
+
 # ===========================
 # Test: Create + Get Response
 # ===========================
@@ -112,11 +156,123 @@ def test_create_and_read_response(client, prisma_mock):
     body = r.json()
     assert body["response_id"] == "r1"
 
+    # Written with a single nested create, no re-query
+    prisma_mock.response.create.assert_awaited_once()
+    prisma_mock.response.find_unique.assert_not_called()
+
     # GET: Retrieve the same response
     r2 = client.get("/api/v1/responses/r1")
     assert r2.status_code == 200
     assert r2.json() == body
 
+# ===========================
+# Test: Streaming Create
+# ===========================
+
+def test_create_response_stream(client, prisma_mock):
+    """
+    Verify progress events are streamed and the stored response is sent last.
+    """
+    response_obj = ResponseRead(
+        response_id="r1",
+        user_id="test-user-123",
+        input="hello",
+        output="hello",
+        created_at=datetime.utcnow(),
+        categories=[]
+    )
+    prisma_mock.response.create.return_value = response_obj
+    prisma_mock.response.find_unique.return_value = response_obj
+
+    r = client.post("/api/v1/responses/stream", json={"input": "hello"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+
+    events = [line.split(": ", 1)[1] for line in r.text.splitlines() if line.startswith("event: ")]
+    assert events == ["pattern", "result", "response"]
+    assert '"response_id": "r1"' in r.text
+
+def test_rewrite_streams_tokens_and_stores_the_result(client, prisma_mock, monkeypatch):
+    """
+    Merge and manual improvement stream their tokens, then store and send the final prompt.
+    """
+    seen = {}
+
+    async def stub_iter_merge_prompts(previews):
+        for text in ["merged ", "prompt"]:
+            yield {"event": "token", "data": {"text": text}}
+        yield {"event": "result", "data": {"output": "merged prompt"}}
+
+    async def stub_iter_manually_improve_prompt(user_feedback, generated_prompt):
+        seen["rewrite"] = (user_feedback, generated_prompt)
+        yield {"event": "token", "data": {"text": "shorter"}}
+        yield {"event": "result", "data": {"output": "shorter"}}
+
+    monkeypatch.setattr("app.main.iter_merge_prompts", stub_iter_merge_prompts)
+    monkeypatch.setattr("app.main.iter_manually_improve_prompt", stub_iter_manually_improve_prompt)
+
+    response_obj = ResponseRead(
+        response_id="r1", user_id="test-user-123", input="hello", output="merged prompt",
+        created_at=datetime.utcnow(), categories=[]
+    )
+    prisma_mock.response.find_unique.return_value = response_obj
+    prisma_mock.response.update.return_value = response_obj
+
+    r = client.put("/api/v1/responses/merge/r1/stream", json={"previews": ["a", "b"]})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [line.split(": ", 1)[1] for line in r.text.splitlines() if line.startswith("event: ")]
+    assert events == ["token", "token", "response"]
+    assert prisma_mock.response.update.call_args.kwargs["data"] == {"output": "merged prompt"}
+
+    r2 = client.post("/api/v1/responses/r1/improve/stream", json={"feedback": "make it shorter"})
+    assert r2.status_code == 200
+    assert seen["rewrite"] == ("make it shorter", "merged prompt")
+    assert prisma_mock.response.update.call_args.kwargs["data"] == {"output": "shorter"}
+
+    prisma_mock.response.find_unique.return_value = None
+    assert client.post("/api/v1/responses/missing/improve/stream", json={"feedback": "x"}).status_code == 404
+
+# ===========================
+# Test: List Responses
+# ===========================
+
+def test_list_responses_paginates_summaries(client, prisma_mock):
+    """
+    Verify keyset pagination returns truncated summaries and a usable cursor.
+    """
+    rows = [
+        SimpleNamespace(response_id=f"r{i}", input="x" * 500, output="short", created_at=datetime(2025, 1, 10 - i))
+        for i in range(3)
+    ]
+    prisma_mock.response.find_many.return_value = rows
+
+    r = client.get("/api/v1/responses/", params={"limit": 2, "text_length": 10})
+    assert r.status_code == 200
+    page = r.json()
+    assert [item["response_id"] for item in page["items"]] == ["r0", "r1"]
+    assert len(page["items"][0]["input"]) == 10
+    assert page["items"][0]["output"] == "short"
+    assert "categories" not in page["items"][0]
+    assert page["next_cursor"]
+
+    # Only one extra row is fetched and no nested data is loaded
+    kwargs = prisma_mock.response.find_many.await_args.kwargs
+    assert kwargs["take"] == 3
+    assert "include" not in kwargs
+
+    # The cursor continues after the last returned item
+    prisma_mock.response.find_many.return_value = rows[2:]
+    r2 = client.get("/api/v1/responses/", params={"limit": 2, "cursor": page["next_cursor"]})
+    assert r2.status_code == 200
+    assert [item["response_id"] for item in r2.json()["items"]] == ["r2"]
+    assert r2.json()["next_cursor"] is None
+    cursor_filter = prisma_mock.response.find_many.await_args.kwargs["where"]["AND"][-1]
+    assert cursor_filter["OR"][1]["response_id"] == {"lt": "r1"}
+
+    r3 = client.get("/api/v1/responses/", params={"cursor": "not-a-cursor"})
+    assert r3.status_code == 400
+
 # ===========================
 # Test: Update Category Patterns
 # ===========================
@@ -157,3 +313,341 @@ def test_update_category_patterns(client, prisma_mock):
     out = res.json()
     assert out["preview"] == "new-preview"
     assert out["patterns"][0]["applied"] is True
+
+    # Toggles and preview are written in one batch, no per-pattern updates
+    prisma_mock.pattern.update.assert_not_called()
+    prisma_mock.pattern.update_many.assert_awaited_once_with(
+        where={"category_id": "c1", "pattern_id": {"in": ["p1"]}},
+        data={"applied": True}
+    )
+
+def test_toggling_off_every_pattern_skips_the_model(client, prisma_mock, monkeypatch):
+    """
+    With every pattern toggled off the preview is the category input, without any LLM call.
+    """
+    async def no_apply_category(*args, **kwargs):
+        raise AssertionError("apply_category should not run")
+
+    monkeypatch.setattr("app.main.apply_category", no_apply_category)
+
+    pattern_obj = PatternRead(pattern_id="p1", pattern="pat", feedback="f", applied=True)
+    existing = CategoryRead(category_id="c1", category="X", input="orig", preview="old", patterns=[pattern_obj])
+    prisma_mock.category.find_unique.return_value = existing
+    prisma_mock.category.update.return_value = CategoryRead(
+        category_id="c1", category="X", input="orig", preview="orig",
+        patterns=[PatternRead(pattern_id="p1", pattern="pat", feedback="f", applied=False)]
+    )
+
+    res = client.put(
+        "/api/v1/categories/c1/patterns",
+        json={"patterns": [{"pattern_id": "p1", "applied": False}]},
+    )
+
+    assert res.status_code == 200
+    assert prisma_mock.category.update.call_args.kwargs["data"] == {"preview": "orig"}
+    prisma_mock.llmcall.create_many.assert_not_called()
+
+def test_category_preview_is_merged_on_demand(client, prisma_mock):
+    """
+    A preview left empty by the flat or tree merge strategy is merged from the stored
+    pattern outputs when first requested, and served as stored afterwards.
+    """
+    patterns = [
+        PatternRead(pattern_id="p1", pattern="b", feedback="f", applied=True, output="out-b"),
+        PatternRead(pattern_id="p2", pattern="a", feedback="f", applied=True, output="out-a"),
+        PatternRead(pattern_id="p3", pattern="c", feedback="f", applied=False),
+    ]
+    lazy = CategoryRead(category_id="c1", category="X", input="orig", preview=None, patterns=patterns)
+    merged = CategoryRead(category_id="c1", category="X", input="orig", preview="out-b", patterns=patterns)
+    prisma_mock.category.find_unique.return_value = lazy
+    prisma_mock.category.update.return_value = merged
+
+    r = client.get("/api/v1/categories/c1/preview")
+    assert r.status_code == 200
+    assert r.json()["preview"] == "out-b"
+    assert [p["pattern"] for p in r.json()["patterns"]] == ["a", "b", "c"]
+    prisma_mock.category.update.assert_awaited_once()
+    assert prisma_mock.category.update.call_args.kwargs["data"] == {"preview": "out-b"}
+
+    # Already merged: no new merge or write
+    prisma_mock.category.find_unique.return_value = merged
+    r2 = client.get("/api/v1/categories/c1/preview")
+    assert r2.status_code == 200
+    prisma_mock.category.update.assert_awaited_once()
+
+def test_update_category_patterns_stores_recomputed_outputs(client, prisma_mock, monkeypatch):
+    """
+    Outputs of patterns that had to be recomputed are stored with their input hash;
+    reused ones are left alone.
+    """
+    patterns = [
+        PatternRead(pattern_id="p1", pattern="a", feedback="f", applied=True, output="out-a", input_hash="h"),
+        PatternRead(pattern_id="p2", pattern="b", feedback="f", applied=False),
+    ]
+    category = CategoryRead(category_id="c1", category="X", input="orig", preview="out-a", patterns=patterns)
+    prisma_mock.category.find_unique.return_value = category
+    prisma_mock.category.update.return_value = category
+
+    seen = {}
+
+    async def incremental_apply_category(user_input, category, force_patterns=None, fused=None, stored_patterns=None):
+        seen["stored"] = stored_patterns
+        return {"preview": "merged", "patterns": [
+            {"pattern": "a", "applied": True, "feedback": "f", "output": "out-a", "input_hash": "h"},
+            {"pattern": "b", "applied": True, "feedback": "g", "output": "out-b", "input_hash": "h"},
+        ]}
+
+    monkeypatch.setattr("app.main.apply_category", incremental_apply_category)
+
+    r = client.put("/api/v1/categories/c1/patterns", json={"patterns": [{"pattern_id": "p2", "applied": True}]})
+    assert r.status_code == 200
+    assert seen["stored"]["a"] == {"feedback": "f", "output": "out-a", "input_hash": "h"}
+
+    prisma_mock.pattern.update.assert_awaited_once_with(
+        where={"pattern_id": "p2"}, data={"output": "out-b", "input_hash": "h", "error": None}
+    )
+    assert prisma_mock.category.update.call_args.kwargs["data"] == {"preview": "merged"}
+
+# ===========================
+# Test: Partial Responses
+# ===========================
+
+def test_partial_response_stores_errors_and_can_be_retried(client, prisma_mock, monkeypatch):
+    """
+    Failed patterns are stored with their error; the retry endpoint re-runs only those and
+    writes back just the patterns that changed.
+    """
+    async def partial_improve_prompt(user_input, fused=None):
+        return {"input": user_input, "output": "merged", "status": "partial", "categories": [{
+            "category": "X", "preview": "merged", "patterns": [
+                {"pattern": "a", "applied": True, "feedback": "f", "output": "out-a", "input_hash": "h"},
+                {
+                    "pattern": "b", "applied": False, "feedback": "", "output": user_input, "input_hash": None,
+                    "error": "Exception: boom",
+                },
+            ],
+        }]}
+
+    monkeypatch.setattr("app.main.improve_prompt", partial_improve_prompt)
+    partial = ResponseRead(
+        response_id="r1", user_id="test-user-123", input="hello", output="merged", status="partial",
+        created_at=datetime.utcnow(),
+        categories=[CategoryRead(category_id="c1", category="X", input="hello", preview="merged", patterns=[
+            PatternRead(pattern_id="p1", pattern="a", feedback="f", applied=True, output="out-a", input_hash="h"),
+            PatternRead(pattern_id="p2", pattern="b", feedback="", applied=False, error="Exception: boom"),
+        ])],
+    )
+    prisma_mock.response.create.return_value = partial
+
+    r = client.post("/api/v1/responses/", json={"input": "hello"})
+    assert r.status_code == 200 and r.json()["status"] == "partial"
+    data = prisma_mock.response.create.call_args.kwargs["data"]
+    assert data["status"] == "partial"
+    assert [p["error"] for p in data["categories"]["create"][0]["patterns"]["create"]] == [None, "Exception: boom"]
+
+    seen = {}
+
+    async def stub_retry_failed_patterns(user_input, stored, fused=None, merge_strategy=None):
+        seen["stored"] = stored
+        return {"input": user_input, "output": "merged again", "status": "complete", "failed": [], "categories": [{
+            "category": "X", "preview": "merged again", "patterns": [
+                {"pattern": "a", "applied": True, "feedback": "f", "output": "out-a", "input_hash": "h", "error": None},
+                {"pattern": "b", "applied": True, "feedback": "g", "output": "out-b", "input_hash": "h", "error": None},
+            ],
+        }]}
+
+    monkeypatch.setattr("app.main.retry_failed_patterns", stub_retry_failed_patterns)
+    prisma_mock.response.find_unique.return_value = partial
+    completed = partial.model_copy(update={"status": "complete", "output": "merged again"})
+    prisma_mock.response.update.return_value = completed
+
+    r2 = client.post("/api/v1/responses/r1/retry")
+    assert r2.status_code == 200 and r2.json()["status"] == "complete"
+    assert seen["stored"]["X"]["b"]["error"] == "Exception: boom"
+    prisma_mock.pattern.update.assert_awaited_once_with(where={"pattern_id": "p2"}, data={
+        "feedback": "g", "applied": True, "output": "out-b", "input_hash": "h", "error": None,
+    })
+    assert prisma_mock.category.update.call_args.kwargs["data"] == {"preview": "merged again"}
+    assert prisma_mock.response.update.call_args.kwargs["data"] == {"output": "merged again", "status": "complete"}
+
+    # A complete response is returned as stored, in the same order as get_response
+    def category(name, patterns):
+        return CategoryRead(category_id=name, category=name, input="hello", preview="p", patterns=[
+            PatternRead(pattern_id=p, pattern=p, feedback="", applied=False) for p in patterns
+        ])
+
+    prisma_mock.response.find_unique.return_value = completed.model_copy(update={"categories": [
+        category("Interaction", ["b", "a"]), category("Input Semantics", ["Persona", "meta"]),
+    ]})
+    r3 = client.post("/api/v1/responses/r1/retry")
+    assert r3.status_code == 200
+    prisma_mock.pattern.update.assert_awaited_once()
+    assert [(c["category"], [p["pattern"] for p in c["patterns"]]) for c in r3.json()["categories"]] == [
+        ("Input Semantics", ["meta", "Persona"]), ("Interaction", ["a", "b"]),
+    ]
+
+# ===========================
+# Test: Generation Jobs
+# ===========================
+
+def test_enqueue_and_poll_job(client, prisma_mock):
+    """
+    Verify a job is enqueued immediately and its status and response can be polled.
+    """
+    queued = SimpleNamespace(
+        job_id="j1", user_id="test-user-123", status="queued", attempts=0,
+        error=None, response_id=None, created_at=datetime.utcnow(), finished_at=None
+    )
+    prisma_mock.generationjob.create.return_value = queued
+    prisma_mock.generationjob.find_unique.return_value = queued
+
+    r = client.post("/api/v1/jobs/", json={"input": "hello"})
+    assert r.status_code == 202
+    assert r.json()["job_id"] == "j1"
+    assert r.json()["status"] == "queued"
+
+    # Not finished yet
+    r2 = client.get("/api/v1/jobs/j1/response")
+    assert r2.status_code == 409
+
+    done = SimpleNamespace(**{**vars(queued), "status": "succeeded", "attempts": 1, "response_id": "r1"})
+    prisma_mock.generationjob.find_unique.return_value = done
+    prisma_mock.response.find_unique.return_value = ResponseRead(
+        response_id="r1", user_id="test-user-123", input="hello", output="better",
+        created_at=datetime.utcnow(), categories=[]
+    )
+
+    r3 = client.get("/api/v1/jobs/j1")
+    assert r3.status_code == 200
+    assert r3.json()["status"] == "succeeded"
+
+    r4 = client.get("/api/v1/jobs/j1/response")
+    assert r4.status_code == 200
+    assert r4.json()["output"] == "better"
+
+def test_job_of_other_user_is_hidden(client, prisma_mock):
+    prisma_mock.generationjob.find_unique.return_value = SimpleNamespace(
+        job_id="j2", user_id="someone-else", status="queued"
+    )
+    r = client.get("/api/v1/jobs/j2")
+    assert r.status_code == 404
+
+# ===========================
+# Test: Token Usage and Budgets
+# ===========================
+
+def test_merge_logs_token_usage(client, prisma_mock, monkeypatch):
+    """
+    LLM calls made by the merge are logged and added to the response totals.
+    """
+    from app.metrics import labelled
+    from app.usage import record_call
+
+    async def merging_with_llm_call(previews):
+        with labelled(step="merge"):
+            usage_metadata = {"input_tokens": 100, "output_tokens": 20}
+            record_call("gpt-4.1-mini", [], SimpleNamespace(content="m", usage_metadata=usage_metadata))
+        return "merged"
+
+    monkeypatch.setattr("app.main.merge_prompts", merging_with_llm_call)
+
+    response_obj = ResponseRead(
+        response_id="r1", user_id="test-user-123", input="hello", output="merged",
+        created_at=datetime.utcnow(), categories=[], llm_calls=1, input_tokens=100, output_tokens=20,
+    )
+    prisma_mock.response.find_unique.return_value = response_obj
+    prisma_mock.response.update.return_value = response_obj
+
+    r = client.put("/api/v1/responses/merge/r1", json={"previews": ["a", "b"]})
+    assert r.status_code == 200
+    assert r.json()["input_tokens"] == 100
+
+    data = prisma_mock.response.update.call_args.kwargs["data"]
+    assert data["output"] == "merged"
+    assert data["llm_calls"] == {"increment": 1}
+    assert data["input_tokens"] == {"increment": 100}
+
+    rows = prisma_mock.llmcall.create_many.call_args.kwargs["data"]
+    assert rows == [{
+        "user_id": "test-user-123", "step": "merge", "category": None, "pattern": None,
+        "model": "gpt-4.1-mini", "input_tokens": 100, "output_tokens": 20, "cached_input_tokens": 0,
+        "coalesced": False, "response_id": "r1",
+    }]
+
+def test_exhausted_budget_rejects_generation(client, prisma_mock):
+    """
+    A user over their daily token budget gets 429 before any generation starts.
+    """
+    prisma_mock.query_raw.return_value = [{"budget": 1000, "used": 1500}]
+
+    r = client.post("/api/v1/responses/", json={"input": "hello"})
+    assert r.status_code == 429
+    assert "budget" in r.json()["detail"]
+    prisma_mock.response.create.assert_not_called()
+
+
+def test_disconnected_client_cancels_generation(client, prisma_mock, monkeypatch):
+    """
+    When the client is gone the generation is cancelled, nothing is stored and the calls
+    made so far are still logged for the budget.
+    """
+    import asyncio
+    from starlette.requests import Request
+    from app.metrics import labelled
+    from app.usage import record_call
+
+    cancelled = []
+
+    async def slow_improve_prompt(user_input, fused=None):
+        with labelled(step="feedback"):
+            usage_metadata = {"input_tokens": 10, "output_tokens": 5}
+            record_call("gpt-4.1-mini", [], SimpleNamespace(content="f", usage_metadata=usage_metadata))
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def disconnected(self):
+        return True
+
+    monkeypatch.setattr("app.main.improve_prompt", slow_improve_prompt)
+    monkeypatch.setattr(Request, "is_disconnected", disconnected)
+
+    r = client.post("/api/v1/responses/", json={"input": "hello"})
+    assert r.status_code == 499
+    assert cancelled == [1]
+    prisma_mock.response.create.assert_not_called()
+    rows = prisma_mock.llmcall.create_many.call_args.kwargs["data"]
+    assert [(row["step"], row["user_id"]) for row in rows] == [("feedback", "test-user-123")]
+
+
+def test_failed_generation_still_logs_its_calls(client, prisma_mock, monkeypatch):
+    """
+    A generation that fails partway stores no response, but the calls it made are still
+    logged for the budget, both in the route and in the job runner.
+    """
+    import asyncio
+    from app.main import _run_generation_job
+    from app.metrics import labelled
+    from app.usage import record_call
+
+    async def failing_improve_prompt(user_input, fused=None):
+        with labelled(step="feedback"):
+            usage_metadata = {"input_tokens": 10, "output_tokens": 5}
+            record_call("gpt-4.1-mini", [], SimpleNamespace(content="f", usage_metadata=usage_metadata))
+        raise Exception("Every pattern failed")
+
+    monkeypatch.setattr("app.main.improve_prompt", failing_improve_prompt)
+
+    r = client.post("/api/v1/responses/", json={"input": "hello"})
+    assert r.status_code == 500
+    prisma_mock.response.create.assert_not_called()
+    rows = prisma_mock.llmcall.create_many.call_args.kwargs["data"]
+    assert [(row["step"], row["user_id"]) for row in rows] == [("feedback", "test-user-123")]
+
+    prisma_mock.llmcall.create_many.reset_mock()
+    with pytest.raises(Exception, match="Every pattern failed"):
+        asyncio.run(_run_generation_job({"user_id": "job-user", "input": "hello", "fused": None}))
+    rows = prisma_mock.llmcall.create_many.call_args.kwargs["data"]
+    assert [(row["step"], row["user_id"]) for row in rows] == [("feedback", "job-user")]
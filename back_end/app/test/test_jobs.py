@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+
+from app.jobs import JobWorkerPool
+
+# ===========================
+# Fake Queue
+# ===========================
+
+class FakeQueue:
+    """
+    In-memory stand-in for JobQueue recording state transitions.
+    """
+    def __init__(self, jobs):
+        self.jobs = list(jobs)
+        self.completed = {}
+        self.failed = {}
+        self.heartbeats = []
+        self.sweeps = 0
+
+    async def claim(self):
+        if not self.jobs:
+            return None
+        job = self.jobs.pop(0)
+        job["attempts"] += 1
+        return job
+
+    async def complete(self, job_id, response_id):
+        self.completed[job_id] = response_id
+
+    async def fail(self, job, error):
+        self.failed[job["job_id"]] = error
+
+    async def heartbeat(self, job):
+        self.heartbeats.append(job["job_id"])
+
+    async def expire_abandoned(self):
+        self.sweeps += 1
+        return 0
+
+# ===========================
+# Worker Pool
+# ===========================
+
+@pytest.mark.asyncio
+async def test_run_once_completes_and_fails_jobs():
+    """
+    Successful jobs are completed with their response id; errors are handed to fail().
+    """
+    async def handler(job):
+        if job["input"] == "boom":
+            raise RuntimeError("provider down")
+        return f"response-{job['job_id']}"
+
+    queue = FakeQueue([
+        {"job_id": "j1", "input": "ok", "attempts": 0, "max_attempts": 3},
+        {"job_id": "j2", "input": "boom", "attempts": 0, "max_attempts": 3},
+    ])
+    pool = JobWorkerPool(queue, handler, concurrency=1)
+
+    assert await pool.run_once() is True
+    assert await pool.run_once() is True
+    assert await pool.run_once() is False
+
+    assert queue.completed == {"j1": "response-j1"}
+    assert queue.failed == {"j2": "provider down"}
+
+@pytest.mark.asyncio
+async def test_running_jobs_heartbeat_their_lease():
+    async def handler(job):
+        await asyncio.sleep(0.05)
+        return "response"
+
+    queue = FakeQueue([{"job_id": "slow", "input": "ok", "attempts": 0, "max_attempts": 1}])
+    pool = JobWorkerPool(queue, handler, concurrency=1, heartbeat_interval=0.01)
+
+    assert await pool.run_once() is True
+    heartbeats = len(queue.heartbeats)
+    assert heartbeats >= 3 and set(queue.heartbeats) == {"slow"}
+
+    # The heartbeat stops with the job
+    await asyncio.sleep(0.03)
+    assert len(queue.heartbeats) == heartbeats
+
+@pytest.mark.asyncio
+async def test_pool_sweeps_abandoned_jobs():
+    queue = FakeQueue([])
+    pool = JobWorkerPool(queue, lambda job: None, concurrency=1, poll_interval=0.01, sweep_interval=0.01)
+
+    await pool.start()
+    await asyncio.sleep(0.05)
+    await pool.stop()
+    assert queue.sweeps >= 2
@@ -0,0 +1,93 @@
+import pytest
+from types import SimpleNamespace
+
+from app.llm import LLMRegistry, LLMRouter
+
+# ===========================
+# LLM Client Registry
+# ===========================
+
+@pytest.mark.asyncio
+async def test_registry_reuses_clients_per_configuration():
+    """
+    Same (model, temperature, settings) must return the same client,
+    and every client must share one pooled HTTP client.
+    """
+    registry = LLMRegistry(api_key="test-key")
+    await registry.start()
+
+    a = registry.get("gpt-test", temperature=0.0)
+    b = registry.get("gpt-test", temperature=0.0)
+    c = registry.get("gpt-test", temperature=0.5)
+
+    assert a is b
+    assert a is not c
+    assert a.http_async_client is c.http_async_client
+
+    await registry.close()
+    assert registry.get("gpt-test", temperature=0.0) is not a
+    await registry.close()
+
+def test_registry_points_clients_at_base_url():
+    registry = LLMRegistry(api_key="test-key", base_url="http://127.0.0.1:9999/v1")
+    assert registry.get("gpt-test").openai_api_base == "http://127.0.0.1:9999/v1"
+
+# ===========================
+# Model Routing
+# ===========================
+
+def _router(**routes) -> LLMRouter:
+    return LLMRouter(
+        profiles={
+            "default": {"model": "big"},
+            "fast": {"model": "small"},
+            "rewrite": {"model": "huge", "temperature": 0.2},
+        },
+        routes=routes,
+    )
+
+def test_router_prefers_the_most_specific_route():
+    router = _router(**{
+        "evaluation": "fast", "improvement": "rewrite", "*/Persona": "default", "evaluation/Recipe": "rewrite"
+    })
+
+    assert router.resolve("evaluation").model == "small"
+    assert router.resolve("evaluation", "Recipe").model == "huge"
+    assert router.resolve("evaluation", "Persona").model == "big"
+    assert router.resolve("improvement", "Recipe").temperature == 0.2
+    assert router.resolve("feedback", "Recipe").name == "default"
+
+def test_router_rejects_unknown_profiles_and_versions_its_table():
+    with pytest.raises(Exception):
+        _router(evaluation="missing")
+    assert _router(evaluation="fast").version != _router(evaluation="default").version
+
+@pytest.mark.asyncio
+async def test_generate_response_uses_the_routed_model(monkeypatch):
+    from app import generation_pipeline
+    from app.metrics import labelled
+
+    models = []
+
+    class FakeLLM:
+        def __init__(self, model):
+            self.model = model
+
+        async def ainvoke(self, messages):
+            models.append(self.model)
+            usage_metadata = {"input_tokens": 10, "output_tokens": 2}
+            return SimpleNamespace(content="yes", usage_metadata=usage_metadata, response_metadata={})
+
+    router = _router(evaluation="fast")
+    monkeypatch.setattr(generation_pipeline, "llm_router", router)
+    monkeypatch.setattr("app.llm.llm_registry.get", lambda model, **settings: FakeLLM(model))
+
+    with labelled(step="evaluation", pattern="Recipe"):
+        await generation_pipeline._generate_response("Decide", [])
+    with labelled(step="improvement", pattern="Recipe"):
+        await generation_pipeline._generate_response("Improve", [])
+
+    assert models == ["small", "big"]
+    observed = {(route["step"], route["model"]): route for route in router.stats()["observed"]}
+    assert observed[("evaluation", "small")]["calls"] == 1
+    assert observed[("improvement", "big")]["input_tokens"] == 10
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+
+from app.metrics import MetricsRegistry, current_labels, labelled
+
+# ===========================
+# Metric Types
+# ===========================
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ("step",), buckets=(0.1, 1))
+    histogram.observe(0.05, step="a")
+    histogram.observe(0.5, step="a")
+    histogram.observe(5, step="a")
+
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{step="a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{step="a",le="1"} 2' in text
+    assert 'latency_seconds_bucket{step="a",le="+Inf"} 3' in text
+    assert 'latency_seconds_sum{step="a"} 5.55' in text
+    assert histogram.count(step="a") == 3
+
+def test_counter_and_callback_gauge():
+    registry = MetricsRegistry()
+    counter = registry.counter("calls_total", "Calls.", ("status",))
+    counter.inc(status="ok")
+    counter.inc(2, status="ok")
+    registry.gauge("depth", "Depth.", lambda: 7)
+
+    text = registry.render()
+    assert 'calls_total{status="ok"} 3' in text
+    assert "depth 7" in text
+    assert counter.value(status="error") == 0
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("c_total", "C.", ("name",)).inc(name='a"b')
+    assert 'c_total{name="a\\"b"} 1' in registry.render()
+
+def test_duplicate_metric_names_are_rejected():
+    registry = MetricsRegistry()
+    registry.counter("c_total", "C.")
+    with pytest.raises(Exception):
+        registry.counter("c_total", "C.")
+
+# ===========================
+# Context Labels
+# ===========================
+
+@pytest.mark.asyncio
+async def test_labels_nest_and_reach_spawned_tasks():
+    async def child():
+        return current_labels("category", "pattern", "step")
+
+    with labelled(category="c"):
+        with labelled(pattern="p"):
+            labels = await asyncio.create_task(child())
+        assert current_labels("pattern") == {"pattern": ""}
+
+    assert labels == {"category": "c", "pattern": "p", "step": ""}
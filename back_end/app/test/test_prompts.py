@@ -0,0 +1,77 @@
+import pytest
+
+from app.config import CATEGORY_TO_PATTERNS, FUSED_PATTERN_PROMPT, PATTERN_TO_CONTEXT, TEMPLATE_PROMPT, TRIAGE_PROMPT
+from app.prompts import PromptRegistry, build_registry, compile_prompt, prompt_registry
+
+# ===========================
+# Compiling
+# ===========================
+
+def test_compiled_prompt_matches_str_format():
+    category = next(iter(CATEGORY_TO_PATTERNS))
+    pattern = CATEGORY_TO_PATTERNS[category][0]
+    static = {"category": category, "pattern": pattern, "context": PATTERN_TO_CONTEXT[pattern]}
+
+    for template, name in ((TEMPLATE_PROMPT, "pattern"), (FUSED_PATTERN_PROMPT, "fused")):
+        compiled = prompt_registry.get(f"{name}/{pattern}")
+        assert compiled.variables == ["prompt"]
+        assert compiled.format(prompt="Write a poem") == template.format(prompt="Write a poem", **static)
+
+def test_static_values_and_variables_may_contain_braces():
+    compiled = compile_prompt("t", "Context: {context}\n\nPrompt: {prompt}", context="use {json} here")
+    assert compiled.format(prompt="{not a field}") == "Context: use {json} here\n\nPrompt: {not a field}"
+
+def test_missing_variables_are_rejected():
+    with pytest.raises(Exception):
+        prompt_registry.get("manual").format(prompt="only the prompt")
+
+# ===========================
+# Cache-friendly Prefixes
+# ===========================
+
+def test_user_input_comes_after_the_static_prefix():
+    """
+    Every per-pattern and triage prompt starts with all of its static text, so calls
+    for different inputs share the whole prefix.
+    """
+    patterns = [pattern for patterns in CATEGORY_TO_PATTERNS.values() for pattern in patterns]
+    for name in [f"{kind}/{pattern}" for pattern in patterns for kind in ("pattern", "fused")] + ["triage"]:
+        compiled = prompt_registry.get(name)
+        first = compiled.format(prompt="first input")
+        second = compiled.format(prompt="a different input")
+        assert compiled.prefix and first.startswith(compiled.prefix) and second.startswith(compiled.prefix)
+        assert compiled.parts[0][0] is False and [is_variable for is_variable, _ in compiled.parts].count(True) == 1
+        assert compiled.prefix_tokens <= compiled.static_tokens
+
+    triage = prompt_registry.get("triage")
+    patterns = triage.prefix.split("Patterns:\n")[1].split("\n\nFor every")[0]
+    assert triage.format(prompt="x") == TRIAGE_PROMPT.format(prompt="x", patterns=patterns)
+
+def test_stats_report_prefixes_and_version():
+    stats = prompt_registry.stats()
+    names = {prompt["name"] for prompt in stats["prompts"]}
+    assert {"triage", "merge", "manual", "evaluation", "improvement"} <= names
+    assert stats["version"] == prompt_registry.version
+    for prompt in stats["prompts"]:
+        assert prompt["cacheable"] == (prompt["prefix_tokens"] >= stats["cache_min_tokens"])
+
+# ===========================
+# Registry and Versions
+# ===========================
+
+def test_duplicate_and_unknown_prompts_are_rejected():
+    registry = PromptRegistry()
+    registry.register(compile_prompt("a", "{prompt}"))
+    with pytest.raises(Exception):
+        registry.register(compile_prompt("a", "{prompt}"))
+    with pytest.raises(Exception):
+        registry.get("b")
+
+def test_versions_only_change_with_the_prompts_they_cover(monkeypatch):
+    edited, untouched = [pattern for patterns in CATEGORY_TO_PATTERNS.values() for pattern in patterns][:2]
+    monkeypatch.setitem(PATTERN_TO_CONTEXT, edited, PATTERN_TO_CONTEXT[edited] + " Edited.")
+    rebuilt = build_registry()
+
+    assert rebuilt.version != prompt_registry.version
+    assert rebuilt.pattern(edited).hash != prompt_registry.pattern(edited).hash
+    assert rebuilt.version_of(f"pattern/{untouched}") == prompt_registry.version_of(f"pattern/{untouched}")
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+from app.rate_limit import LLMScheduler, SchedulerQueueFull, TokenBucket
+
+# ===========================
+# Token Bucket
+# ===========================
+
+def test_token_bucket_delay_and_refund():
+    bucket = TokenBucket(per_minute=60)  # 1 unit per second
+    assert bucket.delay(10) == 0
+
+    bucket.consume(60)
+    assert bucket.delay(1) == pytest.approx(1, abs=0.05)
+
+    bucket.refund(30)
+    assert bucket.delay(30) == 0
+
+def test_token_bucket_adopts_provider_limits():
+    bucket = TokenBucket(per_minute=1000)
+    bucket.set_limit(100, remaining=5)
+    assert bucket.capacity == 100
+    assert bucket.available <= 5
+
+# ===========================
+# Scheduler
+# ===========================
+
+@pytest.mark.asyncio
+async def test_scheduler_bounds_in_flight_calls():
+    """
+    No more than max_in_flight calls may run at once.
+    """
+    scheduler = LLMScheduler(rpm=10000, tpm=10**9, max_in_flight=2, max_queue=100)
+    running, peak = 0, 0
+
+    async def call():
+        nonlocal running, peak
+        async with scheduler.slot(10):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*[call() for _ in range(6)])
+
+    assert peak == 2
+    assert scheduler.stats()["calls"] == 6
+    assert scheduler.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_scheduler_rejects_when_queue_is_full():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with scheduler.slot(1):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(SchedulerQueueFull):
+        async with scheduler.slot(1):
+            pass
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert scheduler.stats()["rejected"] == 1
+
+@pytest.mark.asyncio
+async def test_scheduler_observes_usage_and_headers():
+    scheduler = LLMScheduler(rpm=1000, tpm=100000)
+    response = SimpleNamespace(
+        usage_metadata={"total_tokens": 20},
+        response_metadata={"headers": {
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "499",
+            "x-ratelimit-limit-tokens": "30000",
+            "x-ratelimit-remaining-tokens": "29000",
+        }},
+    )
+
+    async with scheduler.slot(100) as reservation:
+        scheduler.observe(reservation, response)
+
+    assert scheduler.requests.capacity == 500
+    assert scheduler.tokens.capacity == 30000
+    assert scheduler.tokens.available <= 29000
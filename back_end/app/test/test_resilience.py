@@ -0,0 +1,225 @@
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from app.metrics import LLM_RESILIENCE_EVENTS
+from app.resilience import (
+    CircuitBreaker,
+    CircuitOpen,
+    LLMResilience,
+    backoff_delay,
+    is_retryable,
+)
+
+# ===========================
+# Helpers
+# ===========================
+
+class ProviderError(Exception):
+    """Stand-in for an openai.APIStatusError."""
+
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def _policy(**kwargs) -> LLMResilience:
+    return LLMResilience(**{"deadline": 1.0, "step_deadlines": {}, "max_retries": 2, "hedge": False, **kwargs})
+
+
+@pytest.fixture(autouse=True)
+def instant_backoff(monkeypatch):
+    """Record backoff sleeps instead of waiting for them."""
+    slept = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args, **kwargs):
+        if delay >= 0.05:
+            slept.append(delay)
+            delay = 0
+        return await real_sleep(delay, *args, **kwargs)
+
+    monkeypatch.setattr("app.resilience.asyncio.sleep", fake_sleep)
+    return slept
+
+# ===========================
+# Retries and Deadlines
+# ===========================
+
+def test_retryable_errors_and_retry_after():
+    assert is_retryable(ProviderError(429)) and is_retryable(ProviderError(503))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(ProviderError(400)) and not is_retryable(ValueError())
+
+    assert backoff_delay(0, ProviderError(429, {"retry-after": "7"})) == 7
+    assert backoff_delay(0, ProviderError(429, {"retry-after-ms": "250"})) == 0.25
+    assert 0 <= backoff_delay(3, ProviderError(500), base=0.5, cap=2) <= 2
+
+@pytest.mark.asyncio
+async def test_retries_honor_retry_after(instant_backoff):
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ProviderError(429, {"retry-after": "2"})
+        return "ok"
+
+    before = LLM_RESILIENCE_EVENTS.value(step="feedback", event="retry")
+    assert await _policy().call("feedback", attempt) == "ok"
+    assert len(attempts) == 3
+    assert instant_backoff == [2.0, 2.0]
+    assert LLM_RESILIENCE_EVENTS.value(step="feedback", event="retry") == before + 2
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_fail_immediately():
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        raise ProviderError(400)
+
+    with pytest.raises(ProviderError):
+        await _policy().call("feedback", attempt)
+    assert len(attempts) == 1
+
+@pytest.mark.asyncio
+async def test_step_deadline_times_out_and_exhausts_retries():
+    async def attempt():
+        await asyncio.Event().wait()
+
+    policy = _policy(step_deadlines={"triage": 0.01}, max_retries=1)
+    before = LLM_RESILIENCE_EVENTS.value(step="triage", event="timeout")
+    with pytest.raises(asyncio.TimeoutError):
+        await policy.call("triage", attempt)
+    assert LLM_RESILIENCE_EVENTS.value(step="triage", event="timeout") == before + 2
+    assert LLM_RESILIENCE_EVENTS.value(step="triage", event="exhausted") >= 1
+
+@pytest.mark.asyncio
+async def test_queueing_for_a_slot_does_not_count_toward_the_deadline():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    policy = _policy(deadline=0.045, max_retries=0, breaker=breaker)
+    capacity = asyncio.Semaphore(2)
+
+    @asynccontextmanager
+    async def slot():
+        async with capacity:
+            yield "reservation"
+
+    async def attempt(reservation):
+        await asyncio.sleep(0.03)
+        return reservation
+
+    # Most calls wait longer than the deadline for a slot, none of them time out
+    results = await asyncio.gather(*[policy.call("queued", attempt, slot=slot) for _ in range(12)])
+    assert results == ["reservation"] * 12
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert max(policy._latencies["queued"]) < 0.045
+
+# ===========================
+# Hedging
+# ===========================
+
+@pytest.mark.asyncio
+async def test_hedge_fires_after_latency_quantile_and_first_result_wins():
+    policy = _policy(hedge=True, hedge_min_samples=3, hedge_min_delay=0.0)
+    for _ in range(3):
+        await policy.call("merge", lambda: asyncio.sleep(0.01, result="warm"))
+    assert policy.hedge_delay("merge") >= 0.01
+
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        number = len(attempts)
+        if number == 1:
+            await asyncio.Event().wait()  # The first attempt straggles until cancelled
+        return f"attempt {number}"
+
+    before = LLM_RESILIENCE_EVENTS.value(step="merge", event="hedge_won")
+    assert await policy.call("merge", attempt) == "attempt 2"
+    assert len(attempts) == 2
+    assert LLM_RESILIENCE_EVENTS.value(step="merge", event="hedge_won") == before + 1
+
+@pytest.mark.asyncio
+async def test_hedge_takes_its_own_slot():
+    policy = _policy(hedge=True, hedge_min_samples=3, hedge_min_delay=0.0)
+    reservations = []
+
+    @asynccontextmanager
+    async def slot():
+        reservations.append(f"reservation {len(reservations) + 1}")
+        yield reservations[-1]
+
+    async def warm(reservation):
+        return await asyncio.sleep(0.01, result=reservation)
+
+    for _ in range(3):
+        await policy.call("rewrite", warm, slot=slot)
+
+    async def attempt(reservation):
+        if reservation == "reservation 4":
+            await asyncio.Event().wait()  # The primary straggles until cancelled
+        return reservation
+
+    before = LLM_RESILIENCE_EVENTS.value(step="rewrite", event="hedge_won")
+    assert await policy.call("rewrite", attempt, slot=slot) == "reservation 5"
+    assert len(reservations) == 5
+    assert LLM_RESILIENCE_EVENTS.value(step="rewrite", event="hedge_won") == before + 1
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_enough_samples():
+    policy = _policy(hedge=True, hedge_min_samples=100)
+    assert policy.hedge_delay("merge") is None
+
+# ===========================
+# Circuit Breaker
+# ===========================
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    policy = _policy(max_retries=0, breaker=breaker)
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        raise ProviderError(503)
+
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            await policy.call("feedback", failing)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpen):
+        await policy.call("feedback", failing)
+    assert len(attempts) == 2
+
+def test_circuit_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    breaker.before_call()  # Cooldown over: this call is the probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()  # Only one probe at a time
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+@pytest.mark.asyncio
+async def test_rate_limits_do_not_open_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+
+    async def limited():
+        raise ProviderError(429)
+
+    with pytest.raises(ProviderError):
+        await _policy(max_retries=1, breaker=breaker).call("feedback", limited)
+    assert breaker.state == CircuitBreaker.CLOSED
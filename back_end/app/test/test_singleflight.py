@@ -0,0 +1,198 @@
+import asyncio
+import pytest
+
+from app.singleflight import PostgresFlightLock, SingleFlight
+
+# ===========================
+# Coalescing
+# ===========================
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    started = []
+
+    async def work():
+        started.append(1)
+        await asyncio.sleep(0.01)
+        return {"output": "done"}
+
+    first, second = await asyncio.gather(flights.do("k", work), flights.do("k", work))
+
+    assert len(started) == 1
+    assert first == second == {"output": "done"}
+    assert first is not second  # Every caller gets its own copy
+    assert (flights.leaders, flights.coalesced, flights.in_flight) == (1, 1, 0)
+
+@pytest.mark.asyncio
+async def test_different_keys_and_sequential_calls_run_separately():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return 1
+
+    await asyncio.gather(flights.do("a", work), flights.do("b", work))
+    await flights.do("a", work)
+    assert len(calls) == 3
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter():
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(flights.do("k", failing), flights.do("k", failing), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+# ===========================
+# Cancellation
+# ===========================
+
+@pytest.mark.asyncio
+async def test_work_survives_until_last_waiter_leaves():
+    flights = SingleFlight()
+    finished = asyncio.Event()
+    cancelled = []
+
+    async def work():
+        try:
+            await finished.wait()
+            return "done"
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    first = asyncio.ensure_future(flights.do("k", work))
+    second = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+
+    # One waiter leaves: the other still gets the result
+    first.cancel()
+    await asyncio.sleep(0)
+    assert not cancelled
+    finished.set()
+    assert await second == "done"
+
+    # Every waiter leaves: the work is cancelled
+    finished.clear()
+    only = asyncio.ensure_future(flights.do("k2", work))
+    await asyncio.sleep(0)
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    await asyncio.sleep(0)
+    assert cancelled == [1]
+    assert flights.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_disabled_single_flight_runs_every_call():
+    flights = SingleFlight(enabled=False)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0)
+
+    await asyncio.gather(flights.do("k", work), flights.do("k", work))
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_shared_calls_are_billed_once():
+    from app.usage import LlmCallRecord, current_ledger, tracking
+
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        current_ledger.get().calls.append(LlmCallRecord("feedback", None, None, "m", 10, 5))
+        return "done"
+
+    async def request():
+        with tracking("user") as usage:
+            await flights.do("k", work)
+        return usage
+
+    first, second = await asyncio.gather(request(), request())
+    assert [(call.input_tokens, call.coalesced) for call in first.calls] == [(10, False)]
+    assert [(call.input_tokens, call.coalesced) for call in second.calls] == [(0, True)]
+    assert (first.summary()["llm_calls"], second.summary()["llm_calls"]) == (1, 0)
+    assert second.rows()[0]["coalesced"] is True
+
+def test_distributed_backend_requires_the_shared_result_cache():
+    from app.singleflight import _create_single_flight
+
+    with pytest.raises(Exception, match="RESULT_CACHE_BACKEND=postgres"):
+        _create_single_flight("postgres", "memory")
+    assert isinstance(_create_single_flight("postgres", "postgres").lock, PostgresFlightLock)
+    assert _create_single_flight("memory", "memory").lock is None
+
+# ===========================
+# Cross-process Lock
+# ===========================
+
+class LeaseClient:
+    """Stand-in for the `FlightLease` table of a Prisma client."""
+
+    def __init__(self, held_by_other: int = 0, fail: bool = False):
+        self.held_by_other = held_by_other
+        self.fail = fail
+        self.acquires = 0
+        self.released = []
+
+    async def query_raw(self, sql, key, holder, timeout):
+        if self.fail:
+            raise Exception("db down")
+        self.acquires += 1
+        if self.acquires <= self.held_by_other:
+            return []
+        return [{"key": key}]
+
+    async def execute_raw(self, sql, key, holder):
+        self.released.append(key)
+        return 1
+
+@pytest.mark.asyncio
+async def test_distributed_work_waits_for_the_lease_and_releases_it():
+    client = LeaseClient(held_by_other=2)
+    flights = SingleFlight(PostgresFlightLock(client, poll_seconds=0))
+
+    async def work():
+        assert client.acquires == 3  # Runs only once the lease is taken
+        return "done"
+
+    assert await flights.do("ab" * 32, work, distributed=True) == "done"
+    assert client.released == ["ab" * 32]
+
+    # Local-only work does not touch the database
+    await flights.do("cd" * 32, work)
+    assert client.acquires == 3
+
+@pytest.mark.asyncio
+async def test_lease_failure_or_timeout_runs_work_unlocked():
+    async def work():
+        return "done"
+
+    assert await PostgresFlightLock(LeaseClient(fail=True)).run("ff" * 32, work) == "done"
+
+    held = LeaseClient(held_by_other=10**6)
+    assert await PostgresFlightLock(held, timeout=0.02, poll_seconds=0.005).run("ff" * 32, work) == "done"
+    assert held.released == []
+
+@pytest.mark.asyncio
+async def test_work_errors_under_lease_are_not_retried_and_release_it():
+    calls = []
+    client = LeaseClient()
+    lock = PostgresFlightLock(client)
+
+    async def failing():
+        calls.append(1)
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await lock.run("ff" * 32, failing)
+    assert len(calls) == 1
+    assert client.released == ["ff" * 32]
@@ -0,0 +1,146 @@
+import time
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+from app.cache import MemoryCacheBackend, result_cache
+from app.config import CATEGORY_TO_PATTERNS
+from app.metrics import current_labels
+from app.speculation import SpeculationPolicy
+from app.usage import record_call, tracking
+
+CATEGORY = next(iter(CATEGORY_TO_PATTERNS))
+PATTERN = CATEGORY_TO_PATTERNS[CATEGORY][0]
+
+# ===========================
+# Policy
+# ===========================
+
+def test_adaptive_policy_needs_history_and_a_high_apply_rate():
+    policy = SpeculationPolicy("adaptive", min_apply_rate=0.6, min_samples=5, window=10)
+    assert not policy.should_speculate("often")
+
+    for applied in [True, True, True, False, True]:
+        policy.observe("often", applied)
+        policy.observe("rarely", not applied)
+
+    assert policy.apply_rate("often") == 0.8
+    assert policy.should_speculate("often")
+    assert not policy.should_speculate("rarely")
+
+    # Only the recent window counts
+    for _ in range(10):
+        policy.observe("often", False)
+    assert not policy.should_speculate("often")
+
+def test_fixed_policies_and_unknown_modes():
+    assert SpeculationPolicy("always").should_speculate("anything")
+    assert not SpeculationPolicy("off").should_speculate("anything")
+    with pytest.raises(Exception):
+        SpeculationPolicy("sometimes")
+
+def test_no_speculation_under_load():
+    policy = SpeculationPolicy("always", max_load=0.5)
+    assert policy.should_speculate("anything", load=0.2)
+    assert not policy.should_speculate("anything", load=0.5)
+
+# ===========================
+# Speculative Pattern Chain
+# ===========================
+
+def _llm(verdict: str, delays: dict, log: list):
+    """Sequential chain stand-in with per-step delays that logs step starts, ends and cancellations."""
+
+    async def generate_response(query, history=None):
+        step = current_labels("step")["step"]
+        log.append(("start", step))
+        try:
+            await asyncio.sleep(delays.get(step, 0))
+        except asyncio.CancelledError:
+            log.append(("cancelled", step))
+            raise
+        record_call("m", [], SimpleNamespace(content=step, usage_metadata={"input_tokens": 10, "output_tokens": 5}))
+        log.append(("end", step))
+        return {"feedback": "feedback", "evaluation": verdict, "improvement": "<PROMPT>improved</PROMPT>"}[step]
+
+    return generate_response
+
+@pytest.fixture
+def speculating(monkeypatch):
+    from app import generation_pipeline
+
+    policy = SpeculationPolicy("always")
+    monkeypatch.setattr(generation_pipeline, "speculation_policy", policy)
+    monkeypatch.setattr(result_cache, "backend", MemoryCacheBackend())
+    return policy
+
+@pytest.mark.asyncio
+async def test_speculation_overlaps_improvement_with_evaluation(monkeypatch, speculating):
+    from app.generation_pipeline import _apply_pattern
+    from app.metrics import PIPELINE_SPECULATIONS
+
+    log = []
+    llm = _llm("Yes", {"evaluation": 0.1, "improvement": 0.1}, log)
+    monkeypatch.setattr("app.generation_pipeline._generate_response", llm)
+    before = PIPELINE_SPECULATIONS.value(pattern=PATTERN, outcome="used")
+
+    start = time.perf_counter()
+    with tracking("user") as usage:
+        result = await _apply_pattern("input", CATEGORY, PATTERN, fused=False)
+    elapsed = time.perf_counter() - start
+
+    assert result == {
+        "input": "input", "pattern": PATTERN, "applied": True, "feedback": "feedback", "output": "improved"
+    }
+    assert log.index(("start", "improvement")) < log.index(("end", "evaluation"))
+    assert elapsed < 0.18
+    assert sorted(call.step for call in usage.calls) == ["evaluation", "feedback", "improvement"]
+    assert PIPELINE_SPECULATIONS.value(pattern=PATTERN, outcome="used") == before + 1
+    assert speculating.stats()["patterns"][PATTERN]["saved_seconds"] > 0.05
+
+@pytest.mark.asyncio
+async def test_no_verdict_cancels_the_speculative_improvement(monkeypatch, speculating):
+    from app.generation_pipeline import _apply_pattern
+
+    log = []
+    llm = _llm("No", {"evaluation": 0.01, "improvement": 1}, log)
+    monkeypatch.setattr("app.generation_pipeline._generate_response", llm)
+
+    with tracking("user") as usage:
+        result = await _apply_pattern("input", CATEGORY, PATTERN, fused=False)
+
+    assert result == {"input": "input", "pattern": PATTERN, "applied": False, "feedback": "feedback", "output": "input"}
+    assert ("cancelled", "improvement") in log
+    assert [call.step for call in usage.calls] == ["feedback", "evaluation"]
+    stats = speculating.stats()["patterns"][PATTERN]
+    assert stats["discarded"] == 1 and stats["wasted_tokens"] > 0 and stats["apply_rate"] == 0.0
+
+@pytest.mark.asyncio
+async def test_finished_discarded_improvement_counts_its_tokens(monkeypatch, speculating):
+    from app.generation_pipeline import _apply_pattern
+
+    log = []
+    monkeypatch.setattr("app.generation_pipeline._generate_response", _llm("No", {"evaluation": 0.05}, log))
+
+    with tracking("user") as usage:
+        await _apply_pattern("input", CATEGORY, PATTERN, fused=False)
+
+    # The discarded call is still billed to the request
+    assert sorted(call.step for call in usage.calls) == ["evaluation", "feedback", "improvement"]
+    assert speculating.stats()["patterns"][PATTERN]["wasted_tokens"] == 15
+
+@pytest.mark.asyncio
+async def test_outputs_match_the_sequential_chain(monkeypatch, speculating):
+    from app import generation_pipeline
+    from app.generation_pipeline import _apply_pattern
+
+    for verdict in ("Yes", "No"):
+        monkeypatch.setattr("app.generation_pipeline._generate_response", _llm(verdict, {}, []))
+        speculative = await _apply_pattern(f"in {verdict}", CATEGORY, PATTERN, fused=False)
+
+        monkeypatch.setattr(generation_pipeline, "speculation_policy", SpeculationPolicy("off"))
+        monkeypatch.setattr(result_cache, "backend", MemoryCacheBackend())
+        sequential = await _apply_pattern(f"in {verdict}", CATEGORY, PATTERN, fused=False)
+        monkeypatch.setattr(generation_pipeline, "speculation_policy", speculating)
+
+        assert speculative == sequential
@@ -0,0 +1,127 @@
+import re
+import random
+import asyncio
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from app.cache import MemoryCacheBackend, result_cache
+from app.rate_limit import LLMScheduler
+from app.streaming import TagExtractor
+from app.usage import tracking
+
+# ===========================
+# Tag Extractor
+# ===========================
+
+def _feed(extractor: TagExtractor, text: str, cuts) -> list:
+    pieces, previous = [], 0
+    for cut in list(cuts) + [len(text)]:
+        pieces.append(extractor.feed(text[previous:cut]))
+        previous = cut
+    return pieces
+
+def test_extractor_forwards_only_the_tagged_text():
+    response = "<FEEDBACK>ignore me</FEEDBACK>\n<PROMPT>\n  Write a poem.\n</PROMPT> trailing"
+    extractor = TagExtractor("PROMPT")
+    pieces = _feed(extractor, response, range(1, len(response)))
+
+    assert "".join(pieces) == "Write a poem."
+    assert extractor.done and extractor.raw == response
+    assert not any("<" in piece or "FEEDBACK" in piece for piece in pieces)
+
+def test_extractor_matches_regex_extraction_for_any_chunking():
+    rng = random.Random(7)
+    for _ in range(500):
+        pieces = ["a", " ", "\n", "<", "/", "<PROM", "</PROMP", "P>"]
+        body = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+        body = body.replace("</PROMPT>", "")
+        response = rng.choice(["", "<PRO", "noise "]) + "<PROMPT>" + body + "</PROMPT>" + rng.choice(["", " </PROMPT>"])
+        cuts = sorted(rng.sample(range(len(response) + 1), min(len(response) + 1, rng.randint(0, 6))))
+
+        expected = re.search(r"<PROMPT>(.*?)</PROMPT>", response, re.DOTALL).group(1).strip()
+        assert "".join(_feed(TagExtractor("PROMPT"), response, cuts)) == expected
+
+def test_extractor_holds_back_possible_tags_and_whitespace():
+    extractor = TagExtractor("PROMPT")
+    assert extractor.feed("<PRO") == ""
+    assert extractor.feed("MPT>Hello ") == "Hello"
+    assert extractor.feed("world </PRO") == " world"
+    assert extractor.feed("MPT>") == ""
+    assert extractor.done
+
+# ===========================
+# Streamed LLM Calls
+# ===========================
+
+class StreamingLLM:
+    """Chat model stand-in streaming a fixed completion in small chunks."""
+
+    def __init__(self, completion: str, size: int = 3, delay: float = 0.0):
+        self.completion = completion
+        self.size = size
+        self.delay = delay
+        self.streams = 0
+        self.closed = 0
+
+    async def astream(self, messages):
+        self.streams += 1
+        try:
+            for start in range(0, len(self.completion), self.size):
+                await asyncio.sleep(self.delay)
+                yield AIMessageChunk(content=self.completion[start:start + self.size])
+            usage_metadata = {"input_tokens": 11, "output_tokens": 7, "total_tokens": 18}
+            yield AIMessageChunk(content="", usage_metadata=usage_metadata)
+        finally:
+            self.closed += 1
+
+@pytest.fixture
+def streaming_llm(monkeypatch):
+    from app import generation_pipeline
+
+    llm = StreamingLLM("<FEEDBACK>f</FEEDBACK><PROMPT> merged prompt </PROMPT>")
+    monkeypatch.setattr("app.llm.llm_registry.get", lambda model, **settings: llm)
+    monkeypatch.setattr(generation_pipeline, "llm_scheduler", LLMScheduler(rpm=10**9, tpm=10**12, max_in_flight=10))
+    monkeypatch.setattr(result_cache, "backend", MemoryCacheBackend())
+    return llm
+
+@pytest.mark.asyncio
+async def test_merge_streams_tokens_and_caches_the_result(streaming_llm):
+    from app.generation_pipeline import iter_merge_prompts, merge_prompts
+
+    with tracking("user") as usage:
+        events = [event async for event in iter_merge_prompts(["a", "b"])]
+
+    tokens = [event["data"]["text"] for event in events if event["event"] == "token"]
+    assert len(tokens) > 1 and "".join(tokens) == "merged prompt"
+    assert events[-1] == {"event": "result", "data": {"output": "merged prompt"}}
+    assert [(call.step, call.input_tokens, call.output_tokens) for call in usage.calls] == [("merge", 11, 7)]
+    assert streaming_llm.closed == 1
+
+    # The streamed merge is cached like the blocking one
+    assert await merge_prompts(["a", "b"]) == "merged prompt"
+    cached = [event async for event in iter_merge_prompts(["a", "b"])]
+    assert cached == [
+        {"event": "token", "data": {"text": "merged prompt"}},
+        {"event": "result", "data": {"output": "merged prompt"}},
+    ]
+    assert streaming_llm.streams == 1
+
+@pytest.mark.asyncio
+async def test_manual_improvement_streams_tokens(streaming_llm):
+    from app.generation_pipeline import iter_manually_improve_prompt
+
+    events = [event async for event in iter_manually_improve_prompt("shorter", "a long prompt")]
+    assert "".join(e["data"]["text"] for e in events if e["event"] == "token") == "merged prompt"
+    assert events[-1]["data"]["output"] == "merged prompt"
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_closes_the_llm_stream(streaming_llm):
+    from app.generation_pipeline import iter_merge_prompts
+
+    streaming_llm.delay = 0.01
+    events = iter_merge_prompts(["c", "d"])
+    first = await events.__anext__()
+    await events.aclose()
+
+    assert first["event"] == "token"
+    assert streaming_llm.closed == 1
@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from app.metrics import LLM_PROMPT_CACHE_TOKENS, labelled
+from app.usage import BudgetExceeded, UsageStore, call_cost, record_call, tracking
+
+# ===========================
+# Call Accounting
+# ===========================
+
+def test_record_call_prefers_provider_usage():
+    response = SimpleNamespace(content="out", usage_metadata={"input_tokens": 120, "output_tokens": 30})
+    with tracking("u1") as usage:
+        with labelled(step="feedback", category="C", pattern="P"):
+            record_call("gpt-4.1-mini", [], response)
+
+    assert usage.summary()["llm_calls"] == 1
+    assert usage.input_tokens == 120 and usage.output_tokens == 30
+    assert usage.rows()[0]["step"] == "feedback"
+    assert usage.rows()[0]["pattern"] == "P"
+    assert usage.cost_usd == pytest.approx(call_cost("gpt-4.1-mini", 120, 30))
+
+def test_record_call_counts_prompt_cache_hits():
+    response = SimpleNamespace(content="out", usage_metadata={
+        "input_tokens": 2000, "output_tokens": 30, "input_token_details": {"cache_read": 1536},
+    })
+    hits, misses = (LLM_PROMPT_CACHE_TOKENS.value(step="fused", result=result) for result in ("hit", "miss"))
+    with tracking() as usage:
+        with labelled(step="fused"):
+            record_call("gpt-4.1-mini", [], response)
+
+    assert usage.cached_input_tokens == 1536
+    assert usage.rows()[0]["cached_input_tokens"] == 1536
+    assert LLM_PROMPT_CACHE_TOKENS.value(step="fused", result="hit") == hits + 1536
+    assert LLM_PROMPT_CACHE_TOKENS.value(step="fused", result="miss") == misses + 464
+
+def test_record_call_counts_tokens_without_provider_usage():
+    """
+    Missing usage metadata falls back to counting the messages and the completion locally.
+    """
+    from langchain.schema import HumanMessage
+
+    response = SimpleNamespace(content="a fairly short completion", usage_metadata=None)
+    with tracking() as usage:
+        record_call("gpt-4.1-mini", [HumanMessage(content="hello there")], response)
+
+    assert usage.input_tokens > 0
+    assert usage.output_tokens > 0
+    assert usage.calls[0].step == "unknown"
+
+@pytest.mark.asyncio
+async def test_tracking_collects_calls_from_spawned_tasks():
+    response = SimpleNamespace(content="x", usage_metadata={"input_tokens": 1, "output_tokens": 1})
+
+    async def call():
+        record_call("gpt-4.1-mini", [], response)
+
+    with tracking() as usage:
+        await asyncio.gather(call(), call(), call())
+    record_call("gpt-4.1-mini", [], response)  # Outside of any request
+
+    assert len(usage.calls) == 3
+    assert usage.increments()["llm_calls"] == {"increment": 3}
+
+def test_unknown_model_costs_nothing():
+    assert call_cost("some-local-model", 1000, 1000) == 0.0
+
+# ===========================
+# Daily Budgets
+# ===========================
+
+@pytest.mark.asyncio
+async def test_budget_uses_user_override_then_default():
+    client = SimpleNamespace(query_raw=AsyncMock(return_value=[{"budget": None, "used": 500}]))
+    store = UsageStore(client, default_budget=0)
+    await store.check_budget("u1")  # No budget at all
+
+    store.default_budget = 400
+    with pytest.raises(BudgetExceeded):
+        await store.check_budget("u1")
+
+    client.query_raw.return_value = [{"budget": 1000, "used": 500}]
+    await store.check_budget("u1")  # Per-user budget wins over the default
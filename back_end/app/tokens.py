@@ -0,0 +1,87 @@
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Used when the model is unknown to tiktoken
+DEFAULT_ENCODING = "o200k_base"
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: Optional[str]):
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+    except KeyError:
+        return _get_encoding(None)
+    except Exception as e:
+        # Encodings are downloaded on first use; without network access fall back to an estimate
+        logger.warning(f"Could not load tiktoken encoding, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the tokens of a text for a model.
+
+    Args:
+        text (str): Text to count.
+        model (str, optional): Model name used to pick the encoding.
+
+    Returns:
+        int: Token count, or a ~4 characters per token estimate if no encoding is available.
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: list, model: Optional[str] = None) -> int:
+    """
+    Count the tokens of a chat message list, including the per-message framing overhead.
+
+    Args:
+        messages (list): Message objects with a `content` attribute, or plain strings.
+        model (str, optional): Model name used to pick the encoding.
+
+    Returns:
+        int: Token count.
+    """
+    total = 0
+    for message in messages:
+        content = message.content if hasattr(message, "content") else message
+        total += count_tokens(str(content), model) + 4
+    return total + 2
+
+
+def truncate_middle(
+    text: str,
+    max_tokens: int,
+    model: Optional[str] = None,
+    marker: str = "\n[... {count} tokens truncated ...]\n",
+) -> str:
+    """
+    Shorten a text to at most `max_tokens` by cutting out its middle.
+
+    The head and tail are kept (instructions usually sit at the start and the answer format
+    at the end), and the cut is replaced by `marker`, which counts towards the budget.
+
+    Returns:
+        str: The text itself if it already fits, otherwise the shortened text.
+    """
+    total = count_tokens(text, model)
+    if total <= max_tokens:
+        return text
+
+    encoding = _get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=()) if encoding is not None else None
+    keep = max(0, max_tokens - count_tokens(marker.format(count=total), model))
+    head, tail = keep - keep // 2, keep // 2
+    cut = marker.format(count=total - keep)
+    if tokens is None:
+        # ~4 characters per token without an encoding
+        return text[:head * 4] + cut + (text[-tail * 4:] if tail else "")
+    return encoding.decode(tokens[:head]) + cut + (encoding.decode(tokens[-tail:]) if tail else "")
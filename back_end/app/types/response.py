@@ -33,6 +33,7 @@ class ResponseCreate(BaseModel):
     Schema for creating a new response by submitting a user prompt.
     """
     input: str
+    fused: Optional[bool] = None  # Single-call pattern mode; None uses the server default
 
 
 class ResponseOutputUpdate(BaseModel):
@@ -49,6 +50,14 @@ class MergePreviewPrompts(BaseModel):
     previews: List[str]
 
 
+class ManualImprovement(BaseModel):
+    """
+    Schema for rewriting a response's prompt according to the user's feedback.
+    """
+    feedback: str
+    prompt: Optional[str] = None  # Prompt to rewrite; None uses the response's output
+
+
 # ========================
 # Pattern and Category Models
 # ========================
@@ -61,6 +70,9 @@ class PatternRead(BaseModel):
     pattern: str
     feedback: str
     applied: bool
+    output: Optional[str] = None
+    input_hash: Optional[str] = None
+    error: Optional[str] = None  # Set when the pattern failed and can be retried
 
 
 class PatternUpdate(BaseModel):
@@ -78,7 +90,7 @@ class CategoryRead(BaseModel):
     category_id: str
     category: str
     input: str
-    preview: str
+    preview: Optional[str] = None  # None until merged on demand, see get_category_preview
     patterns: List[PatternRead] = []
 
 
@@ -101,5 +113,50 @@ class ResponseRead(BaseModel):
     user_id: str
     input: str
     output: str
+    status: str = "complete"  # "partial" when some patterns failed; see the retry endpoint
     created_at: datetime
     categories: List[CategoryRead] = []
+    # Token usage of every LLM call made for this response, including later edits
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+
+
+# ========================
+# Response Listing
+# ========================
+
+class ResponseSummary(BaseModel):
+    """
+    Lightweight view of a response for listings; full details come from the response by id.
+    """
+    response_id: str
+    input: str
+    output: str
+    created_at: datetime
+
+
+class ResponsePage(BaseModel):
+    """
+    One page of response summaries with the cursor of the next page, if any.
+    """
+    items: List[ResponseSummary]
+    next_cursor: Optional[str] = None
+
+
+# ========================
+# Generation Job Models
+# ========================
+
+class JobRead(BaseModel):
+    """
+    Status of an asynchronous generation job.
+    """
+    job_id: str
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    response_id: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
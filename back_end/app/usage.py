@@ -0,0 +1,218 @@
+"""
+Token and cost accounting for LLM calls.
+
+Every call made inside `tracking()` is recorded in the request's `UsageLedger`
+(including calls from tasks spawned by the request). Ledgers are persisted to the
+`LlmCall` table and rolled up onto the response; per-user daily budgets are
+checked against that table before a generation starts.
+"""
+import os
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from app.metrics import LLM_PROMPT_CACHE_TOKENS, LLM_TOKENS, current_labels
+from app.tokens import count_message_tokens, count_tokens
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Tokens (input + output) a user may spend per UTC day; 0 disables the budget
+USER_DAILY_TOKEN_BUDGET = int(os.getenv("USER_DAILY_TOKEN_BUDGET", "0"))
+
+# USD per million (input, output) tokens; extend or override with LLM_PRICES='{"model": [in, out]}'
+MODEL_PRICES = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    **{model: tuple(price) for model, price in json.loads(os.getenv("LLM_PRICES", "{}")).items()},
+}
+
+DAILY_USAGE_SQL = """
+SELECT
+    u.daily_token_budget AS budget,
+    COALESCE((
+        SELECT SUM(c.input_tokens + c.output_tokens)
+        FROM "LlmCall" c
+        WHERE c.user_id = u.id AND c.created_at >= $2::timestamp
+    ), 0)::bigint AS used
+FROM "User" u
+WHERE u.id = $1
+"""
+
+
+class BudgetExceeded(Exception):
+    """Raised when a user has spent their daily token budget."""
+
+
+def call_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Price of a call in USD (0 for models without a known price)."""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+@dataclass
+class LlmCallRecord:
+    step: str
+    category: Optional[str]
+    pattern: Optional[str]
+    model: str
+    input_tokens: int
+    output_tokens: int
+    cached_input_tokens: int = 0
+    # Shared with another request that was billed for it; logged with zero tokens
+    coalesced: bool = False
+
+    def as_coalesced(self) -> "LlmCallRecord":
+        """Zero-cost copy of this call for a request that got its result from another request."""
+        return replace(self, input_tokens=0, output_tokens=0, cached_input_tokens=0, coalesced=True)
+
+
+@dataclass
+class UsageLedger:
+    """LLM calls made on behalf of one request."""
+
+    user_id: Optional[str] = None
+    calls: List[LlmCallRecord] = field(default_factory=list)
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(call.input_tokens for call in self.calls)
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(call.output_tokens for call in self.calls)
+
+    @property
+    def cached_input_tokens(self) -> int:
+        return sum(call.cached_input_tokens for call in self.calls)
+
+    @property
+    def cost_usd(self) -> float:
+        return sum(call_cost(call.model, call.input_tokens, call.output_tokens) for call in self.calls)
+
+    def summary(self) -> dict:
+        """Roll-up stored on the response."""
+        return {
+            "llm_calls": sum(not call.coalesced for call in self.calls),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": self.cost_usd,
+        }
+
+    def increments(self) -> dict:
+        """Prisma update data adding this ledger to a response's totals."""
+        return {key: {"increment": value} for key, value in self.summary().items()}
+
+    def rows(self, response_id: Optional[str] = None) -> List[dict]:
+        """Call log rows for the `LlmCall` table."""
+        rows = []
+        for call in self.calls:
+            row = {
+                "user_id": self.user_id,
+                "step": call.step,
+                "category": call.category,
+                "pattern": call.pattern,
+                "model": call.model,
+                "input_tokens": call.input_tokens,
+                "output_tokens": call.output_tokens,
+                "cached_input_tokens": call.cached_input_tokens,
+                "coalesced": call.coalesced,
+            }
+            if response_id is not None:
+                row["response_id"] = response_id
+            rows.append(row)
+        return rows
+
+
+# Ledger of the request currently being handled, if it is tracked
+current_ledger: ContextVar[Optional[UsageLedger]] = ContextVar("current_ledger", default=None)
+
+
+@contextmanager
+def tracking(user_id: Optional[str] = None):
+    """Record every LLM call made inside the block into a new ledger."""
+    ledger = UsageLedger(user_id)
+    token = current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        current_ledger.reset(token)
+
+
+def record_call(model: str, messages: list, response) -> LlmCallRecord:
+    """
+    Account for a finished call.
+
+    Token counts come from the provider's usage metadata, or are counted locally
+    when the provider did not report them. Input tokens read from the provider's
+    prompt cache are counted as cache hits, the rest as misses.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens")
+    if input_tokens is None:
+        input_tokens = count_message_tokens(messages, model)
+    output_tokens = usage.get("output_tokens")
+    if output_tokens is None:
+        output_tokens = count_tokens(response.content, model)
+    cached_input_tokens = (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+    labels = current_labels("step", "category", "pattern")
+    record = LlmCallRecord(
+        step=labels["step"] or "unknown",
+        category=labels["category"] or None,
+        pattern=labels["pattern"] or None,
+        model=model,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_input_tokens=cached_input_tokens,
+    )
+
+    LLM_TOKENS.inc(input_tokens, model=model, kind="input")
+    LLM_TOKENS.inc(output_tokens, model=model, kind="output")
+    LLM_PROMPT_CACHE_TOKENS.inc(cached_input_tokens, step=record.step, result="hit")
+    LLM_PROMPT_CACHE_TOKENS.inc(input_tokens - cached_input_tokens, step=record.step, result="miss")
+
+    ledger = current_ledger.get()
+    if ledger is not None:
+        ledger.calls.append(record)
+    return record
+
+
+class UsageStore:
+    """Per-user daily usage queries over the `LlmCall` table."""
+
+    def __init__(self, client=None, default_budget: int = USER_DAILY_TOKEN_BUDGET):
+        if client is None:
+            from app.client import prisma_client as client
+        self.client = client
+        self.default_budget = default_budget
+
+    async def daily_usage(self, user_id: str) -> dict:
+        """Tokens spent by the user since UTC midnight and their budget (None when unlimited)."""
+        midnight = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        rows = await self.client.query_raw(DAILY_USAGE_SQL, user_id, midnight.replace(tzinfo=None).isoformat())
+        row = rows[0] if rows else {}
+
+        budget = row.get("budget")
+        if budget is None:
+            budget = self.default_budget or None
+        return {"used": int(row.get("used") or 0), "budget": budget}
+
+    async def record_calls(self, usage: UsageLedger):
+        """Log the calls of a generation that produced no response (e.g. it failed or was cancelled)."""
+        if usage.calls:
+            await self.client.llmcall.create_many(data=usage.rows())
+
+    async def check_budget(self, user_id: str):
+        """Raise BudgetExceeded if the user has no budget left today."""
+        usage = await self.daily_usage(user_id)
+        if usage["budget"] is not None and usage["used"] >= usage["budget"]:
+            raise BudgetExceeded(f"Daily token budget of {usage['budget']} exhausted ({usage['used']} used)")
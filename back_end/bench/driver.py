@@ -0,0 +1,420 @@
+"""
+Load-test driver for the back end.
+
+Fires concurrent `create_response`, `update_category_patterns` and merge requests,
+with every LLM call served by the fake server in `bench.fake_llm`, and writes
+p50/p95/p99 latency, throughput and LLM calls per request to a JSON report.
+Streamed scenarios (merge_stream) also report the time to the first token; httpx's
+in-process ASGI transport buffers whole responses, so measure those with --target.
+
+By default the app runs in-process against the in-memory DB stand-in:
+
+    python -m bench.driver --requests 40 --concurrency 8
+
+Compare a run against an earlier report (exits 1 on regression):
+
+    python -m bench.driver --baseline bench/results/main.json --tolerance 0.15
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shlex
+import random
+import asyncio
+import argparse
+import subprocess
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+SCENARIOS = ("create", "update", "merge", "merge_stream")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# ============================
+# Statistics
+# ============================
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def distribution(values: List[float]) -> dict:
+    return {
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values, default=0.0),
+    }
+
+
+def summarize(
+    latencies: List[float],
+    errors: int,
+    wall_seconds: float,
+    llm: dict,
+    db_queries: Optional[int],
+    first_tokens: Optional[List[float]] = None,
+) -> dict:
+    """Report entry of one scenario."""
+    requests = len(latencies) + errors
+    summary = {
+        "requests": requests,
+        "errors": errors,
+        "wall_seconds": wall_seconds,
+        "throughput_rps": requests / wall_seconds if wall_seconds else 0.0,
+        "latency_seconds": distribution(latencies),
+        "llm_calls": llm["calls"],
+        "llm_calls_per_request": llm["calls"] / requests if requests else 0.0,
+        "llm_rate_limited": llm["rate_limited"],
+        "llm_prompt_tokens": llm["prompt_tokens"],
+        "llm_cached_prompt_tokens": llm["cached_tokens"],
+        "llm_completion_tokens": llm["completion_tokens"],
+        "llm_max_in_flight": llm["max_in_flight"],
+    }
+    if db_queries is not None:
+        summary["db_queries_per_request"] = db_queries / requests if requests else 0.0
+    if first_tokens:
+        summary["first_token_seconds"] = distribution(first_tokens)
+    return summary
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `report` against `baseline` beyond the relative tolerance."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+
+        checks = [
+            ("p95 latency", current["latency_seconds"]["p95"], previous["latency_seconds"]["p95"], True),
+            ("p99 latency", current["latency_seconds"]["p99"], previous["latency_seconds"]["p99"], True),
+            ("LLM calls per request", current["llm_calls_per_request"], previous["llm_calls_per_request"], True),
+            ("throughput", current["throughput_rps"], previous["throughput_rps"], False),
+        ]
+        for label, value, reference, lower_is_better in checks:
+            if lower_is_better and value > reference * (1 + tolerance):
+                regressions.append(f"{name}: {label} {value:.3f} > baseline {reference:.3f}")
+            if not lower_is_better and value < reference * (1 - tolerance):
+                regressions.append(f"{name}: {label} {value:.3f} < baseline {reference:.3f}")
+    return regressions
+
+# ============================
+# Fake LLM Server
+# ============================
+
+@asynccontextmanager
+async def fake_llm_server(url: Optional[str], port: int, extra_args: str):
+    """Yield the fake server URL, starting a local one unless `url` is given."""
+    if url:
+        yield url.rstrip("/")
+        return
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "bench.fake_llm", "--port", str(port), *shlex.split(extra_args)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient() as client:
+            for _ in range(100):
+                try:
+                    await client.get(f"{url}/stats")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise Exception("Fake LLM server did not start")
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def llm_counters(url: str) -> dict:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{url}/stats")).json()
+
+# ============================
+# Target App
+# ============================
+
+def session_token(email: str) -> str:
+    """Mint a NextAuth session token the AuthMiddleware accepts."""
+    from jose import jwe
+    from app.middleware.auth import getDerivedEncryptionKey
+
+    payload = json.dumps({"email": email, "exp": time.time() + 24 * 3600})
+    return jwe.encrypt(payload, getDerivedEncryptionKey(os.environ["NEXT_AUTH_SECRET"])).decode()
+
+
+@asynccontextmanager
+async def in_process_app(llm_url: str, db: str, db_latency: float, email: str):
+    """
+    Run the app in this process and yield (client, memory DB or None).
+
+    The LLM base URL has to be set before the app modules are imported.
+    """
+    os.environ["OPENAI_BASE_URL"] = f"{llm_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("MODEL", "gpt-4.1-mini")
+    os.environ.setdefault("NEXT_AUTH_SECRET", "bench-secret")
+    os.environ["JOB_WORKERS_IN_PROCESS"] = "false"
+
+    import app.main as app_main
+    import app.middleware.auth as auth
+
+    memory_db = None
+    if db == "memory":
+        from bench.memory_db import MemoryPrisma
+
+        memory_db = MemoryPrisma(latency=db_latency)
+        memory_db.add_user(email)
+        app_main.prisma = auth.prisma = memory_db
+        app_main.response_store.client = app_main.job_queue.client = app_main.usage_store.client = memory_db
+
+    await app_main.app.router.startup()
+    try:
+        if db == "postgres":
+            await app_main.prisma.user.upsert(
+                where={"email": email},
+                data={"create": {"email": email, "name": "Benchmark"}, "update": {}},
+            )
+
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            client.cookies.set("next-auth.session-token", session_token(email))
+            yield client, memory_db
+    finally:
+        await app_main.app.router.shutdown()
+
+
+@asynccontextmanager
+async def remote_app(target: str, email: str):
+    """Yield a client for an already running back end (its OPENAI_BASE_URL must point at the fake server)."""
+    async with httpx.AsyncClient(base_url=target, timeout=None) as client:
+        client.cookies.set("next-auth.session-token", session_token(email))
+        yield client, None
+
+# ============================
+# Workloads
+# ============================
+
+class Workloads:
+    """Requests of each scenario; responses created along the way feed the update and merge scenarios."""
+
+    def __init__(self, client: httpx.AsyncClient, run_id: str, seed: Optional[int] = None):
+        self.client = client
+        self.run_id = run_id
+        self.rng = random.Random(seed)
+        self.responses: List[dict] = []
+        self._count = 0
+
+    async def create(self):
+        self._count += 1
+        prompt = f"Write a product description for item {self.run_id}-{self._count} aimed at first-time buyers."
+        response = await self.client.post("/api/v1/responses/", json={"input": prompt})
+        response.raise_for_status()
+        self.responses.append(response.json())
+
+    async def update(self):
+        categories = [c for r in self.responses for c in r["categories"] if c["patterns"]]
+        category = self.rng.choice(categories)
+        toggled = self.rng.sample(category["patterns"], k=max(1, len(category["patterns"]) // 2))
+        payload = {"patterns": [{"pattern_id": p["pattern_id"], "applied": not p["applied"]} for p in toggled]}
+        response = await self.client.put(f"/api/v1/categories/{category['category_id']}/patterns", json=payload)
+        response.raise_for_status()
+
+    async def merge(self):
+        stored, previews = await self._previews()
+        url = f"/api/v1/responses/merge/{stored['response_id']}"
+        response = await self.client.put(url, json={"previews": previews})
+        response.raise_for_status()
+
+    async def merge_stream(self) -> float:
+        """Streamed merge; returns the seconds until the first token arrived."""
+        stored, previews = await self._previews()
+        start = time.perf_counter()
+        first_token = None
+        async with self.client.stream(
+            "PUT", f"/api/v1/responses/merge/{stored['response_id']}/stream", json={"previews": previews}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line == "event: token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                if line == "event: error":
+                    raise Exception("Stream failed")
+        return first_token
+
+    async def _previews(self):
+        stored = self.rng.choice(self.responses)
+        for category in stored["categories"]:
+            if category["preview"] is None:
+                # Left to be merged on demand by the flat and tree merge strategies
+                response = await self.client.get(f"/api/v1/categories/{category['category_id']}/preview")
+                response.raise_for_status()
+                category["preview"] = response.json()["preview"]
+        return stored, [c["preview"] for c in stored["categories"]]
+
+
+async def run_scenario(workload, requests: int, concurrency: int):
+    """
+    Run `requests` calls of a workload with at most `concurrency` in flight.
+
+    Workloads may return their time to first token, which is collected separately.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                first_token = await workload()
+            except Exception as e:
+                key = type(e).__name__
+                errors[key] = errors.get(key, 0) + 1
+            else:
+                latencies.append(time.perf_counter() - start)
+                if first_token is not None:
+                    first_tokens.append(first_token)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, errors, time.perf_counter() - start, first_tokens
+
+# ============================
+# Entry Point
+# ============================
+
+async def run(args) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            raise Exception(f"Unknown scenario {name}")
+
+    report = {
+        "run_id": run_id,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "config": vars(args),
+        "scenarios": {},
+    }
+
+    async with fake_llm_server(args.llm_url, args.llm_port, args.fake_llm_args) as llm_url:
+        report["llm"] = (await llm_counters(llm_url))["config"]
+        if args.target:
+            target = remote_app(args.target, args.email)
+        else:
+            target = in_process_app(llm_url, args.db, args.db_latency, args.email)
+
+        async with target as (client, memory_db):
+            workloads = Workloads(client, run_id, args.seed)
+
+            if "create" not in scenarios:
+                # Update and merge need stored responses to work on
+                await run_scenario(workloads.create, args.concurrency, args.concurrency)
+
+            for name in scenarios:
+                before = await llm_counters(llm_url)
+                queries_before = memory_db.queries if memory_db else None
+
+                latencies, errors, wall, first_tokens = await run_scenario(
+                    getattr(workloads, name), args.requests, args.concurrency
+                )
+
+                after = await llm_counters(llm_url)
+                counters = ("calls", "rate_limited", "prompt_tokens", "cached_tokens", "completion_tokens")
+                llm = {key: after[key] - before[key] for key in counters}
+                llm["max_in_flight"] = after["max_in_flight"]
+                db_queries = memory_db.queries - queries_before if memory_db else None
+
+                summary = summarize(latencies, sum(errors.values()), wall, llm, db_queries, first_tokens)
+                summary["error_types"] = errors
+                report["scenarios"][name] = summary
+                _print_summary(name, summary)
+
+    return report
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _print_summary(name: str, summary: dict):
+    latency = summary["latency_seconds"]
+    cached = summary["llm_cached_prompt_tokens"] / summary["llm_prompt_tokens"] if summary["llm_prompt_tokens"] else 0.0
+    print(
+        f"{name:>12}: {summary['requests']} req, {summary['errors']} err, "
+        f"p50 {latency['p50']:.3f}s p95 {latency['p95']:.3f}s p99 {latency['p99']:.3f}s, "
+        f"{summary['throughput_rps']:.2f} req/s, {summary['llm_calls_per_request']:.1f} LLM calls/req, "
+        f"{cached:.0%} prompt tokens cached"
+        + (f", first token p50 {summary['first_token_seconds']['p50']:.3f}s"
+           if "first_token_seconds" in summary else "")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--scenarios", default=",".join(SCENARIOS), help="Comma separated subset of create,update,merge,merge_stream"
+    )
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--db", choices=("memory", "postgres"), default="memory", help="In-memory stand-in or DATABASE_URL"
+    )
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Per-query latency of the in-memory DB")
+    parser.add_argument("--target", default=None, help="URL of a running back end instead of the in-process app")
+    parser.add_argument("--email", default="bench@example.com", help="User the requests are made as")
+    parser.add_argument("--llm-url", default=None, help="URL of a running fake LLM server")
+    parser.add_argument("--llm-port", type=int, default=8100)
+    parser.add_argument(
+        "--fake-llm-args", default="", help='Extra arguments for bench.fake_llm, e.g. "--latency-median 0.3"'
+    )
+    parser.add_argument("--out", default=None, help="Report path (default bench/results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
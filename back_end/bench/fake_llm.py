@@ -0,0 +1,269 @@
+"""
+Fake OpenAI-compatible chat completions server for offline benchmarks.
+
+Every completion contains `<FEEDBACK>`, `<DECISION>` and `<PROMPT>` sections, so it
+satisfies every step of the generation pipeline; triage requests get random `<SCORES>`. Latency, 429 responses and token
+counts are drawn from configurable distributions. Like OpenAI's prompt caching, prompt prefixes of 1024 tokens and
+more (in 128-token steps) that were seen before are reported as `prompt_tokens_details.cached_tokens`.
+Requests with `"stream": true` get Server-Sent Event chunks: the first after `first_token_share` of the
+latency, the rest spread evenly over the remainder.
+
+Run it standalone and point the back end at it with OPENAI_BASE_URL:
+
+    python -m bench.fake_llm --port 8100 --latency-median 0.8 --rate-limit-probability 0.02
+"""
+import re
+import json
+import time
+import hashlib
+import uuid
+import random
+import asyncio
+import argparse
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeLLMConfig:
+    """
+    Behaviour of the fake server.
+
+    Args:
+        latency_median (float): Median completion latency in seconds (log-normal).
+        latency_sigma (float): Shape of the log-normal latency; 0 makes it constant.
+        jitter (float): Extra uniform latency in [0, jitter] seconds.
+        rate_limit_probability (float): Share of requests answered with 429.
+        retry_after (float): Retry-After sent with 429 responses.
+        completion_tokens (int): Mean completion length in tokens.
+        apply_probability (float): Share of completions that decide to apply the pattern.
+        rpm_limit (int): Reported in x-ratelimit-limit-requests.
+        tpm_limit (int): Reported in x-ratelimit-limit-tokens.
+        seed (int, optional): Random seed for reproducible runs.
+        prompt_cache (bool): Report previously seen prompt prefixes as cached tokens.
+        latency_scale (str): JSON model -> latency multiplier, e.g. '{"gpt-4.1-nano": 0.4}' to
+            simulate a faster model for routed steps.
+        first_token_share (float): Share of the latency before the first chunk of a streamed completion.
+        stream_chunks (int): Chunks a streamed completion is split into.
+    """
+
+    latency_median: float = 0.8
+    latency_sigma: float = 0.4
+    jitter: float = 0.05
+    rate_limit_probability: float = 0.0
+    retry_after: float = 1.0
+    completion_tokens: int = 120
+    apply_probability: float = 0.6
+    rpm_limit: int = 10000
+    tpm_limit: int = 10000000
+    seed: Optional[int] = None
+    prompt_cache: bool = True
+    latency_scale: str = "{}"
+    first_token_share: float = 0.2
+    stream_chunks: int = 20
+
+
+# Prefix caching granularity in characters (~4 characters per token): 1024 tokens, then 128-token steps
+CACHE_MIN_CHARS = 4096
+CACHE_STEP_CHARS = 512
+
+
+class _PrefixCache:
+    """Hashes of prompt prefixes seen so far, at cache step boundaries."""
+
+    def __init__(self):
+        self._seen = set()
+
+    def lookup_and_store(self, text: str) -> int:
+        """Characters of `text` served from the cache; stores every prefix of `text`."""
+        cached = 0
+        for end in range(CACHE_MIN_CHARS, len(text) + 1, CACHE_STEP_CHARS):
+            digest = hashlib.sha256(text[:end].encode("utf-8")).digest()
+            if digest in self._seen:
+                cached = end
+            else:
+                self._seen.add(digest)
+        return cached
+
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def snapshot(self) -> dict:
+        return dict(vars(self))
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    """Build the fake server app for a configuration."""
+    app = FastAPI(title="Fake LLM")
+    rng = random.Random(config.seed)
+    counters = _Counters()
+    latency_scale = json.loads(config.latency_scale)
+    prefix_cache = _PrefixCache()
+
+    def latency(model: str) -> float:
+        value = config.latency_median
+        if config.latency_sigma:
+            value *= rng.lognormvariate(0, config.latency_sigma)
+        return (value + rng.uniform(0, config.jitter)) * latency_scale.get(model, 1.0)
+
+    def completion(words: int, applied: bool) -> str:
+        body = " ".join(f"w{rng.randrange(1000)}" for _ in range(words))
+        decision = "Yes" if applied else "No"
+        return f"<FEEDBACK>{body}</FEEDBACK>\n<DECISION>{decision}</DECISION>\n<PROMPT>Improved: {body}</PROMPT>"
+
+    def triage(prompt: str) -> str:
+        patterns = re.findall(r"^- (.+?) \(", prompt, re.MULTILINE)
+        lines = [f"{pattern} | {rng.randint(0, 10)} | w{rng.randrange(1000)}" for pattern in patterns]
+        return "<SCORES>\n" + "\n".join(lines) + "\n</SCORES>"
+
+    def rate_limit_headers() -> dict:
+        return {
+            "x-ratelimit-limit-requests": str(config.rpm_limit),
+            "x-ratelimit-limit-tokens": str(config.tpm_limit),
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        counters.calls += 1
+
+        if rng.random() < config.rate_limit_probability:
+            counters.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"retry-after": str(config.retry_after), **rate_limit_headers()},
+            )
+
+        counters.in_flight += 1
+        counters.max_in_flight = max(counters.max_in_flight, counters.in_flight)
+        seconds = latency(payload.get("model"))
+        streamed = bool(payload.get("stream"))
+        try:
+            await asyncio.sleep(seconds * config.first_token_share if streamed else seconds)
+        except BaseException:
+            counters.in_flight -= 1
+            raise
+        if not streamed:
+            counters.in_flight -= 1
+
+        prompt_text = "\n".join(f"{m.get('role')}: {_message_text(m)}" for m in payload.get("messages", []))
+        prompt_tokens = sum(len(_message_text(m)) for m in payload.get("messages", [])) // 4 + 1
+        cached_tokens = 0
+        if config.prompt_cache:
+            cached_tokens = min(prompt_tokens, prefix_cache.lookup_and_store(prompt_text) // 4)
+        completion_tokens = max(1, int(rng.gauss(config.completion_tokens, config.completion_tokens / 4)))
+        counters.prompt_tokens += prompt_tokens
+        counters.cached_tokens += cached_tokens
+        counters.completion_tokens += completion_tokens
+
+        last_message = _message_text(payload["messages"][-1]) if payload.get("messages") else ""
+        if "<SCORES>" in last_message:
+            content = triage(last_message)
+        else:
+            content = completion(completion_tokens // 2, rng.random() < config.apply_probability)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = payload.get("model", "fake")
+
+        if streamed:
+            include_usage = (payload.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(
+                stream(
+                    completion_id, model, content, usage if include_usage else None,
+                    seconds * (1 - config.first_token_share)
+                ),
+                media_type="text/event-stream",
+                headers=rate_limit_headers(),
+            )
+
+        return JSONResponse(
+            content={
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            },
+            headers=rate_limit_headers(),
+        )
+
+    async def stream(completion_id: str, model: str, content: str, usage: Optional[dict], seconds: float):
+        def chunk(delta: dict, finish_reason: Optional[str] = None, **extra) -> str:
+            body = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                **extra,
+            }
+            return f"data: {json.dumps(body)}\n\n"
+
+        size = max(1, -(-len(content) // max(1, config.stream_chunks)))
+        pieces = [content[start:start + size] for start in range(0, len(content), size)]
+        try:
+            yield chunk({"role": "assistant", "content": ""})
+            for index, piece in enumerate(pieces):
+                if index:
+                    await asyncio.sleep(seconds / max(1, len(pieces) - 1))
+                yield chunk({"content": piece})
+            yield chunk({}, "stop")
+            if usage is not None:
+                yield chunk(None, usage=usage)
+            yield "data: [DONE]\n\n"
+        finally:
+            counters.in_flight -= 1
+
+    @app.get("/stats")
+    async def stats():
+        """Counters since startup; the driver diffs them around each scenario."""
+        return {**counters.snapshot(), "config": asdict(config)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    for name, default in asdict(FakeLLMConfig()).items():
+        kind = type(default) if default is not None else int
+        parser.add_argument(f"--{name.replace('_', '-')}", type=kind, default=default)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(**{name: getattr(args, name) for name in asdict(FakeLLMConfig())})
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+In-memory stand-in for the Prisma client, for benchmarks without Postgres.
+
+Only the queries issued by the benchmarked endpoints are supported. Every query
+sleeps for a configurable latency, so DB round trips still count.
+"""
+import copy
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _copy(row):
+    return copy.deepcopy(row) if row is not None else None
+
+
+def _apply(row, data: dict):
+    for key, value in data.items():
+        if isinstance(value, dict) and "increment" in value:
+            value = getattr(row, key) + value["increment"]
+        setattr(row, key, value)
+
+
+class _Table:
+    def __init__(self, db: "MemoryPrisma"):
+        self.db = db
+
+    async def _query(self):
+        self.db.queries += 1
+        if self.db.latency:
+            await asyncio.sleep(self.db.latency)
+
+
+class _Users(_Table):
+    async def find_unique(self, where: dict, **kwargs):
+        await self._query()
+        for user in self.db.users.values():
+            if all(getattr(user, key) == value for key, value in where.items()):
+                return _copy(user)
+        return None
+
+
+class _Responses(_Table):
+    async def create(self, data: dict, include: Optional[dict] = None):
+        await self._query()
+        response = SimpleNamespace(
+            response_id=_new_id(),
+            user_id=data["user_id"],
+            input=data["input"],
+            output=data["output"],
+            status=data.get("status", "complete"),
+            created_at=datetime.now(timezone.utc),
+            llm_calls=data.get("llm_calls", 0),
+            input_tokens=data.get("input_tokens", 0),
+            output_tokens=data.get("output_tokens", 0),
+            cost_usd=data.get("cost_usd", 0.0),
+        )
+        self.db.responses[response.response_id] = response
+        for call in data.get("calls", {}).get("create", []):
+            self.db.calls.append({**call, "response_id": response.response_id})
+
+        for category_data in data.get("categories", {}).get("create", []):
+            category = SimpleNamespace(
+                category_id=_new_id(),
+                response_id=response.response_id,
+                category=category_data["category"],
+                input=category_data["input"],
+                preview=category_data["preview"],
+            )
+            self.db.categories[category.category_id] = category
+            for pattern_data in category_data.get("patterns", {}).get("create", []):
+                pattern = SimpleNamespace(pattern_id=_new_id(), category_id=category.category_id, **pattern_data)
+                self.db.patterns[pattern.pattern_id] = pattern
+
+        return self.db.load_response(response.response_id, include)
+
+    async def find_unique(self, where: dict, include: Optional[dict] = None):
+        await self._query()
+        return self.db.load_response(where["response_id"], include)
+
+    async def update(self, where: dict, data: dict, include: Optional[dict] = None):
+        await self._query()
+        response = self.db.responses.get(where["response_id"])
+        if response is None:
+            return None
+        _apply(response, data)
+        return self.db.load_response(response.response_id, include)
+
+
+class _Categories(_Table):
+    async def find_unique(self, where: dict, include: Optional[dict] = None):
+        await self._query()
+        return self.db.load_category(where["category_id"], include)
+
+    async def update(self, where: dict, data: dict, include: Optional[dict] = None):
+        await self._query()
+        category = self.db.categories.get(where["category_id"])
+        if category is None:
+            return None
+        _apply(category, data)
+        return self.db.load_category(category.category_id, include)
+
+
+class _Patterns(_Table):
+    async def update(self, where: dict, data: dict):
+        await self._query()
+        pattern = self.db.patterns.get(where["pattern_id"])
+        if pattern is None:
+            return None
+        _apply(pattern, data)
+        return _copy(pattern)
+
+    async def update_many(self, where: dict, data: dict):
+        await self._query()
+        pattern_ids = set(where["pattern_id"]["in"])
+        count = 0
+        for pattern in self.db.patterns.values():
+            if pattern.category_id == where["category_id"] and pattern.pattern_id in pattern_ids:
+                _apply(pattern, data)
+                count += 1
+        return count
+
+
+class _Calls(_Table):
+    async def create_many(self, data: list):
+        await self._query()
+        self.db.calls.extend(data)
+        return len(data)
+
+
+class MemoryPrisma:
+    """
+    Prisma client stand-in holding users, responses, categories, patterns and the call log in memory.
+
+    Args:
+        latency (float): Seconds every query sleeps, to model a DB round trip.
+    """
+
+    def __init__(self, latency: float = 0.002):
+        self.latency = latency
+        self.queries = 0
+        self.users: Dict[str, SimpleNamespace] = {}
+        self.responses: Dict[str, SimpleNamespace] = {}
+        self.categories: Dict[str, SimpleNamespace] = {}
+        self.patterns: Dict[str, SimpleNamespace] = {}
+        self.calls: List[dict] = []
+        self._connected = False
+
+        self.user = _Users(self)
+        self.response = _Responses(self)
+        self.category = _Categories(self)
+        self.pattern = _Patterns(self)
+        self.llmcall = _Calls(self)
+
+    async def connect(self):
+        self._connected = True
+
+    async def disconnect(self):
+        self._connected = False
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def query_raw(self, query: str, *args):
+        # Only the daily usage lookup of UsageStore is issued as raw SQL by the benchmarked endpoints
+        await self.user._query()
+        used = sum(c["input_tokens"] + c["output_tokens"] for c in self.calls if c["user_id"] == args[0])
+        return [{"budget": None, "used": used}]
+
+    @asynccontextmanager
+    async def tx(self):
+        # Queries are applied immediately; there is nothing to roll back in a benchmark
+        yield self
+
+    def add_user(self, email: str) -> str:
+        user = SimpleNamespace(id=_new_id(), email=email, name="Benchmark")
+        self.users[user.id] = user
+        return user.id
+
+    def load_category(self, category_id: str, include: Optional[dict] = None):
+        category = _copy(self.categories.get(category_id))
+        if category is None or not include:
+            return category
+        if include.get("patterns"):
+            category.patterns = [_copy(p) for p in self.patterns.values() if p.category_id == category_id]
+        if include.get("response"):
+            category.response = _copy(self.responses[category.response_id])
+        return category
+
+    def load_response(self, response_id: str, include: Optional[dict] = None):
+        response = _copy(self.responses.get(response_id))
+        if response is None or not include:
+            return response
+        if include.get("categories"):
+            category_include = include["categories"].get("include") if isinstance(include["categories"], dict) else None
+            response.categories = [
+                self.load_category(c.category_id, category_include)
+                for c in self.categories.values() if c.response_id == response_id
+            ]
+        return response
@@ -64,6 +64,14 @@ async function proxy(
     const resHeaders = new Headers(upstream.headers);
     resHeaders.delete("transfer-encoding");
 
+    // Pass Server-Sent Events through as they arrive instead of buffering them
+    if (upstream.headers.get("content-type")?.startsWith("text/event-stream")) {
+      return new NextResponse(upstream.body, {
+        status: upstream.status,
+        headers: resHeaders,
+      });
+    }
+
     const buf = await upstream.arrayBuffer();
     return new NextResponse(buf, {
       status: upstream.status,
@@ -3,8 +3,10 @@ import { AxiosResponse } from "axios";
 import {
   ResponseCreatePayload,
   ResponseCreateResponse,
+  ResponsePage,
   ResponseUpdatePayload,
   MergePreviewsPayload,
+  ManualImprovementPayload,
   CategoryRead,
   CategoryPatternUpdatePayload,
 } from "@/types/response";
@@ -15,14 +17,28 @@ export const getResponsesEndpoint = () => `${baseURL}/responses/`;
 export const getResponseByIdEndpoint = (responseId: string) =>
   `${baseURL}/responses/${responseId}`;
 export const createResponseEndpoint = () => `${baseURL}/responses/`;
+export const retryResponseEndpoint = (responseId: string) =>
+  `${baseURL}/responses/${responseId}/retry`;
 export const updateResponseEndpoint = (responseId: string) =>
   `${baseURL}/responses/update/${responseId}`;
 export const updatePatternEndpoint = (categoryId: string) =>
   `${baseURL}/categories/${categoryId}/patterns`;
+export const categoryPreviewEndpoint = (categoryId: string) =>
+  `${baseURL}/categories/${categoryId}/preview`;
 export const mergePreviewsEndpoint = (responseId: string) =>
   `${baseURL}/responses/merge/${responseId}`;
+export const mergePreviewsStreamEndpoint = (responseId: string) =>
+  `${baseURL}/responses/merge/${responseId}/stream`;
+export const improveResponseStreamEndpoint = (responseId: string) =>
+  `${baseURL}/responses/${responseId}/improve/stream`;
 export const deleteResponseEndpoint = (responseId: string) =>
   `${baseURL}/responses/${responseId}`;
+export const signOutEndpoint = () => `${baseURL}/users/signout`;
+
+// Lets the backend forget its cached session before NextAuth clears the cookie
+export const signOutOfBackend = async (): Promise<AxiosResponse<void>> => {
+  return await axios.post<void>(signOutEndpoint());
+};
 
 export const deleteResponse = async (
   responseId: string
@@ -30,10 +46,12 @@ export const deleteResponse = async (
   return await axios.delete<void>(deleteResponseEndpoint(responseId));
 };
 
-export const getResponses = async (): Promise<
-  AxiosResponse<ResponseCreateResponse[]>
-> => {
-  return await axios.get<ResponseCreateResponse[]>(getResponsesEndpoint());
+export const getResponses = async (
+  cursor?: string
+): Promise<AxiosResponse<ResponsePage>> => {
+  return await axios.get<ResponsePage>(getResponsesEndpoint(), {
+    params: cursor ? { cursor } : undefined,
+  });
 };
 
 export const getResponseById = async (
@@ -53,6 +71,14 @@ export const createResponse = async (
   );
 };
 
+export const retryResponse = async (
+  responseId: string
+): Promise<AxiosResponse<ResponseCreateResponse>> => {
+  return await axios.post<ResponseCreateResponse>(
+    retryResponseEndpoint(responseId)
+  );
+};
+
 export const updateResponse = async (
   responseId: string,
   payload: ResponseUpdatePayload
@@ -73,6 +99,12 @@ export const updateCategoryPatterns = async (
   );
 };
 
+export const getCategoryPreview = async (
+  categoryId: string
+): Promise<AxiosResponse<CategoryRead>> => {
+  return await axios.get<CategoryRead>(categoryPreviewEndpoint(categoryId));
+};
+
 export const mergePreviews = async (
   responseId: string,
   payload: MergePreviewsPayload
@@ -82,3 +114,71 @@ export const mergePreviews = async (
     payload
   );
 };
+
+// Reads a Server-Sent Events rewrite: calls onToken with the text so far for every
+// token event and resolves with the stored response sent last.
+const streamRewrite = async (
+  url: string,
+  method: "PUT" | "POST",
+  payload: object,
+  onToken: (text: string) => void
+): Promise<ResponseCreateResponse> => {
+  const res = await fetch(url, {
+    method,
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+  if (!res.ok || !res.body) {
+    throw new Error(`Rewrite failed with status ${res.status}`);
+  }
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  let text = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    const events = buffer.split("\n\n");
+    buffer = events.pop() ?? "";
+    for (const raw of events) {
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] ?? "null");
+      if (event === "token") {
+        text += data.text;
+        onToken(text);
+      } else if (event === "response") {
+        return data as ResponseCreateResponse;
+      } else if (event === "error") {
+        throw new Error(data.detail);
+      }
+    }
+  }
+  throw new Error("Rewrite stream ended without a response");
+};
+
+export const streamMergePreviews = async (
+  responseId: string,
+  payload: MergePreviewsPayload,
+  onToken: (text: string) => void
+): Promise<ResponseCreateResponse> => {
+  return await streamRewrite(
+    mergePreviewsStreamEndpoint(responseId),
+    "PUT",
+    payload,
+    onToken
+  );
+};
+
+export const streamManualImprovement = async (
+  responseId: string,
+  payload: ManualImprovementPayload,
+  onToken: (text: string) => void
+): Promise<ResponseCreateResponse> => {
+  return await streamRewrite(
+    improveResponseStreamEndpoint(responseId),
+    "POST",
+    payload,
+    onToken
+  );
+};
@@ -2,11 +2,13 @@
 "use client";
 import {
   getResponseById,
-  mergePreviews,
+  streamMergePreviews,
   updateCategoryPatterns,
   updateResponse,
   createResponse,
+  retryResponse,
   getResponses,
+  getCategoryPreview,
 } from "@/app/api/responses/backend-service";
 import { patternDescriptions } from "@/app/constants/enum";
 import { Model, models, types } from "@/components/data/models";
@@ -61,7 +63,7 @@ import { Spinner } from "@/components/ui/spinner";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import { Textarea } from "@/components/ui/textarea";
 import { cn } from "@/lib/utils";
-import { ResponseCreateResponse } from "@/types/response";
+import { ResponseCreateResponse, ResponseSummary } from "@/types/response";
 import type { Message as UIMessage } from "@ai-sdk/react";
 import { produce } from "immer";
 import {
@@ -100,31 +102,15 @@ export default function PlaygroundPage() {
   const [currentReponseId, setCurrentResponseId] = React.useState<
     string | undefined
   >(id ?? undefined);
-  const [pastResponse, setPastResponse] = React.useState<
-    ResponseCreateResponse[]
-  >([]);
+  const [pastResponse, setPastResponse] = React.useState<ResponseSummary[]>(
+    []
+  );
 
   React.useEffect(() => {
     const fetchData = async () => {
       try {
         const res = await getResponses();
-        const response = res.data;
-        const enhancedResponses: ResponseCreateResponse[] = response.map(
-          (res) => ({
-            ...res,
-            categories: (res.categories ?? []).map((category) => ({
-              ...category,
-              patterns: category.patterns.map((pattern) => ({
-                ...pattern,
-                description:
-                  patternDescriptions[
-                    pattern.pattern as keyof typeof patternDescriptions
-                  ] || "",
-              })),
-            })),
-          })
-        );
-        setPastResponse(enhancedResponses);
+        setPastResponse(res.data.items);
       } catch (error) {
         console.error("Error fetching past response:", error);
       }
@@ -137,23 +123,67 @@ export default function PlaygroundPage() {
       clearPreset();
       return;
     }
-    const selectedResponse = pastResponse.find(
-      (res) => res.response_id === currentReponseId
-    );
-    if (selectedResponse) {
-      setData(selectedResponse);
-      setInput(selectedResponse.input);
-      setRefinePrompt(selectedResponse.output);
-      setEditUnLock(true);
-      setOutputUnlock(true);
-      setComparisonUnlock(true);
+    if (
+      !currentReponseId ||
+      !pastResponse.some((res) => res.response_id === currentReponseId)
+    ) {
+      return;
     }
+    // The list only holds summaries; load the full response once selected
+    const fetchSelected = async () => {
+      try {
+        const res = await getResponseById(currentReponseId);
+        const response = res.data;
+        const selectedResponse: ResponseCreateResponse = {
+          ...response,
+          categories: (response.categories ?? []).map((category) => ({
+            ...category,
+            patterns: category.patterns.map((pattern) => ({
+              ...pattern,
+              description:
+                patternDescriptions[
+                  pattern.pattern as keyof typeof patternDescriptions
+                ] || "",
+            })),
+          })),
+        };
+        setData(selectedResponse);
+        setInput(selectedResponse.input);
+        setRefinePrompt(selectedResponse.output);
+        setEditUnLock(true);
+        setOutputUnlock(true);
+        setComparisonUnlock(true);
+      } catch (error) {
+        console.error("Error fetching selected response:", error);
+      }
+    };
+    fetchSelected();
   }, [currentReponseId, pastResponse]);
 
   const setDataImmer = (updater: (draft: ResponseCreateResponse) => void) => {
     setData((prev) => produce(prev, updater));
   };
 
+  // Some merge strategies leave category previews to be merged when first viewed
+  React.useEffect(() => {
+    const category = data?.categories?.[step];
+    if (!category || category.preview !== null) {
+      return;
+    }
+    const fetchPreview = async () => {
+      try {
+        const res = await getCategoryPreview(category.category_id);
+        setDataImmer((draft) => {
+          if (!draft.categories) return;
+          draft.categories[step].preview = res.data.preview;
+        });
+      } catch (error) {
+        console.error("Error fetching category preview:", error);
+      }
+    };
+    fetchPreview();
+  }, [step, data]);
+
   const handleApplyCategory = async (categoryIndex: number) => {
     setLoading(true);
     try {
@@ -247,29 +277,8 @@ export default function PlaygroundPage() {
       const res = await createResponse(payload);
       console.log("Response received:", res);
 
-      const response = res.data;
-      const enhancedResponse: ResponseCreateResponse = {
-        ...response,
-        categories: (response.categories ?? []).map((category) => ({
-          ...category,
-          patterns: category.patterns.map((pattern) => ({
-            ...pattern,
-            description:
-              patternDescriptions[
-                pattern.pattern as keyof typeof patternDescriptions
-              ] || "",
-          })),
-        })),
-      };
-
-      setData(enhancedResponse);
-      setInput(enhancedResponse.input);
-      setEditUnLock(true);
-      setOutputUnlock(true);
-      setEditUnLock(true);
-      setOutputUnlock(true);
-      setRefinePrompt(enhancedResponse.output);
-      toast.success("Response created successfully!");
+      showResponse(res.data);
+      notifyStatus(res.data, "Response created successfully!");
     } catch (error) {
       toast.error("Error creating response. Please try again.");
       console.error("Submission failed", error);
@@ -277,6 +286,60 @@ export default function PlaygroundPage() {
     setLoading(false);
   };
 
+  const showResponse = (response: ResponseCreateResponse) => {
+    const enhancedResponse: ResponseCreateResponse = {
+      ...response,
+      categories: (response.categories ?? []).map((category) => ({
+        ...category,
+        patterns: category.patterns.map((pattern) => ({
+          ...pattern,
+          description:
+            patternDescriptions[
+              pattern.pattern as keyof typeof patternDescriptions
+            ] || "",
+        })),
+      })),
+    };
+
+    setData(enhancedResponse);
+    setInput(enhancedResponse.input);
+    setEditUnLock(true);
+    setOutputUnlock(true);
+    setRefinePrompt(enhancedResponse.output);
+  };
+
+  // Partial responses keep the patterns that succeeded; offer to retry the failed ones
+  const notifyStatus = (response: ResponseCreateResponse, success: string) => {
+    if (response.status !== "partial") {
+      toast.success(success);
+      return;
+    }
+    const failed = (response.categories ?? []).flatMap((category) =>
+      category.patterns.filter((pattern) => pattern.error)
+    );
+    toast.warning(`${failed.length} pattern(s) failed.`, {
+      description: failed.map((pattern) => pattern.pattern).join(", "),
+      action: {
+        label: "Retry",
+        onClick: () => handleRetry(response.response_id),
+      },
+      duration: 10000,
+    });
+  };
+
+  const handleRetry = async (responseId: string) => {
+    setLoading(true);
+    try {
+      const res = await retryResponse(responseId);
+      showResponse(res.data);
+      notifyStatus(res.data, "Failed patterns applied successfully!");
+    } catch (error) {
+      toast.error("Retry failed. Please try again.");
+      console.error("Retry failed", error);
+    }
+    setLoading(false);
+  };
+
   const handleSave = async () => {
     setLoading(true);
     try {
@@ -300,12 +363,21 @@ export default function PlaygroundPage() {
     setLoading(true);
     try {
       if (data && data.categories) {
-        const previews = data.categories.map((category) => category.preview);
+        const previews = await Promise.all(
+          data.categories.map(
+            async (category) =>
+              category.preview ??
+              (await getCategoryPreview(category.category_id)).data.preview ??
+              category.input
+          )
+        );
         const response_id = data.response_id;
-        const res = await mergePreviews(response_id, {
-          previews: previews,
-        });
-        const response = res.data;
+        // Show the merged prompt while the model writes it
+        const response = await streamMergePreviews(
+          response_id,
+          { previews: previews },
+          (text) => setRefinePrompt(text)
+        );
         const enhancedResponse: ResponseCreateResponse = {
           ...response,
           categories: (response.categories ?? []).map((category) => ({
@@ -695,7 +767,7 @@ export default function PlaygroundPage() {
                             id="preview"
                             placeholder="Here is the preview of the output for this step."
                             className="flex-1 h-full w-full"
-                            value={data?.categories![step].preview}
+                            value={data?.categories![step].preview ?? ""}
                             readOnly
                           />
                         </div>
@@ -8,6 +8,7 @@ import {
   DropdownMenuSeparator,
   DropdownMenuTrigger,
 } from "@/components/ui/dropdown-menu";
+import { signOutOfBackend } from "@/app/api/responses/backend-service";
 import { cn } from "@/lib/utils";
 import { IconBrandTabler } from "@tabler/icons-react";
 import { History } from "lucide-react";
@@ -112,7 +113,11 @@ export function SideBarWrapper({ children }: { children: React.ReactNode }) {
                             <DropdownMenuItem
                               color="danger"
                               onClick={() =>
-                                signOut({ callbackUrl: currentPath })
+                                signOutOfBackend()
+                                  .catch(() => undefined)
+                                  .finally(() =>
+                                    signOut({ callbackUrl: currentPath })
+                                  )
                               }
                             >
                               Log Out
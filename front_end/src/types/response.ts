@@ -7,22 +7,40 @@ export interface ResponseCreateResponse {
   user_id: string;
   input: string;
   output: string;
+  status?: "complete" | "partial"; // partial when some patterns failed and can be retried
   created_at: string;
+  llm_calls?: number;
+  input_tokens?: number;
+  output_tokens?: number;
+  cost_usd?: number;
   categories?: {
     category_id: string;
     category: string;
     input: string;
-    preview: string;
+    preview: string | null; // null until merged on demand
     patterns: {
       pattern_id: string;
       pattern: string;
       description?: string;
       feedback: string;
       applied: boolean;
+      error?: string | null;
     }[];
   }[];
 }
 
+export interface ResponseSummary {
+  response_id: string;
+  input: string;
+  output: string;
+  created_at: string;
+}
+
+export interface ResponsePage {
+  items: ResponseSummary[];
+  next_cursor: string | null;
+}
+
 export interface ResponseUpdatePayload {
   output: string;
 }
@@ -31,17 +49,23 @@ export interface MergePreviewsPayload {
   previews: string[];
 }
 
+export interface ManualImprovementPayload {
+  feedback: string;
+  prompt?: string;
+}
+
 export interface CategoryRead {
   category_id: string;
   category: string;
   input: string;
-  preview: string;
+  preview: string | null;
   patterns: {
     pattern_id: string;
     pattern: string;
     description?: string;
     feedback: string;
     applied: boolean;
+    error?: string | null;
   }[];
 }
 